@@ -0,0 +1,74 @@
+#! /usr/bin/env python3
+# Copyright (c) 2019 Kevin Weiss, for HAW Hamburg  <kevin.weiss@haw-hamburg.de>
+#
+# This file is subject to the terms and conditions of the MIT License. See the
+# file LICENSE in the top level directory for more details.
+# SPDX-License-Identifier:    MIT
+"""
+Measures the time to import riot_pal in a fresh interpreter, as paid by each
+short lived worker process, and which driver dependencies get loaded.
+
+Usage
+-----
+
+```
+usage: bench_import.py  [-h] [--runs RUNS] [--module MODULE]
+
+optional arguments:
+  --runs, -n
+                        Number of interpreters started (default: 20)
+  --module, -m
+                        Module to import, can be repeated
+                        (default: riot_pal, riot_pal.dut_pyshell)
+```
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+DEPENDENCIES = ('serial', 'pexpect')
+SNIPPET = '''
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps([elapsed, [dep for dep in {deps!r} if dep in sys.modules]]))
+'''
+
+
+def bench_import(module, runs):
+    """Returns the import times of a module and the loaded dependencies."""
+    times = []
+    loaded = []
+    for _ in range(runs):
+        output = subprocess.check_output(
+            [sys.executable, '-c',
+             SNIPPET.format(module=module, deps=DEPENDENCIES)],
+            universal_newlines=True)
+        elapsed, loaded = json.loads(output)
+        times.append(elapsed)
+    times.sort()
+    return {'median_ms': times[len(times) // 2] * 1e3,
+            'min_ms': times[0] * 1e3, 'loaded': loaded}
+
+
+def main():
+    """Main program"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', '-n', type=int, default=20,
+                        help='Number of interpreters started')
+    parser.add_argument('--module', '-m', action='append',
+                        help='Module to import, can be repeated')
+    pargs = parser.parse_args()
+
+    print("{:<24} {:>10} {:>10}  {}".format('module', 'median ms', 'min ms',
+                                            'loaded'))
+    for module in pargs.module or ['riot_pal', 'riot_pal.dut_pyshell']:
+        res = bench_import(module, pargs.runs)
+        print("{:<24} {median_ms:>10.2f} {min_ms:>10.2f}  {}".format(
+            module, ', '.join(res['loaded']) or '-', **res))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+#! /usr/bin/env python3
+# Copyright (c) 2019 Kevin Weiss, for HAW Hamburg  <kevin.weiss@haw-hamburg.de>
+#
+# This file is subject to the terms and conditions of the MIT License. See the
+# file LICENSE in the top level directory for more details.
+# SPDX-License-Identifier:    MIT
+"""
+Compares the decoded text and the undecoded bytes read path of the parsers.
+A session with the DUT emulator is recorded once and then replayed without
+IO, so only the parsing is measured.
+
+The throughput of the fastest replay is measured without tracing, the peak
+memory allocated while parsing a response is measured with tracemalloc in a
+separate run.
+
+Usage
+-----
+
+```
+usage: bench_parse_alloc.py [-h] [--cmds CMDS] [--line-size LINE_SIZE]
+                            [--noise NOISE] [--rounds ROUNDS]
+
+optional arguments:
+  --cmds, -n
+                        Number of commands recorded (default: 200)
+  --line-size, -s
+                        Number of data values per response (default: 16)
+  --noise
+                        Probability of noise lines (default: 0.9)
+  --rounds, -r
+                        Number of replays of the session (default: 20)
+```
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from riot_pal.dut_emulator import DutEmulator
+from riot_pal.dut_shell import DutShell
+from riot_pal.session_record import ReplayDriver
+
+
+def record(path, protocol, cmds, pargs):
+    """Records the responses of the emulator to the commands."""
+    emulator = DutEmulator(protocol, line_size=pargs.line_size,
+                           noise=pargs.noise, seed=0)
+    try:
+        dut = DutShell(emulator.start_pty(), parser=protocol, timeout=1,
+                       record=path)
+        for cmd in cmds:
+            dut.send_cmd(cmd)
+        dut.close()
+    finally:
+        emulator.stop()
+
+
+def replay(path, protocol, cmds, raw, rounds, trace=False):
+    """Replays a session through a parser reading text or bytes."""
+    driver = ReplayDriver(path)
+    dut = DutShell(driver_type='driver', driver=driver, parser=protocol)
+    dut.parser.READ_RAW = raw
+    peak = 0
+    elapsed = None
+    for _ in range(rounds):
+        driver.rewind()
+        start = time.perf_counter()
+        for cmd in cmds:
+            if trace:
+                tracemalloc.reset_peak()
+                base = tracemalloc.get_traced_memory()[0]
+                dut.send_cmd(cmd)
+                peak = max(peak, tracemalloc.get_traced_memory()[1] - base)
+            else:
+                dut.send_cmd(cmd)
+        # The fastest round is least disturbed by other processes
+        round_time = time.perf_counter() - start
+        if elapsed is None or round_time < elapsed:
+            elapsed = round_time
+    return {'cmds_per_sec': len(cmds) / elapsed,
+            'us_per_cmd': elapsed / len(cmds) * 1e6,
+            'peak_bytes': peak}
+
+
+def main():
+    """Main program"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cmds', '-n', type=int, default=200,
+                        help='Number of commands recorded')
+    parser.add_argument('--line-size', '-s', type=int, default=16,
+                        help='Number of data values per response')
+    parser.add_argument('--noise', type=float, default=0.9,
+                        help='Probability of noise lines')
+    parser.add_argument('--rounds', '-r', type=int, default=20,
+                        help='Number of replays of the session')
+    pargs = parser.parse_args()
+
+    cmds = ['read_reg 0 {}'.format(pargs.line_size)] * pargs.cmds
+    print("{:<16} {:>10} {:>10} {:>14}".format('case', 'cmds/sec',
+                                               'us/cmd', 'peak B/cmd'))
+    with tempfile.TemporaryDirectory() as tmp:
+        for protocol in ('shell', 'json'):
+            path = os.path.join(tmp, protocol + '.rec')
+            record(path, protocol, cmds, pargs)
+            for raw in (False, True):
+                res = replay(path, protocol, cmds, raw, pargs.rounds)
+                tracemalloc.start()
+                try:
+                    res['peak_bytes'] = replay(path, protocol, cmds, raw, 1,
+                                               trace=True)['peak_bytes']
+                finally:
+                    tracemalloc.stop()
+                case = '{}_{}'.format(protocol, 'bytes' if raw else 'text')
+                print("{:<16} {cmds_per_sec:>10.0f} {us_per_cmd:>10.1f} "
+                      "{peak_bytes:>14}".format(case, **res))
+
+
+if __name__ == '__main__':
+    main()
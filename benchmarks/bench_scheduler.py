@@ -0,0 +1,73 @@
+#! /usr/bin/env python3
+# Copyright (c) 2019 Kevin Weiss, for HAW Hamburg  <kevin.weiss@haw-hamburg.de>
+#
+# This file is subject to the terms and conditions of the MIT License. See the
+# file LICENSE in the top level directory for more details.
+# SPDX-License-Identifier:    MIT
+"""
+Measures how the throughput of the device lease scheduler scales with the
+number of boards.  Each board is a DUT emulator with a response latency.
+
+Usage
+-----
+
+```
+usage: bench_scheduler.py   [-h] [--tasks TASKS] [--boards BOARDS]
+                            [--latency LATENCY]
+
+optional arguments:
+  --tasks, -n
+                        Number of tasks (default: 200)
+  --boards, -b
+                        Maximum number of boards (default: 4)
+  --latency, -l
+                        Response latency of the emulators (default: 0.01)
+```
+"""
+import argparse
+import multiprocessing
+import time
+from riot_pal.dut_emulator import DutEmulator
+from riot_pal.scheduler import DutScheduler
+
+
+def _task(dut, task):
+    return dut.send_cmd('read_reg {} 4'.format(task))['result']
+
+
+def bench_boards(boards, pargs):
+    """Returns the tasks per second on a number of boards."""
+    emulators = [DutEmulator(latency=pargs.latency) for _ in range(boards)]
+    try:
+        scheduler = DutScheduler(
+            [emulator.start_pty() for emulator in emulators],
+            mp_context=multiprocessing.get_context('fork'))
+        start = time.perf_counter()
+        scheduler.run(_task, range(pargs.tasks))
+        return pargs.tasks / (time.perf_counter() - start)
+    finally:
+        for emulator in emulators:
+            emulator.stop()
+
+
+def main():
+    """Main program"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tasks', '-n', type=int, default=200,
+                        help='Number of tasks')
+    parser.add_argument('--boards', '-b', type=int, default=4,
+                        help='Maximum number of boards')
+    parser.add_argument('--latency', '-l', type=float, default=0.01,
+                        help='Response latency of the emulators')
+    pargs = parser.parse_args()
+
+    print("{:>6} {:>10} {:>8}".format('boards', 'tasks/sec', 'speedup'))
+    single = None
+    for boards in range(1, pargs.boards + 1):
+        rate = bench_boards(boards, pargs)
+        single = single or rate
+        print("{:>6} {:>10.1f} {:>8.2f}".format(boards, rate, rate / single))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#! /usr/bin/env python3
+# Copyright (c) 2019 Kevin Weiss, for HAW Hamburg  <kevin.weiss@haw-hamburg.de>
+#
+# This file is subject to the terms and conditions of the MIT License. See the
+# file LICENSE in the top level directory for more details.
+# SPDX-License-Identifier:    MIT
+"""
+Compares the buffered SerialDriver readline with the byte-wise pyserial
+readline it replaced.
+
+Usage
+-----
+
+```
+usage: bench_serial_readline.py [-h] [--lines LINES] [--line-size LINE_SIZE]
+                                [--pty]
+
+optional arguments:
+  --lines, -n
+                        Number of lines to read (default: 20000)
+  --line-size, -s
+                        Bytes per line including the newline (default: 64)
+  --pty
+                        Use a pseudo terminal instead of a loop:// port
+```
+"""
+import argparse
+import os
+import time
+import tty
+from riot_pal.serial_driver import SerialDriver
+
+
+class LegacySerialDriver(SerialDriver):
+    """SerialDriver reading with the pyserial readline."""
+
+    def _buffered_readline(self):
+        return self._dev.readline()
+
+
+def _open(driver_cls, use_pty):
+    if not use_pty:
+        return driver_cls('loop://', timeout=1), None
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    driver = driver_cls(os.ttyname(slave), timeout=1)
+    os.close(slave)
+    return driver, master
+
+
+def bench(driver_cls, lines, line_size, use_pty):
+    """Returns lines/sec and CPU usec per line of a driver class."""
+    driver, master = _open(driver_cls, use_pty)
+    line = b'x' * (line_size - 1) + b'\n'
+    # loop:// blocks writes beyond its 4096 byte queue
+    batch = max(1, 4000 // line_size)
+    read = 0
+    wall = 0
+    cpu = 0
+    while read < lines:
+        count = min(batch, lines - read)
+        if master is None:
+            # pylint: disable=W0212
+            driver._dev.write(line * count)
+        else:
+            os.write(master, line * count)
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        for _ in range(count):
+            driver.readline()
+        cpu += time.process_time() - cpu_start
+        wall += time.perf_counter() - wall_start
+        read += count
+    driver.close()
+    if master is not None:
+        os.close(master)
+    return lines / wall, cpu / lines * 1e6
+
+
+def main():
+    """Main program"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lines', '-n', type=int, default=20000,
+                        help='Number of lines to read')
+    parser.add_argument('--line-size', '-s', type=int, default=64,
+                        help='Bytes per line including the newline')
+    parser.add_argument('--pty', default=False, action='store_true',
+                        help='Use a pseudo terminal instead of a loop:// port')
+    pargs = parser.parse_args()
+
+    print("{:<10} {:>12} {:>14}".format('readline', 'lines/sec',
+                                        'cpu us/line'))
+    for name, driver_cls in (('pyserial', LegacySerialDriver),
+                             ('buffered', SerialDriver)):
+        rate, cpu = bench(driver_cls, pargs.lines, pargs.line_size, pargs.pty)
+        print("{:<10} {:>12.0f} {:>14.1f}".format(name, rate, cpu))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,352 @@
+#! /usr/bin/env python3
+# Copyright (c) 2019 Kevin Weiss, for HAW Hamburg  <kevin.weiss@haw-hamburg.de>
+#
+# This file is subject to the terms and conditions of the MIT License. See the
+# file LICENSE in the top level directory for more details.
+# SPDX-License-Identifier:    MIT
+"""
+Throughput and latency benchmarks of the drivers and parsers against the DUT
+emulator.  The emulator runs in its own process so the CPU time only covers
+the benchmarked code.
+
+Results can be stored as a baseline and later runs compared against it, the
+comparison fails if the throughput drops or the CPU time per command rises
+by more than the tolerance.  Each case is run several rounds and the best
+round counts, so short load spikes of the host are not reported.
+
+The numbers depend on the host, a baseline is only meaningful on the host
+that recorded it.  Record one with --save-baseline before comparing,
+benchmarks/baseline.json is not committed.  baseline.example.json shows the
+format and the numbers of one machine.
+
+On a busy or small host a stored baseline is too noisy, then compare with a
+reference tree in the same run instead.  The rounds of the reference and of
+this tree alternate in fresh interpreters, so both see the same load:
+
+    git worktree add /tmp/ref <commit>
+    PYTHONPATH=. python3 benchmarks/bench_suite.py --reference /tmp/ref
+
+Usage
+-----
+
+```
+usage: bench_suite.py   [-h] [--cmds CMDS] [--line-size LINE_SIZE]
+                        [--latency LATENCY] [--noise NOISE] [--case CASE]
+                        [--rounds ROUNDS] [--baseline BASELINE]
+                        [--save-baseline] [--compare] [--reference REFERENCE]
+                        [--tolerance TOLERANCE]
+
+optional arguments:
+  --cmds, -n
+                        Number of commands per case (default: 500)
+  --line-size, -s
+                        Number of data values per response (default: 16)
+  --latency, -l
+                        Response latency of the emulator (default: 0)
+  --noise
+                        Probability of noise lines (default: 0)
+  --case, -c
+                        Only run the case, can be repeated
+  --rounds, -r
+                        Rounds per case, the best one counts (default: 3)
+  --baseline, -b
+                        Baseline file (default: benchmarks/baseline.json)
+  --save-baseline
+                        Stores the results as the baseline
+  --compare
+                        Compares the results with the baseline
+  --reference
+                        Compares with the source tree in the same run
+                        instead of the baseline
+  --tolerance, -t
+                        Allowed relative regression (default: 0.25)
+```
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import riot_pal
+from riot_pal.dut_shell import DutShell
+from riot_pal.serial_driver import SerialDriver
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(riot_pal.__file__)))
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'baseline.json')
+PIPELINE_BATCH = 16
+
+
+def _emulator_args(protocol, pargs):
+    return ['-m', 'riot_pal.dut_emulator', '--protocol', protocol,
+            '--latency', str(pargs.latency), '--noise', str(pargs.noise)]
+
+
+class _Emulator:
+    """Runs the emulator serving a pty in a subprocess."""
+
+    def __init__(self, protocol, pargs):
+        self.proc = subprocess.Popen([sys.executable] +
+                                     _emulator_args(protocol, pargs) +
+                                     ['--pty'], stdout=subprocess.PIPE,
+                                     universal_newlines=True)
+        self.path = self.proc.stdout.readline().strip()
+
+    def close(self):
+        """Stops the emulator."""
+        self.proc.terminate()
+        self.proc.wait()
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def _measure(send, cmds, batch=1):
+    latencies = []
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for i in range(0, len(cmds), batch):
+        start = time.perf_counter()
+        send(cmds[i:i + batch] if batch > 1 else cmds[i])
+        count = min(batch, len(cmds) - i)
+        latencies.extend([(time.perf_counter() - start) / count] * count)
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    return {'cmds_per_sec': len(cmds) / wall,
+            'p50_ms': _percentile(latencies, 50) * 1e3,
+            'p99_ms': _percentile(latencies, 99) * 1e3,
+            'cpu_us_per_cmd': cpu / len(cmds) * 1e6}
+
+
+def bench_serial_driver(cmds, pargs):
+    """Raw writes and readlines of the SerialDriver."""
+    emulator = _Emulator('shell', pargs)
+    driver = SerialDriver(emulator.path, timeout=1)
+
+    def _send(cmd):
+        driver.write(cmd)
+        while not driver.readline().startswith(('Success', 'Error')):
+            pass
+    try:
+        return _measure(_send, cmds)
+    finally:
+        driver.close()
+        emulator.close()
+
+
+def bench_riot_termprog(cmds, pargs):
+    """The shell parser on a RiotDriver spawning a pty terminal program."""
+    termflags = ' '.join(_emulator_args('shell', pargs))
+    dut = DutShell(driver_type='riot', mode='termprog',
+                   termprog=sys.executable, termflags=termflags, timeout=1,
+                   send_delay=0)
+    try:
+        return _measure(dut.send_cmd, cmds)
+    finally:
+        dut.close()
+
+
+def _bench_parser(cmds, pargs, parser, pipelined=False):
+    emulator = _Emulator('json' if parser == 'json' else 'shell', pargs)
+    dut = DutShell(emulator.path, parser=parser, timeout=1)
+    try:
+        if pipelined:
+            return _measure(dut.send_cmds, cmds, PIPELINE_BATCH)
+        return _measure(dut.send_cmd, cmds)
+    finally:
+        dut.close()
+        emulator.close()
+
+
+def bench_shell_parser(cmds, pargs):
+    """The shell parser on a SerialDriver."""
+    return _bench_parser(cmds, pargs, 'shell')
+
+
+def bench_json_parser(cmds, pargs):
+    """The JSON parser on a SerialDriver."""
+    return _bench_parser(cmds, pargs, 'json')
+
+
+def bench_shell_pipelined(cmds, pargs):
+    """Pipelined batches of the shell parser on a SerialDriver."""
+    return _bench_parser(cmds, pargs, 'shell', pipelined=True)
+
+
+def bench_framed_parser(cmds, pargs):
+    """Binary framed responses on a SerialDriver."""
+    return _bench_parser(cmds, pargs, 'framed')
+
+
+CASES = {
+    'serial_driver': bench_serial_driver,
+    'riot_termprog': bench_riot_termprog,
+    'shell_parser': bench_shell_parser,
+    'json_parser': bench_json_parser,
+    'shell_pipelined': bench_shell_pipelined,
+    'framed_parser': bench_framed_parser,
+}
+
+
+def run_case(case, cmds, pargs):
+    """Returns the best throughput and CPU time of several rounds, the
+    latencies are the ones of the fastest round."""
+    return _best([CASES[case](cmds, pargs)
+                  for _ in range(max(pargs.rounds, 1))])
+
+
+def _run_tree(root, case, pargs):
+    """Runs one round of a case with the package of a source tree."""
+    env = dict(os.environ, PYTHONPATH=root)
+    args = [sys.executable, os.path.abspath(__file__), '--case', case,
+            '--rounds', '1', '--json', '--cmds', str(pargs.cmds),
+            '--line-size', str(pargs.line_size), '--latency',
+            str(pargs.latency), '--noise', str(pargs.noise)]
+    proc = subprocess.run(args, env=env, stdout=subprocess.PIPE,
+                          universal_newlines=True)
+    if proc.returncode:
+        return None
+    return json.loads(proc.stdout)[case]
+
+
+def run_reference(case, pargs):
+    """Returns the best rounds of the reference and of this tree, the rounds
+    alternate so both see the same load.  The reference is None if it
+    cannot run the case."""
+    rounds = {'reference': [], 'current': []}
+    for _ in range(max(pargs.rounds, 1)):
+        for name, root in (('reference', pargs.reference), ('current', ROOT)):
+            res = _run_tree(root, case, pargs)
+            if res is not None:
+                rounds[name].append(res)
+    return {name: _best(results) if results else None
+            for name, results in rounds.items()}
+
+
+def _best(rounds):
+    best = dict(max(rounds, key=lambda res: res['cmds_per_sec']))
+    best['cpu_us_per_cmd'] = min(res['cpu_us_per_cmd'] for res in rounds)
+    return best
+
+
+def compare(results, baseline, tolerance):
+    """Returns the regressions of the results compared to a baseline."""
+    regressions = []
+    for case, res in results.items():
+        base = baseline.get(case)
+        if base is None:
+            continue
+        if res['cmds_per_sec'] < base['cmds_per_sec'] * (1 - tolerance):
+            regressions.append('{}: {:.0f} cmds/sec, baseline {:.0f}'.format(
+                case, res['cmds_per_sec'], base['cmds_per_sec']))
+        if res['cpu_us_per_cmd'] > base['cpu_us_per_cmd'] * (1 + tolerance):
+            regressions.append('{}: {:.1f} cpu us/cmd, baseline {:.1f}'.format(
+                case, res['cpu_us_per_cmd'], base['cpu_us_per_cmd']))
+    return regressions
+
+
+def compare_reference(pargs):
+    """Compares the cases with a reference tree and exits with 1 on a
+    regression."""
+    pargs.reference = os.path.abspath(pargs.reference)
+    print("{:<16} {:>10} {:>10} {:>12} {:>12}".format(
+        'case', 'cmds/sec', 'reference', 'cpu us/cmd', 'reference'))
+    regressions = []
+    for case in pargs.case or CASES:
+        res = run_reference(case, pargs)
+        if res['current'] is None:
+            print('{:<16} failed'.format(case))
+            regressions.append('{}: failed'.format(case))
+            continue
+        if res['reference'] is None:
+            print('{:<16} not supported by the reference'.format(case))
+            continue
+        print("{:<16} {:>10.0f} {:>10.0f} {:>12.1f} {:>12.1f}".format(
+            case, res['current']['cmds_per_sec'],
+            res['reference']['cmds_per_sec'],
+            res['current']['cpu_us_per_cmd'],
+            res['reference']['cpu_us_per_cmd']))
+        regressions.extend(compare({case: res['current']},
+                                   {case: res['reference']}, pargs.tolerance))
+    for regression in regressions:
+        print('REGRESSION ' + regression.replace('baseline', 'reference'))
+    if regressions:
+        sys.exit(1)
+
+
+def main():
+    """Main program"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cmds', '-n', type=int, default=500,
+                        help='Number of commands per case')
+    parser.add_argument('--line-size', '-s', type=int, default=16,
+                        help='Number of data values per response')
+    parser.add_argument('--latency', '-l', type=float, default=0,
+                        help='Response latency of the emulator')
+    parser.add_argument('--noise', type=float, default=0,
+                        help='Probability of noise lines')
+    parser.add_argument('--case', '-c', action='append', choices=list(CASES),
+                        help='Only run the case, can be repeated')
+    parser.add_argument('--rounds', '-r', type=int, default=3,
+                        help='Rounds per case, the best one counts')
+    parser.add_argument('--baseline', '-b', default=DEFAULT_BASELINE,
+                        help='Baseline file of this host')
+    parser.add_argument('--save-baseline', default=False, action='store_true',
+                        help='Stores the results as the baseline')
+    parser.add_argument('--compare', default=False, action='store_true',
+                        help='Compares the results with the baseline')
+    parser.add_argument('--reference', default=None,
+                        help='Compares with the source tree in the same run '
+                        'instead of the baseline')
+    parser.add_argument('--json', default=False, action='store_true',
+                        help=argparse.SUPPRESS)
+    parser.add_argument('--tolerance', '-t', type=float, default=0.25,
+                        help='Allowed relative regression')
+    pargs = parser.parse_args()
+    if pargs.compare and not os.path.exists(pargs.baseline):
+        parser.error('No baseline {}, record one on this host with '
+                     '--save-baseline first'.format(pargs.baseline))
+
+    # The spawned emulators must find the package that is benchmarked
+    os.environ['PYTHONPATH'] = os.pathsep.join(
+        [ROOT] + [path for path in [os.environ.get('PYTHONPATH')] if path])
+    cmds = ['read_reg 0 {}'.format(pargs.line_size)] * pargs.cmds
+    if pargs.json:
+        print(json.dumps({case: run_case(case, cmds, pargs)
+                          for case in pargs.case or CASES}))
+        return
+    if pargs.reference is not None:
+        compare_reference(pargs)
+        return
+    results = {}
+    print("{:<16} {:>10} {:>9} {:>9} {:>12}".format(
+        'case', 'cmds/sec', 'p50 ms', 'p99 ms', 'cpu us/cmd'))
+    for case in pargs.case or CASES:
+        res = run_case(case, cmds, pargs)
+        results[case] = res
+        print("{:<16} {cmds_per_sec:>10.0f} {p50_ms:>9.3f} {p99_ms:>9.3f} "
+              "{cpu_us_per_cmd:>12.1f}".format(case, **res))
+
+    if pargs.save_baseline:
+        baseline = {}
+        if os.path.exists(pargs.baseline):
+            with open(pargs.baseline) as baseline_file:
+                baseline = json.load(baseline_file)
+        baseline.update(results)
+        with open(pargs.baseline, 'w') as baseline_file:
+            json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+    if pargs.compare:
+        with open(pargs.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file),
+                                  pargs.tolerance)
+        for regression in regressions:
+            print('REGRESSION ' + regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+# Copyright (c) 2019 Kevin Weiss, for HAW Hamburg  <kevin.weiss@haw-hamburg.de>
+#
+# This file is subject to the terms and conditions of the MIT License. See the
+# file LICENSE in the top level directory for more details.
+# SPDX-License-Identifier:    MIT
+"""Adaptive Timeouts for RIOT PAL
+This module learns the response latency of each command name and derives
+the deadline of the next command from a high percentile of the latest
+latencies.  Fast commands then fail fast and slow commands, such as a flash
+erase, get the time they usually need.
+
+Until enough latencies of a command are known the default timeout is used.
+Timed out commands are recorded with the time they waited so repeated
+timeouts raise the deadline of the command.
+
+Example:
+    dut = DutShell('/dev/ttyACM0', adaptive_timeout=AdaptiveTimeout())
+"""
+import threading
+from collections import deque
+
+
+class AdaptiveTimeout:
+    """Derives command timeouts from observed latencies.
+
+    Args:
+        percentile(float): Percentile of the latencies used.
+        factor(float): Margin the percentile is multiplied with.
+        min_timeout(float): Lower bound of a timeout.
+        max_timeout(float): Upper bound of a timeout, None is unbounded.
+        default(float): Timeout until min_samples latencies are known, None
+            keeps the timeout of the driver.
+        window(int): Latest latencies kept per command name.
+        min_samples(int): Latencies needed before a timeout is derived.
+    """
+    DEFAULT_PERCENTILE = 99
+    DEFAULT_FACTOR = 2
+    DEFAULT_MIN_TIMEOUT = 0.05
+    DEFAULT_WINDOW = 100
+    DEFAULT_MIN_SAMPLES = 10
+
+    def __init__(self, percentile=DEFAULT_PERCENTILE, factor=DEFAULT_FACTOR,
+                 min_timeout=DEFAULT_MIN_TIMEOUT, max_timeout=None,
+                 default=None, window=DEFAULT_WINDOW,
+                 min_samples=DEFAULT_MIN_SAMPLES):
+        self.percentile = percentile
+        self.factor = factor
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.default = default
+        self.window = window
+        self.min_samples = min_samples
+        self._latencies = {}
+        self._timeouts = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _name(cmd):
+        return cmd.split(' ', 1)[0]
+
+    def _derive(self, latencies):
+        latencies = sorted(latencies)
+        idx = min(len(latencies) - 1,
+                  int(len(latencies) * self.percentile / 100))
+        timeout = max(latencies[idx] * self.factor, self.min_timeout)
+        if self.max_timeout is not None:
+            timeout = min(timeout, self.max_timeout)
+        return timeout
+
+    def timeout(self, cmd):
+        """Returns the timeout of a command or the default."""
+        with self._lock:
+            name = self._name(cmd)
+            timeout = self._timeouts.get(name)
+            if timeout is None:
+                latencies = self._latencies.get(name)
+                if latencies is None or len(latencies) < self.min_samples:
+                    return self.default
+                timeout = self._derive(latencies)
+                self._timeouts[name] = timeout
+            return timeout
+
+    def record(self, cmd, latency):
+        """Adds the latency of a response or the time a timeout waited."""
+        with self._lock:
+            name = self._name(cmd)
+            latencies = self._latencies.get(name)
+            if latencies is None:
+                latencies = deque(maxlen=self.window)
+                self._latencies[name] = latencies
+            latencies.append(latency)
+            # Derived again on the next lookup
+            self._timeouts.pop(name, None)
+
+    def stats(self):
+        """Returns the number of latencies and the timeout per command name.
+        """
+        with self._lock:
+            names = list(self._latencies)
+        return {name: {'samples': len(self._latencies[name]),
+                       'timeout': self.timeout(name)} for name in names}
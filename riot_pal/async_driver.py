@@ -0,0 +1,214 @@
+# Copyright (c) 2019 Kevin Weiss, for HAW Hamburg  <kevin.weiss@haw-hamburg.de>
+#
+# This file is subject to the terms and conditions of the MIT License. See the
+# file LICENSE in the top level directory for more details.
+# SPDX-License-Identifier:    MIT
+"""asyncio Drivers for RIOT PAL
+This module wraps the blocking drivers so many devices can be handled from a
+single event loop.  The connection setup is done by the blocking drivers, only
+the IO is done without blocking.  If the underlying file descriptor is
+available the event loop is notified when data arrives, otherwise the driver
+polls.  Writes run the blocking driver in the default executor so a stalled
+port does not hold up the other devices.
+
+Example:
+    async def read_both(dev1, dev2):
+        return await asyncio.gather(dev1.readline(), dev2.readline())
+
+    devs = AsyncSerialDriver('/dev/ttyACM0'), AsyncSerialDriver('/dev/ttyACM1')
+    asyncio.get_event_loop().run_until_complete(read_both(*devs))
+"""
+import asyncio
+import functools
+import logging
+import pexpect
+try:
+    from .serial_driver import SerialDriver
+    from .riot_driver import RiotDriver
+except ImportError:
+    from serial_driver import SerialDriver
+    from riot_driver import RiotDriver
+
+
+class _AsyncLineReader:
+    """Collects data from a non-blocking source and splits it into lines.
+
+    Subclasses provide _read_available, returning whatever data is available
+    without blocking, and _fileno, returning the file descriptor to wait on or
+    None to poll.
+    """
+    POLL_INTERVAL = 0.001
+    NEWLINE = b'\n'
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self._rx_buf = self.NEWLINE[:0]
+
+    def _read_available(self):
+        raise NotImplementedError()
+
+    def _fileno(self):
+        raise NotImplementedError()
+
+    async def _wait_readable(self):
+        fd = self._fileno()
+        if fd is None:
+            await asyncio.sleep(self.POLL_INTERVAL)
+            return
+        loop = asyncio.get_event_loop()
+        readable = loop.create_future()
+
+        def _on_readable():
+            if not readable.done():
+                readable.set_result(None)
+        loop.add_reader(fd, _on_readable)
+        try:
+            await readable
+        finally:
+            loop.remove_reader(fd)
+
+    async def _read_line(self):
+        while True:
+            idx = self._rx_buf.find(self.NEWLINE)
+            if idx >= 0:
+                line = self._rx_buf[:idx + 1]
+                self._rx_buf = self._rx_buf[idx + 1:]
+                return line
+            data = self._read_available()
+            if data:
+                self._rx_buf += data
+            else:
+                await self._wait_readable()
+
+    async def _read_line_timeout(self, timeout=None):
+        if timeout is None:
+            timeout = self.timeout
+        try:
+            return await asyncio.wait_for(self._read_line(), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError
+
+    def _clear(self):
+        self._rx_buf = self.NEWLINE[:0]
+
+    @staticmethod
+    async def _in_executor(func, *args, **kwargs):
+        """Runs a blocking call in the default executor."""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            None, functools.partial(func, *args, **kwargs))
+
+
+class AsyncSerialDriver(_AsyncLineReader):
+    """asyncio version of the SerialDriver.
+
+    Args:
+        *args: Passed through to the SerialDriver.
+        **kwargs: Passed through to the SerialDriver.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.driver = SerialDriver(*args, **kwargs)
+        super().__init__(self.driver.kwargs['timeout'])
+
+    def _read_available(self):
+        # pylint: disable=W0212
+        dev = self.driver._dev
+        waiting = dev.in_waiting
+        if waiting:
+            return dev.read(waiting)
+        return b''
+
+    def _fileno(self):
+        try:
+            # pylint: disable=W0212
+            return self.driver._dev.fileno()
+        except (AttributeError, IOError, ValueError):
+            return None
+
+    def close(self):
+        """Close serial connection."""
+        self.driver.close()
+
+    async def readline(self, timeout=None):
+        """Read and decode to utf-8 data.
+
+        Args:
+            timeout(float): Overrides the timeout of the connection.
+
+        Returns:
+            str: string of data if success.
+
+        Raises:
+            TimeoutError: If no complete line arrives in time.
+        """
+        res_bytes = await self._read_line_timeout(timeout)
+        response = res_bytes.decode("utf-8", errors="ignore")
+        if logging.root.isEnabledFor(logging.DEBUG):
+            logging.debug("Response: %s", response.replace('\n', ''))
+        return response
+
+    async def write(self, data, flush_input=True):
+        """Writes data to a driver.  It will encode to utf-8 and add a newline
+
+        Args:
+            data(str): string to send to the driver.
+            flush_input(bool): Clears pending input before writing.
+        """
+        if flush_input:
+            self._clear()
+        await self._in_executor(self.driver.write, data,
+                                flush_input=flush_input)
+
+
+class AsyncRiotDriver(_AsyncLineReader):
+    """asyncio version of the RiotDriver.
+
+    Args:
+        *args: Passed through to the RiotDriver.
+        **kwargs: Passed through to the RiotDriver.
+    """
+    NEWLINE = '\n'
+    READ_SIZE = 4096
+
+    def __init__(self, *args, **kwargs):
+        self.driver = RiotDriver(*args, **kwargs)
+        if self.driver.child is None:
+            self.driver.close()
+            raise ValueError("Use the AsyncSerialDriver for direct mode")
+        super().__init__(self.driver.child.timeout)
+
+    def _read_available(self):
+        try:
+            return self.driver.child.read_nonblocking(self.READ_SIZE,
+                                                      timeout=0)
+        except pexpect.TIMEOUT:
+            return ''
+
+    def _fileno(self):
+        return self.driver.child.child_fd
+
+    def close(self):
+        """Closes the spawned process"""
+        self.driver.close()
+
+    async def readline(self, timeout=None):
+        """Reads a line from the make term process and strips away all
+        additional data so only the output of the device is left.
+
+        Raises:
+            TimeoutError: If no complete line arrives in time.
+        """
+        try:
+            response = await self._read_line_timeout(timeout)
+        except pexpect.EOF as exc:
+            logging.debug(exc)
+            raise TimeoutError
+        response = RiotDriver.strip_response(response)
+        logging.debug("Response: %s", response)
+        return response
+
+    async def write(self, data, flush_input=True):
+        """Tries write data and adds a newline."""
+        await self._in_executor(self.driver.write, data,
+                                flush_input=flush_input)
@@ -0,0 +1,98 @@
+# Copyright (c) 2019 Kevin Weiss, for HAW Hamburg  <kevin.weiss@haw-hamburg.de>
+#
+# This file is subject to the terms and conditions of the MIT License. See the
+# file LICENSE in the top level directory for more details.
+# SPDX-License-Identifier:    MIT
+"""asyncio Device Under Tests Shell for RIOT PAL
+This module runs the DutShell parsers on top of the asyncio drivers so
+commands can be sent to many boards from one event loop.
+
+Example:
+    async def read_all(duts):
+        return await asyncio.gather(*(dut.send_cmd('help', timeout=2)
+                                      for dut in duts))
+
+    duts = [AsyncDutShell(port) for port in ('/dev/ttyACM0', '/dev/ttyACM1')]
+    asyncio.get_event_loop().run_until_complete(read_all(duts))
+"""
+import asyncio
+try:
+    from .async_driver import AsyncSerialDriver, AsyncRiotDriver
+    from .dut_shell import ShellParser, JSONParser
+except ImportError:
+    from async_driver import AsyncSerialDriver, AsyncRiotDriver
+    from dut_shell import ShellParser, JSONParser
+
+
+class AsyncDutShell:
+    """asyncio Device Under Test shell class
+
+    Commands to one shell are serialized, commands to different shells run
+    concurrently.
+
+    Args:
+        parser(str): Selects the parser to use {shell, json}
+        driver_type(str): Selects the driver {serial, riot, driver}, 'driver'
+            uses an already created async driver passed with driver.
+        *args: Passed through to the driver.
+        **kwargs: Passed through to the driver.
+    """
+
+    def __init__(self, *args, **kwargs):
+        parser = kwargs.pop('parser', 'shell')
+        self._driver = self._driver_from_config(*args, **kwargs)
+        if parser == 'shell':
+            self.parser = ShellParser(self._driver)
+        elif parser == 'json':
+            # pylint: disable=R0204
+            self.parser = JSONParser(self._driver)
+        else:
+            raise NotImplementedError()
+        self._lock = None
+
+    @staticmethod
+    def _driver_from_config(*args, **kwargs):
+        """Returns async driver instance given configuration"""
+        driver_type = kwargs.pop('driver_type', 'serial')
+
+        if driver_type == 'serial':
+            return AsyncSerialDriver(*args, **kwargs)
+        elif driver_type == 'riot':
+            return AsyncRiotDriver(*args, **kwargs)
+        elif driver_type == 'driver':
+            return kwargs['driver']
+        raise NotImplementedError()
+
+    def close(self):
+        """Closes the device connection."""
+        self._driver.close()
+
+    async def _read_response(self, cmd_info):
+        # pylint: disable=W0212
+        while not self.parser._parse_line(cmd_info,
+                                          await self._driver.readline()):
+            pass
+
+    async def send_cmd(self, cmd_to_send, timeout=None):
+        """Sends a command and returns the parsed result dict.
+
+        Args:
+            cmd_to_send(str): The command to write to the device.
+            timeout(float): Deadline for the whole command, if None only the
+                read timeout of the driver applies.
+
+        Returns:
+            dict: The same result dict as DutShell.send_cmd.
+        """
+        # The lock is created lazily so it belongs to the running loop
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            await self._driver.write(cmd_to_send)
+            # pylint: disable=W0212
+            cmd_info = self.parser._new_cmd_info(cmd_to_send)
+            try:
+                await asyncio.wait_for(self._read_response(cmd_info), timeout)
+            except (TimeoutError, asyncio.TimeoutError):
+                self.parser._timeout(cmd_info)
+        return cmd_info
@@ -17,14 +17,18 @@ Example:
     example_use_case.show_example()
 """
 import logging
+import os
+from contextlib import ExitStack
 try:
-    from .serial_driver import SerialDriver
+    from .driver_mux import DriverMux
+    from .driver_pool import DriverPool
+    from .driver_registry import get_driver, call_read
+    from .session_record import RecordingDriver
 except ImportError:
-    from serial_driver import SerialDriver
-try:
-    from .riot_driver import RiotDriver
-except ImportError:
-    from riot_driver import RiotDriver
+    from driver_mux import DriverMux
+    from driver_pool import DriverPool
+    from driver_registry import get_driver, call_read
+    from session_record import RecordingDriver
 
 
 class BaseDevice:
@@ -35,49 +39,177 @@ class BaseDevice:
             'serial' uses the standard serial port, all following arguments
             get passed through.
             'riot' uses the riot make term system.
+            'driver' uses the driver instance passed with driver, if it is a
+            DriverMux the device attaches as a consumer.
+            Other types are looked up in the driver registry, see
+            riot_pal.driver_registry.
+        priority(int): Transaction priority if the driver is shared, lower
+            values are served first.
+        pool(bool, DriverPool): Leases the driver from a pool, True uses the
+            process wide pool.  If the environment variable
+            RIOT_PAL_DRIVER_POOL is 1 the process wide pool is the default.
+        metrics(CommandMetrics): Records the metrics of the driver.
+        record(str, IOTracer): Records the writes and reads of the driver
+            into a session file that the 'replay' driver_type can serve
+            back, see riot_pal.session_record, or into an I/O trace, see
+            riot_pal.io_trace.
         *args: Variable length argument list.
         **kwargs: Arbitrary keyword arguments.
     """
 
     def __init__(self, *args, **kwargs):
+        priority = kwargs.pop('priority', 0)
+        metrics = kwargs.pop('metrics', None)
+        record = kwargs.pop('record', None)
+        if 'pool' not in kwargs:
+            kwargs['pool'] = os.environ.get('RIOT_PAL_DRIVER_POOL') == '1'
+        if kwargs['pool'] is True:
+            kwargs['pool'] = DriverPool.default()
+        self._pool = kwargs['pool'] or None
+        if kwargs.get('driver_type') == 'driver':
+            self._pool = None
         self._driver = self._driver_from_config(*args, **kwargs)
+        self._consumer = None
+        if record is not None:
+            if isinstance(self._driver, DriverMux):
+                raise ValueError("A shared driver cannot be recorded")
+            self._driver = RecordingDriver(self._driver, record)
+        if isinstance(self._driver, DriverMux):
+            self._consumer = self._driver.attach(priority)
+        # Pooled drivers must not keep the metrics of a previous lease
+        if metrics is not None or self._pool is not None:
+            self._set_metrics(metrics)
+
+    def _close_driver(self, driver):
+        if isinstance(driver, RecordingDriver):
+            driver.close_record()
+            driver = driver.driver
+        if self._pool is None or not self._pool.release(driver):
+            driver.close()
 
     def close(self):
-        """Closes the device connection."""
-        self._driver.close()
+        """Closes the device connection.
+
+        A driver leased from a pool is returned to the pool instead.
+        """
+        if self._consumer is None:
+            self._close_driver(self._driver)
+        else:
+            self._consumer.close()
+
+    def _unwrapped_driver(self):
+        if isinstance(self._driver, DriverMux):
+            return self._driver.driver
+        return self._driver
+
+    def _set_metrics(self, metrics):
+        """Records the metrics of the driver, None disables it."""
+        self._unwrapped_driver().metrics = metrics
+
+    def _metrics(self):
+        """Returns the metrics recorded for the driver or None."""
+        return getattr(self._unwrapped_driver(), 'metrics', None)
 
-    def _readline(self):
+    def _transaction(self):
+        """Returns a context that owns the driver if it is shared.
+
+        All writes and reads of one command should be done in a transaction
+        so they cannot interleave with other devices sharing the driver.
+        """
+        if self._consumer is None:
+            return ExitStack()
+        return self._consumer.transaction()
+
+    def _shared_driver(self):
+        """Returns the driver wrapped in a DriverMux so it can be shared."""
+        if self._consumer is None:
+            self._driver = DriverMux(self._driver,
+                                     close_func=self._close_driver)
+            self._consumer = self._driver.attach()
+        return self._driver
+
+    def _readline(self, timeout=None):
         """Reads data from the driver.
 
+        Args:
+            timeout(float): Overrides the read timeout of the driver.
+
         Returns:
             str: string of data if success, driver defined error if failed.
         """
-        return self._driver.readline()
+        return call_read(self._driver.readline, timeout)
 
-    def _write(self, data):
+    def _readline_raw(self, timeout=None):
+        """Reads data from the driver without decoding it if possible.
+
+        Args:
+            timeout(float): Overrides the read timeout of the driver.
+
+        Returns:
+            bytes, str: bytes if the driver supports it, otherwise the string
+            of the readline.
+        """
+        readline_bytes = getattr(self._driver, 'readline_bytes', None)
+        if readline_bytes is None:
+            return call_read(self._driver.readline, timeout)
+        return call_read(readline_bytes, timeout)
+
+    def _read_frame(self, timeout=None):
+        """Reads a binary frame from the driver, see riot_pal.framing.
+
+        Args:
+            timeout(float): Overrides the read timeout of the driver.
+
+        Raises:
+            NotImplementedError: If the driver cannot read binary frames.
+        """
+        read_frame = getattr(self._driver, 'read_frame', None)
+        if read_frame is None:
+            raise NotImplementedError("Driver cannot read binary frames")
+        return call_read(read_frame, timeout)
+
+    def _write(self, data, flush_input=True):
         """Writes data to the driver.
 
         Args:
             data(str): Variable length argument list.
+            flush_input(bool): If False the driver must keep pending input,
+                used when responses of previous writes are still expected.
         """
-        return self._driver.write(data)
+        if flush_input:
+            return self._driver.write(data)
+        return self._driver.write(data, flush_input=False)
 
     @staticmethod
     def _driver_from_config(*args, **kwargs):
         """Returns driver instance given configuration"""
         driver_type = kwargs.pop('driver_type', 'serial')
+        pool = kwargs.pop('pool', None)
+
+        if pool and driver_type != 'driver':
+            return pool.lease(BaseDevice._create_driver, driver_type, *args,
+                              **kwargs)
+        return BaseDevice._create_driver(driver_type, *args, **kwargs)
 
-        if driver_type == 'serial':
-            return SerialDriver(*args, **kwargs)
-        elif driver_type == 'riot':
-            return RiotDriver(*args, **kwargs)
-        elif driver_type == 'driver':
+    @staticmethod
+    def _create_driver(driver_type, *args, **kwargs):
+        """Returns a new driver instance of the driver type"""
+        if driver_type == 'driver':
             return kwargs['driver']
-        raise NotImplementedError()
+        return get_driver(driver_type)(*args, **kwargs)
 
     @classmethod
-    def copy_driver(cls, device):
-        """Copies the driver instance so many devices can use one driver."""
+    def copy_driver(cls, device, priority=0):
+        """Copies the driver instance so many devices can use one driver.
+
+        The driver is shared through a DriverMux so devices can be used from
+        different threads.
+
+        Args:
+            device(BaseDevice): The device with the driver to share.
+            priority(int): Transaction priority of the new device.
+        """
         # pylint: disable=W0212
         logging.debug("Cloning Driver: %r", device._driver)
-        return cls(driver_type='driver', driver=device._driver)
+        return cls(driver_type='driver', driver=device._shared_driver(),
+                   priority=priority)
@@ -0,0 +1,229 @@
+# Copyright (c) 2019 Kevin Weiss, for HAW Hamburg  <kevin.weiss@haw-hamburg.de>
+#
+# This file is subject to the terms and conditions of the MIT License. See the
+# file LICENSE in the top level directory for more details.
+# SPDX-License-Identifier:    MIT
+"""Driver Multiplexer for RIOT PAL
+This module shares one driver between several devices that may run in
+different threads.  Each device is a consumer of the multiplexer and runs its
+commands as transactions, only one transaction owns the driver at a time so
+the writes and response lines of different consumers cannot interleave.
+Waiting transactions are served by priority, lower values first, and in
+order of arrival for the same priority.
+
+Example:
+    mux = DriverMux(SerialDriver('/dev/ttyACM0'))
+    consumer = mux.attach(priority=1)
+    with consumer.transaction():
+        mux.write('help')
+        print(mux.readline())
+"""
+import heapq
+import itertools
+import logging
+import threading
+import time
+try:
+    from .driver_registry import call_read
+except ImportError:
+    from driver_registry import call_read
+
+
+class MuxConsumer:
+    """A user of a shared driver.
+
+    Args:
+        mux(DriverMux): The multiplexer of the driver.
+        tag(int): Identifies the consumer in metrics and logs.
+        priority(int): Priority of the transactions, lower is served first.
+    """
+
+    def __init__(self, mux, tag, priority=0):
+        self.mux = mux
+        self.tag = tag
+        self.priority = priority
+        self.transactions = 0
+        self.lines = 0
+        self.wait_time = 0
+
+    def transaction(self, priority=None):
+        """Returns a context that owns the driver while it is entered.
+
+        Args:
+            priority(int): Overrides the priority of the consumer.
+        """
+        if priority is None:
+            priority = self.priority
+        return _Transaction(self, priority)
+
+    def close(self):
+        """Detaches from the driver, the last consumer closes it."""
+        self.mux.detach(self)
+
+
+class _Transaction:
+    def __init__(self, consumer, priority):
+        self.consumer = consumer
+        self.priority = priority
+
+    def __enter__(self):
+        # pylint: disable=W0212
+        self.consumer.mux._acquire(self.consumer, self.priority)
+        return self.consumer
+
+    def __exit__(self, *exc):
+        # pylint: disable=W0212
+        self.consumer.mux._release()
+
+
+class DriverMux:
+    """Thread safe multiplexer of a driver shared by several consumers.
+
+    Reads and writes outside of a transaction are done as a transaction of
+    their own.  Transactions are reentrant for the owning thread.
+
+    Args:
+        driver: The driver to share.
+        close_func: Called with the driver when the last consumer detaches,
+            defaults to closing the driver.
+    """
+
+    def __init__(self, driver, close_func=None):
+        self.driver = driver
+        self._close_func = close_func
+        self._cond = threading.Condition()
+        self._owner = None
+        self._owner_thread = None
+        self._owner_depth = 0
+        self._waiting = []
+        self._seq = itertools.count()
+        self._tags = itertools.count()
+        self._consumers = {}
+        self.transactions = 0
+        self.max_queue_depth = 0
+
+    def __getattr__(self, name):
+        # Driver specific attributes such as health_check pass through
+        if name == 'driver':
+            raise AttributeError(name)
+        return getattr(self.driver, name)
+
+    def attach(self, priority=0):
+        """Adds a consumer of the driver.
+
+        Returns:
+            MuxConsumer: The consumer used for transactions.
+        """
+        with self._cond:
+            consumer = MuxConsumer(self, next(self._tags), priority)
+            self._consumers[consumer.tag] = consumer
+        logging.debug("Attached consumer %d to %r", consumer.tag, self.driver)
+        return consumer
+
+    def detach(self, consumer):
+        """Removes a consumer, the driver is closed with the last one."""
+        with self._cond:
+            self._consumers.pop(consumer.tag, None)
+            last = not self._consumers
+        logging.debug("Detached consumer %d", consumer.tag)
+        if last:
+            if self._close_func is None:
+                self.driver.close()
+            else:
+                self._close_func(self.driver)
+
+    def close(self):
+        """Closes the driver regardless of the attached consumers."""
+        with self._cond:
+            self._consumers.clear()
+        self.driver.close()
+
+    @property
+    def queue_depth(self):
+        """int: Number of transactions waiting for the driver."""
+        return len(self._waiting)
+
+    def metrics(self):
+        """Returns the queue and per consumer metrics as a dict."""
+        with self._cond:
+            return {
+                'queue_depth': len(self._waiting),
+                'max_queue_depth': self.max_queue_depth,
+                'transactions': self.transactions,
+                'owner': None if self._owner is None else self._owner.tag,
+                'consumers': {tag: {'priority': con.priority,
+                                    'transactions': con.transactions,
+                                    'lines': con.lines,
+                                    'wait_time': con.wait_time}
+                              for tag, con in self._consumers.items()}
+            }
+
+    def _acquire(self, consumer, priority):
+        me = threading.current_thread()
+        with self._cond:
+            if self._owner_thread is me:
+                self._owner_depth += 1
+                return
+            entry = (priority, next(self._seq), me)
+            heapq.heappush(self._waiting, entry)
+            self.max_queue_depth = max(self.max_queue_depth,
+                                       len(self._waiting))
+            start = time.monotonic()
+            while (self._owner_thread is not None or
+                   self._waiting[0] is not entry):
+                self._cond.wait()
+            heapq.heappop(self._waiting)
+            consumer.wait_time += time.monotonic() - start
+            consumer.transactions += 1
+            self.transactions += 1
+            self._owner = consumer
+            self._owner_thread = me
+            self._owner_depth = 1
+
+    def _release(self):
+        with self._cond:
+            self._owner_depth -= 1
+            if self._owner_depth:
+                return
+            self._owner = None
+            self._owner_thread = None
+            self._cond.notify_all()
+
+    def _owned(self):
+        return self._owner_thread is threading.current_thread()
+
+    def _call(self, func, *args, **kwargs):
+        if self._owned():
+            return func(*args, **kwargs)
+        consumer = MuxConsumer(self, None)
+        with consumer.transaction():
+            return func(*args, **kwargs)
+
+    def _route(self, line):
+        owner = self._owner
+        if owner is not None:
+            owner.lines += 1
+            logging.debug("Routing to %r: %r", owner.tag, line)
+        return line
+
+    def _read(self, read, timeout):
+        return self._route(self._call(call_read, read, timeout))
+
+    def readline(self, timeout=None):
+        """Reads a line for the consumer owning the driver."""
+        return self._read(self.driver.readline, timeout)
+
+    def readline_bytes(self, timeout=None):
+        """Reads an undecoded line if the driver supports it."""
+        readline = getattr(self.driver, 'readline_bytes', self.driver.readline)
+        return self._read(readline, timeout)
+
+    def read_frame(self, timeout=None):
+        """Reads a binary frame for the consumer owning the driver."""
+        return self._read(self.driver.read_frame, timeout)
+
+    def write(self, data, flush_input=True):
+        """Writes data for the consumer owning the driver."""
+        if flush_input:
+            return self._call(self.driver.write, data)
+        return self._call(self.driver.write, data, flush_input=False)
@@ -0,0 +1,155 @@
+# Copyright (c) 2019 Kevin Weiss, for HAW Hamburg  <kevin.weiss@haw-hamburg.de>
+#
+# This file is subject to the terms and conditions of the MIT License. See the
+# file LICENSE in the top level directory for more details.
+# SPDX-License-Identifier:    MIT
+"""Driver Pool for RIOT PAL
+This module keeps drivers open after a device is closed so the next device
+with the same configuration can reuse the connection instead of reopening the
+port or spawning a new make term.  Drivers are keyed by driver type and all
+arguments, a driver is leased to one device at a time.
+
+A device uses the pool if it is created with pool=True for the process wide
+pool, with pool=DriverPool() for a specific pool, or if the environment
+variable RIOT_PAL_DRIVER_POOL is set to 1.
+
+Example:
+    dut = DutShell('/dev/ttyACM0', pool=True)
+    dut.close()
+    # Reuses the open serial port
+    dut = DutShell('/dev/ttyACM0', pool=True)
+"""
+import atexit
+import logging
+import threading
+import time
+
+
+class DriverPool:
+    """Leases open drivers by configuration.
+
+    On checkout the health_check of the driver is called if it has one and
+    unhealthy drivers are closed and replaced.  Drivers that are idle for
+    longer than max_idle seconds are closed.
+
+    Args:
+        max_idle(float): Seconds an idle driver is kept open.
+    """
+    DEFAULT_MAX_IDLE = 300
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, max_idle=DEFAULT_MAX_IDLE):
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._idle = {}
+        self._leased = {}
+        self.created = 0
+        self.reused = 0
+        self.evicted = 0
+
+    @classmethod
+    def default(cls):
+        """Returns the process wide pool, it is closed on exit."""
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls()
+                atexit.register(cls._default.close_all)
+            return cls._default
+
+    @staticmethod
+    def _key(driver_type, args, kwargs):
+        return (driver_type, repr(args), repr(sorted(kwargs.items())))
+
+    @staticmethod
+    def _healthy(driver):
+        health_check = getattr(driver, 'health_check', None)
+        if health_check is None:
+            return True
+        return health_check()
+
+    @staticmethod
+    def _close(driver):
+        try:
+            driver.close()
+        except (OSError, ValueError) as exc:
+            logging.debug("Closing pooled driver failed: %r", exc)
+
+    def lease(self, factory, driver_type, *args, **kwargs):
+        """Returns an open driver for the configuration.
+
+        Args:
+            factory: Called with driver_type, args and kwargs to create a
+                driver if no idle one can be used.
+            driver_type(str): The driver type of the configuration.
+            *args: Arguments of the driver.
+            **kwargs: Keyword arguments of the driver.
+        """
+        key = self._key(driver_type, args, kwargs)
+        self.evict_idle()
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                if not idle:
+                    break
+                driver, _ = idle.pop()
+            if self._healthy(driver):
+                logging.debug("Reusing pooled driver %r", driver)
+                with self._lock:
+                    self._leased[id(driver)] = key
+                    self.reused += 1
+                return driver
+            logging.debug("Pooled driver %r failed health check", driver)
+            self._close(driver)
+        driver = factory(driver_type, *args, **kwargs)
+        with self._lock:
+            self._leased[id(driver)] = key
+            self.created += 1
+        return driver
+
+    def release(self, driver):
+        """Returns a leased driver to the pool.
+
+        Returns:
+            bool: False if the driver was not leased from the pool.
+        """
+        with self._lock:
+            key = self._leased.pop(id(driver), None)
+            if key is None:
+                return False
+            self._idle.setdefault(key, []).append((driver, time.monotonic()))
+        self.evict_idle()
+        return True
+
+    def evict_idle(self):
+        """Closes drivers that are idle for longer than max_idle."""
+        expired = []
+        deadline = time.monotonic() - self.max_idle
+        with self._lock:
+            for key, idle in list(self._idle.items()):
+                expired.extend(drv for drv, since in idle if since <= deadline)
+                idle[:] = [(drv, since) for drv, since in idle
+                           if since > deadline]
+                if not idle:
+                    del self._idle[key]
+            self.evicted += len(expired)
+        for driver in expired:
+            logging.debug("Evicting idle driver %r", driver)
+            self._close(driver)
+
+    def close_all(self):
+        """Closes all idle drivers, leased drivers stay open."""
+        with self._lock:
+            drivers = [drv for idle in self._idle.values() for drv, _ in idle]
+            self._idle.clear()
+        for driver in drivers:
+            self._close(driver)
+
+    def stats(self):
+        """Returns the pool counters as a dict."""
+        with self._lock:
+            return {'created': self.created,
+                    'reused': self.reused,
+                    'evicted': self.evicted,
+                    'leased': len(self._leased),
+                    'idle': sum(len(idle) for idle in self._idle.values())}
@@ -0,0 +1,140 @@
+# Copyright (c) 2019 Kevin Weiss, for HAW Hamburg  <kevin.weiss@haw-hamburg.de>
+#
+# This file is subject to the terms and conditions of the MIT License. See the
+# file LICENSE in the top level directory for more details.
+# SPDX-License-Identifier:    MIT
+"""Driver Registry for RIOT PAL
+This module maps the driver_type of a device to the driver class.  Driver
+modules are only imported when a device first uses them, so importing
+riot_pal does not load pyserial or pexpect.
+
+Third party drivers register with register_driver or with an entry point in
+the riot_pal.drivers group, the name of the entry point is the driver_type.
+
+Example:
+    # setup.py of a third party package
+    entry_points={'riot_pal.drivers': ['can=my_package.can:CanDriver']}
+
+    dut = DutShell(driver_type='can', channel='can0')
+"""
+import functools
+import importlib
+import inspect
+import logging
+import threading
+
+ENTRY_POINT_GROUP = 'riot_pal.drivers'
+
+_DRIVERS = {
+    'serial': '.serial_driver:SerialDriver',
+    'riot': '.riot_driver:RiotDriver',
+    'replay': '.session_record:ReplayDriver',
+}
+_LOADED = {}
+_ENTRY_POINTS = None
+_LOCK = threading.Lock()
+
+
+def _import(path):
+    module_name, _, attr = path.partition(':')
+    if module_name.startswith('.'):
+        if __package__:
+            module = importlib.import_module(module_name, __package__)
+        else:
+            module = importlib.import_module(module_name[1:])
+    else:
+        module = importlib.import_module(module_name)
+    return getattr(module, attr)
+
+
+def _entry_points():
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:
+        try:
+            import pkg_resources
+        except ImportError:
+            return {}
+        eps = pkg_resources.iter_entry_points(ENTRY_POINT_GROUP)
+    else:
+        eps = entry_points()
+        if hasattr(eps, 'select'):
+            eps = eps.select(group=ENTRY_POINT_GROUP)
+        else:
+            eps = eps.get(ENTRY_POINT_GROUP, [])
+    return {ep.name: ep for ep in eps}
+
+
+@functools.lru_cache(maxsize=None)
+def _takes_timeout(func):
+    try:
+        params = inspect.signature(func).parameters.values()
+    except (TypeError, ValueError):
+        return True
+    return any(param.name == 'timeout' or param.kind == param.VAR_KEYWORD
+               for param in params)
+
+
+def call_read(read, timeout=None):
+    """Calls a read function of a driver.
+
+    Drivers only need to accept the timeout if it is overridden, a driver
+    that does not accept it reads with its own timeout.
+
+    Args:
+        read: The readline, readline_bytes or read_frame of the driver.
+        timeout(float): Overrides the read timeout of the driver.
+    """
+    if timeout is None or not _takes_timeout(getattr(read, '__func__', read)):
+        return read()
+    return read(timeout=timeout)
+
+
+def register_driver(driver_type, driver):
+    """Registers a driver class for a driver_type.
+
+    Args:
+        driver_type(str): Name used as driver_type of a device.
+        driver: The driver class or factory, or the 'module:attr' path to
+            import it from when it is first used.
+    """
+    with _LOCK:
+        _DRIVERS[driver_type] = driver
+        _LOADED.pop(driver_type, None)
+
+
+def get_driver(driver_type):
+    """Returns the driver class of a driver_type, importing it if needed.
+
+    Raises:
+        NotImplementedError: If no driver is registered for the type.
+    """
+    driver = _LOADED.get(driver_type)
+    if driver is not None:
+        return driver
+    global _ENTRY_POINTS  # pylint: disable=W0603
+    with _LOCK:
+        driver = _DRIVERS.get(driver_type)
+        if driver is None:
+            if _ENTRY_POINTS is None:
+                _ENTRY_POINTS = _entry_points()
+            entry_point = _ENTRY_POINTS.get(driver_type)
+            if entry_point is None:
+                raise NotImplementedError(
+                    "Unknown driver type {}".format(driver_type))
+            logging.debug("Loading driver %s from %r", driver_type,
+                          entry_point)
+            driver = entry_point.load()
+        elif isinstance(driver, str):
+            driver = _import(driver)
+        _LOADED[driver_type] = driver
+        return driver
+
+
+def available_drivers():
+    """Returns the names of the registered and installed driver types."""
+    global _ENTRY_POINTS  # pylint: disable=W0603
+    with _LOCK:
+        if _ENTRY_POINTS is None:
+            _ENTRY_POINTS = _entry_points()
+        return sorted(set(_DRIVERS) | set(_ENTRY_POINTS))
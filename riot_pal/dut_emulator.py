@@ -0,0 +1,312 @@
+#! /usr/bin/env python3
+# Copyright (c) 2019 Kevin Weiss, for HAW Hamburg  <kevin.weiss@haw-hamburg.de>
+#
+# This file is subject to the terms and conditions of the MIT License. See the
+# file LICENSE in the top level directory for more details.
+# SPDX-License-Identifier:    MIT
+"""
+This script emulates DUT firmware for the RIOT shell and the JSON protocol so
+drivers and parsers can be tested and benchmarked without hardware.
+
+The emulator serves a pseudo terminal that the SerialDriver can open, or stdin
+and stdout so it can be spawned as the terminal program of the RiotDriver.
+
+Commands
+--------
+help                        Lists the commands
+echo [args]                 Returns the arguments as data
+read_reg <addr> <size>      Returns size values starting at addr
+dump <size>                 Returns size byte values
+stream <count>              Sends count sample lines before the result
+framing <on|off>            Switches the shell protocol to binary frames
+error                       Always returns an error
+
+Usage
+-----
+
+```
+usage: dut_emulator.py  [-h] [--protocol {shell,json}] [--latency LATENCY]
+                        [--line-size LINE_SIZE] [--noise NOISE] [--pty]
+
+optional arguments:
+  --help, -h
+                        show this help message and exit
+  --protocol, -p
+                        {shell,json}
+                        Protocol of the firmware (default: shell)
+  --latency, -l
+                        Seconds before each response (default: 0)
+  --line-size, -s
+                        Number of data values of commands without size
+                        (default: 4)
+  --noise, -n
+                        Probability of a noise line before a response
+                        (default: 0)
+  --pty
+                        Serve a pseudo terminal and print its path
+```
+"""
+import argparse
+import json
+import os
+import random
+import select
+import sys
+import termios
+import threading
+import time
+import tty
+try:
+    from .framing import encode_frame, STATUS_SUCCESS, STATUS_ERROR
+except ImportError:
+    from framing import encode_frame, STATUS_SUCCESS, STATUS_ERROR
+
+
+class DutEmulator:
+    """Emulates the responses of DUT firmware.
+
+    Args:
+        protocol(str): Protocol of the firmware {shell, json}
+        latency(float): Seconds before each response.
+        line_size(int): Number of data values of commands without size.
+        noise(float): Probability of a noise line before each response.
+        seed: Seed of the noise generator.
+    """
+    NOISE = '[debug] unsolicited event {}'
+
+    def __init__(self, protocol='shell', latency=0, line_size=4, noise=0,
+                 seed=None):
+        if protocol not in ('shell', 'json'):
+            raise NotImplementedError()
+        self.protocol = protocol
+        self.latency = latency
+        self.line_size = line_size
+        self.noise = noise
+        self._random = random.Random(seed)
+        self.commands = {
+            'help': self._cmd_help,
+            'echo': self._cmd_echo,
+            'read_reg': self._cmd_read_reg,
+            'dump': self._cmd_dump,
+            'error': self._cmd_error,
+            'stream': self._cmd_stream,
+            'framing': self._cmd_framing,
+        }
+        self.framed = False
+        self._framing_next = None
+        self.received = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._master = None
+        self._slave = None
+
+    def _cmd_help(self, args):
+        args = args
+        return True, sorted(self.commands)
+
+    def _cmd_echo(self, args):
+        if not args:
+            return True, list(range(self.line_size))
+        return True, args
+
+    @staticmethod
+    def _cmd_read_reg(args):
+        addr, size = (int(arg, 0) for arg in args)
+        return True, [(addr + i) & 0xFF for i in range(size)]
+
+    def _cmd_dump(self, args):
+        size = int(args[0], 0) if args else self.line_size
+        return True, ['0x{:02x}'.format(i & 0xFF) for i in range(size)]
+
+    def _cmd_stream(self, args):
+        count = int(args[0], 0) if args else self.line_size
+        if self.protocol == 'json':
+            samples = [json.dumps({'sample': i}) for i in range(count)]
+        else:
+            samples = ['Sample: [{}]'.format(i) for i in range(count)]
+        return True, [count], samples
+
+    def _cmd_framing(self, args):
+        if self.protocol != 'shell' or args not in (['on'], ['off']):
+            return False, 'Usage: framing <on|off>'
+        # The switch applies after the response to the command itself
+        self._framing_next = args[0] == 'on'
+        return True, []
+
+    @staticmethod
+    def _cmd_error(args):
+        args = args
+        return False, 'Command failed'
+
+    def _format_data(self, data):
+        if self.protocol == 'json':
+            return data
+        return '[{}]'.format(', '.join(str(value) for value in data))
+
+    @staticmethod
+    def _frame_payload(data):
+        try:
+            return bytes(int(value, 0) if isinstance(value, str) else value
+                         for value in data)
+        except (ValueError, TypeError):
+            return ' '.join(str(value) for value in data).encode('utf-8')
+
+    def handle_line(self, line):
+        """Returns the response lines of a received command line, binary
+        frames are returned as bytes."""
+        line = line.strip()
+        self.received += 1
+        lines = []
+        if self.noise and self._random.random() < self.noise:
+            lines.append(self.NOISE.format(self.received))
+        if not line:
+            return lines
+        name, *args = line.split()
+        handler = self.commands.get(name)
+        samples = []
+        try:
+            if handler is None:
+                success, data = False, 'Unknown command {}'.format(name)
+            else:
+                # Handlers can add sample lines sent before the result
+                success, data, *samples = handler(args)
+                samples = samples[0] if samples else []
+        except (ValueError, TypeError) as exc:
+            success, data = False, str(exc)
+        if self.protocol == 'json':
+            lines.extend(samples)
+            res = {'cmd': line,
+                   'result': 'Success' if success else 'Error'}
+            if success:
+                res['data'] = data
+            else:
+                res['msg'] = data
+            lines.append(json.dumps(res))
+        elif self.framed:
+            lines.extend(samples)
+            if success:
+                lines.append(encode_frame(STATUS_SUCCESS,
+                                          self._frame_payload(data)))
+            else:
+                lines.append(encode_frame(STATUS_ERROR,
+                                          data.encode('utf-8')))
+        else:
+            lines.append('Command: ' + line)
+            lines.extend(samples)
+            if success:
+                lines.append('Success: ' + self._format_data(data))
+            else:
+                lines.append('Error: ' + data)
+        if self._framing_next is not None:
+            self.framed = self._framing_next
+            self._framing_next = None
+        return lines
+
+    def _respond(self, line):
+        responses = self.handle_line(line)
+        if self.latency:
+            time.sleep(self.latency)
+        return b''.join(res if isinstance(res, bytes) else
+                        (res + '\n').encode('utf-8') for res in responses)
+
+    def _serve_fd(self, in_fd, out_fd):
+        rx_buf = b''
+        while not self._stop.is_set():
+            readable, _, _ = select.select([in_fd], [], [], 0.05)
+            if not readable:
+                continue
+            try:
+                data = os.read(in_fd, 4096)
+            except BlockingIOError:
+                continue
+            except OSError:
+                return
+            if not data:
+                return
+            rx_buf += data.replace(b'\r', b'\n')
+            *lines, rx_buf = rx_buf.split(b'\n')
+            for line in lines:
+                if line:
+                    self._write_all(out_fd, self._respond(
+                        line.decode('utf-8', errors='ignore')))
+
+    def _write_all(self, out_fd, data):
+        # Waits for the reader without blocking stop
+        data = memoryview(data)
+        while data and not self._stop.is_set():
+            _, writable, _ = select.select([], [out_fd], [], 0.05)
+            if not writable:
+                continue
+            try:
+                data = data[os.write(out_fd, data):]
+            except BlockingIOError:
+                continue
+
+    def start_pty(self):
+        """Serves a pseudo terminal from a background thread.
+
+        Returns:
+            str: Path of the terminal to open with a driver.
+        """
+        self._master, slave = os.openpty()
+        os.set_blocking(self._master, False)
+        tty.setraw(slave)
+        path = os.ttyname(slave)
+        # Keep the slave open so the terminal stays valid between connections
+        self._slave = slave
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._serve_fd,
+                                        args=(self._master, self._master),
+                                        name='riot_pal-emulator',
+                                        daemon=True)
+        self._thread.start()
+        return path
+
+    def serve_stdio(self):
+        """Serves stdin and stdout until stdin is closed."""
+        if os.isatty(sys.stdin.fileno()):
+            attrs = termios.tcgetattr(sys.stdin.fileno())
+            attrs[3] &= ~termios.ECHO
+            termios.tcsetattr(sys.stdin.fileno(), termios.TCSANOW, attrs)
+        self._serve_fd(sys.stdin.fileno(), sys.stdout.fileno())
+
+    def stop(self):
+        """Stops serving the pseudo terminal."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+            os.close(self._master)
+            os.close(self._slave)
+
+
+def main():
+    """Main program"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--protocol', '-p', choices=('shell', 'json'),
+                        default='shell', help='Protocol of the firmware')
+    parser.add_argument('--latency', '-l', type=float, default=0,
+                        help='Seconds before each response')
+    parser.add_argument('--line-size', '-s', type=int, default=4,
+                        help='Number of data values of commands without size')
+    parser.add_argument('--noise', '-n', type=float, default=0,
+                        help='Probability of a noise line before a response')
+    parser.add_argument('--pty', default=False, action='store_true',
+                        help='Serve a pseudo terminal and print its path')
+    pargs = parser.parse_args()
+
+    emulator = DutEmulator(protocol=pargs.protocol, latency=pargs.latency,
+                           line_size=pargs.line_size, noise=pargs.noise)
+    if pargs.pty:
+        print(emulator.start_pty(), flush=True)
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            emulator.stop()
+    else:
+        emulator.serve_stdio()
+
+
+if __name__ == '__main__':
+    main()
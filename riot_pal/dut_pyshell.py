@@ -11,6 +11,14 @@ exposes from the dut_shell class to be run in a shell.
 
 The purpose of this script is allow easy setup and manual usage of the DUT.
 
+The command lists of devices are cached next to the readline history in
+~/.dut_pyshell_cmds.json so the prompt and completion are available at once,
+the list is refreshed from the device in the background.
+
+With several boards attached commands go to all boards or the one named
+with @name, for example `@board1 read_reg 0 4`.  A command ending with &
+runs in the background, see the jobs and wait commands.
+
 Usage
 -----
 
@@ -19,6 +27,7 @@ usage: dut_pyshell.py   [-h]
                         [--loglevel {debug,info,warning,error,fatal,critical}]
                         [--port PORT]
                         [--raw-data]
+                        [--no-cmd-cache]
 
 optional arguments:
   --help, -h
@@ -27,63 +36,298 @@ optional arguments:
                         {debug,info,warning,error,fatal,critical}
                         Python logger log level (default: warning)
   --port, -p
-                        Specify the serial port
+                        Specify the serial port, repeat it as name=port to
+                        attach several boards
   --rawdata, -r
                         Shows unfilted data, usually raw json
                         (default: False)
+  --no-cmd-cache
+                        Always waits for the command list of the device
+                        (default: False)
 ```
 """
 import cmd
-from json import dumps
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+import functools
+import hashlib
+import itertools
+import json
 import logging
 import argparse
+import os
+import sys
+import threading
+import time
 
 try:
     import readline
 except ImportError:
     readline = None
-import serial.tools.list_ports
 try:
     from .dut_shell import DutShell, RESULT_SUCCESS
 except ImportError:
     from dut_shell import DutShell, RESULT_SUCCESS
 
 
+DEFAULT_CMD_CACHE = os.path.join(os.path.expanduser('~'),
+                                 '.dut_pyshell_cmds.json')
+
+
+class CommandListCache:
+    """Stores the command lists of devices between sessions.
+
+    A device is identified by its USB serial number if known and by its
+    port.  Each entry stores the firmware identity, a hash of the command
+    list, so a refresh can tell if the firmware changed.
+
+    Args:
+        path(str): The JSON file of the cache.
+    """
+
+    def __init__(self, path=DEFAULT_CMD_CACHE):
+        self.path = path
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def firmware_id(cmd_list):
+        """Returns the identity of the firmware providing the commands."""
+        return hashlib.sha1(json.dumps(cmd_list).encode('utf-8')).hexdigest()
+
+    def _read(self):
+        try:
+            with open(self.path) as cache_file:
+                entries = json.load(cache_file)
+        except (IOError, ValueError):
+            return {}
+        return entries if isinstance(entries, dict) else {}
+
+    def load(self, keys):
+        """Returns the cached entry of the first known key or None."""
+        entries = self._read()
+        for key in keys:
+            if key in entries:
+                return entries[key]
+        return None
+
+    def store(self, keys, cmd_list):
+        """Stores the command list under all keys of a device.
+
+        Returns:
+            dict: The stored entry.
+        """
+        entry = {'cmds': cmd_list, 'firmware': self.firmware_id(cmd_list),
+                 'updated': time.time()}
+        with self._lock:
+            entries = self._read()
+            for key in keys:
+                entries[key] = entry
+            tmp_path = '{}.{}.tmp'.format(self.path, os.getpid())
+            try:
+                with open(tmp_path, 'w') as cache_file:
+                    json.dump(entries, cache_file)
+                os.replace(tmp_path, self.path)
+            except IOError as exc:
+                logging.debug("Could not store command list: %r", exc)
+        return entry
+
+
+def _device_keys(port, port_info=None):
+    keys = []
+    if port_info is not None and getattr(port_info, 'serial_number', None):
+        keys.append('usb:{:04x}:{:04x}:{}'.format(port_info.vid or 0,
+                                                  port_info.pid or 0,
+                                                  port_info.serial_number))
+    keys.append('port:{}'.format(os.path.realpath(port)))
+    return keys
+
+
+class _Board:
+    """A device of the shell with its command list.
+
+    Args:
+        name(str): Name used to target the device.
+        dut(DutShell): The connected device.
+        cache_keys(list): Keys of the device in the command list cache.
+        cmd_cache(CommandListCache): Cache of the command lists or None.
+    """
+    REFRESH_PRIORITY = 1
+
+    def __init__(self, name, dut, cache_keys, cmd_cache=None):
+        self.name = name
+        self.dut = dut
+        self.cache_keys = cache_keys
+        self.cmd_cache = cmd_cache
+        self.refresh_thread = None
+        self.cmd_list = []
+        self.firmware = None
+
+    def load_cmd_list(self):
+        """Uses the cached command list and refreshes it in the background,
+        without a cached list the device is queried directly."""
+        cached = None
+        if self.cmd_cache is not None:
+            cached = self.cmd_cache.load(self.cache_keys)
+        if cached is None:
+            self.refresh_cmd_list()
+        else:
+            self.cmd_list = cached['cmds']
+            self.firmware = cached['firmware']
+            self.start_refresh()
+
+    def start_refresh(self):
+        """Refreshes the command list in a background thread."""
+        # Share the driver so the refresh never interleaves with commands
+        # of the prompt, which are served first
+        dut = DutShell.copy_driver(self.dut, priority=self.REFRESH_PRIORITY)
+        self.refresh_thread = threading.Thread(target=self.refresh_cmd_list,
+                                               args=(dut,),
+                                               name='riot_pal-refresh',
+                                               daemon=True)
+        self.refresh_thread.start()
+
+    def refresh_cmd_list(self, dut=None):
+        """Reads the command list from the device and updates the cache.
+
+        Args:
+            dut(DutShell): Shell used for the query, closed afterwards.
+        """
+        try:
+            res = (dut or self.dut).send_cmd('help')
+        finally:
+            if dut is not None:
+                dut.close()
+        cmd_list = res.get('data')
+        if res.get('result') != RESULT_SUCCESS or \
+                not isinstance(cmd_list, list):
+            logging.debug("Could not refresh the command list of %s: %r",
+                          self.name, res)
+            return
+        if self.firmware is not None and \
+                CommandListCache.firmware_id(cmd_list) != self.firmware:
+            logging.info("Firmware of %s changed, updated the command list",
+                         self.name)
+        self.cmd_list = cmd_list
+        if self.cmd_cache is None:
+            self.firmware = CommandListCache.firmware_id(cmd_list)
+        else:
+            entry = self.cmd_cache.store(self.cache_keys, cmd_list)
+            self.firmware = entry['firmware']
+
+
 class DutPyShell(cmd.Cmd):
     """Command loop for the PHiLIP interface
 
+    Several boards can be attached at once.  Commands go to the target set
+    with the target command or to the boards given with @name or @all before
+    the command, the responses are printed as they arrive.  A command ending
+    with & runs as a background job so the prompt stays responsive, see the
+    jobs and wait commands.
+
     Args:
         port - Serial port for the PHiLIP, if None connection wizard tries to
                connent
         data_only - If true only data prints from command an not the whole
                     response struct
+        cmd_cache - Path of the command list cache such as
+                    DEFAULT_CMD_CACHE, None always waits for the command
+                    list of the device
+        ports - Serial ports of several boards by name, used instead of port
     """
     prompt = 'node: '
-
-    def __init__(self, port=None, rawdata=False):
-        if port is None:
-            self.dut = self._connect_wizard()
+    REFRESH_PRIORITY = _Board.REFRESH_PRIORITY
+    BACKGROUND_PRIORITY = 2
+    MAX_FINISHED_JOBS = 16
+    TARGET_ALL = 'all'
+
+    def __init__(self, port=None, rawdata=False, cmd_cache=None, ports=None):
+        cache = CommandListCache(cmd_cache) if cmd_cache else None
+        self.boards = {}
+        if ports:
+            for name, board_port in ports.items():
+                dut = DutShell(board_port, parser='json')
+                self.boards[name] = _Board(name, dut,
+                                           _device_keys(board_port), cache)
         else:
-            self.dut = DutShell(port, parser='json')
-        self.cmd_list = self.dut.send_cmd('help')['data']
+            port_info = None
+            if port is None:
+                dut, port_info = self._connect_wizard()
+                port = port_info[0]
+            else:
+                dut = DutShell(port, parser='json')
+            self.boards['node'] = _Board('node', dut,
+                                         _device_keys(port, port_info), cache)
+        self._default = next(iter(self.boards.values()))
+        for board in self.boards.values():
+            board.load_cmd_list()
+        self.target = self.TARGET_ALL
         self.data_only = not rawdata
+        self._executor = ThreadPoolExecutor(
+            max_workers=len(self.boards) * 4,
+            thread_name_prefix='riot_pal-pyshell')
+        self._jobs = {}
+        self._job_ids = itertools.count(1)
+        self._print_lock = threading.Lock()
+        self._at_prompt = False
         cmd.Cmd.__init__(self)
+        if len(self.boards) > 1:
+            self.prompt = 'node@{}: '.format(self.target)
+
+    @property
+    def dut(self):
+        """The device of the first board."""
+        return self._default.dut
+
+    @property
+    def cmd_list(self):
+        """The commands of all boards."""
+        if len(self.boards) == 1:
+            return self._default.cmd_list
+        cmd_list = []
+        for board in self.boards.values():
+            cmd_list.extend(name for name in board.cmd_list
+                            if name not in cmd_list)
+        return cmd_list
+
+    @property
+    def firmware(self):
+        """The firmware identity of the first board."""
+        return self._default.firmware
+
+    @property
+    def _refresh_thread(self):
+        return self._default.refresh_thread
 
     @staticmethod
     def _connect_wizard():
+        # Only enumerating ports needs the port listing of pyserial
+        import serial.tools.list_ports
         print("Starting DUT python shell")
         serial_devices = serial.tools.list_ports.comports()
         if len(serial_devices) == 0:
             raise ConnectionError("Could not find any available devices")
         elif len(serial_devices) == 1:
             print('Connected to {}'.format(serial_devices[0]))
-            return DutShell(port=serial_devices[0][0], parser='json')
+            s_dev = serial_devices[0]
         else:
             print('Select a serial port:')
             for i, s_dev in enumerate(serial_devices):
                 print("{}: {}".format(i, s_dev))
             s_num = int(input("Selection(number): "))
-            return DutShell(port=serial_devices[int(s_num)][0], parser='json')
+            s_dev = serial_devices[int(s_num)]
+        return DutShell(port=s_dev[0], parser='json'), s_dev
+
+    def refresh_cmd_list(self, dut=None):
+        """Reads the command list of the first board, see _Board."""
+        self._default.refresh_cmd_list(dut)
+
+    def close(self):
+        """Stops the background jobs and closes all boards."""
+        for job in self._jobs.values():
+            for future in job['futures'].values():
+                future.cancel()
+        self._executor.shutdown(wait=False)
+        for board in self.boards.values():
+            board.dut.close()
 
     def preloop(self):
         """Used to get the history of commands"""
@@ -92,26 +336,217 @@ class DutPyShell(cmd.Cmd):
                 readline.read_history_file()
             except IOError:
                 pass
+        self._at_prompt = True
+
+    def precmd(self, line):
+        """Output of background jobs is printed plainly while a command
+        runs"""
+        with self._print_lock:
+            self._at_prompt = False
+        return line
+
+    def postcmd(self, stop, line):  # pylint: disable=W0613
+        """Output of background jobs redraws the prompt from now on"""
+        with self._print_lock:
+            self._at_prompt = True
+        return stop
+
+    def _print_async(self, text):
+        with self._print_lock:
+            if not self._at_prompt:
+                print(text)
+                return
+            buf = readline.get_line_buffer() if readline else ''
+            sys.stdout.write('\r\x1b[K{}\n{}{}'.format(text, self.prompt,
+                                                       buf))
+            sys.stdout.flush()
+
+    def _split_target(self, arg):
+        """Returns the boards and the command of an argument."""
+        target = self.target
+        arg = arg.strip()
+        if arg.startswith('@'):
+            target, _, arg = arg[1:].partition(' ')
+            arg = arg.strip()
+        if target == self.TARGET_ALL:
+            return list(self.boards.values()), arg
+        if target not in self.boards:
+            raise ValueError('Unknown board {}, use one of {}'.format(
+                target, ', '.join([self.TARGET_ALL] + list(self.boards))))
+        return [self.boards[target]], arg
+
+    def _format_result(self, board, res, prefix):
+        text = '\n'.join(self._format_results(res))
+        if prefix:
+            text = '\n'.join('{}: {}'.format(board.name, line)
+                             for line in text.split('\n'))
+        return text
+
+    @staticmethod
+    def _send(dut, send_cmd, close=False):
+        try:
+            return dut.send_cmd(send_cmd)
+        finally:
+            if close:
+                dut.close()
+
+    def _job_finished(self, job):
+        return all(printed.is_set() for printed in job['printed'].values())
+
+    def _prune_jobs(self):
+        """Forgets the oldest finished jobs that were never listed."""
+        finished = sorted(job_id for job_id, job in self._jobs.items()
+                          if self._job_finished(job))
+        for job_id in finished[:-self.MAX_FINISHED_JOBS]:
+            del self._jobs[job_id]
+
+    def _send_background(self, boards, send_cmd, prefix):
+        self._prune_jobs()
+        job_id = next(self._job_ids)
+        print('[{}] {}'.format(job_id, send_cmd))
+        futures = {}
+        for board in boards:
+            # Each job has its own consumer of the shared driver so jobs and
+            # the prompt never interleave within a command
+            dut = DutShell.copy_driver(board.dut,
+                                       priority=self.BACKGROUND_PRIORITY)
+            futures[board.name] = self._executor.submit(self._send, dut,
+                                                        send_cmd, True)
+        # The futures are done before their callbacks ran, wait uses the
+        # events to also wait for the output
+        printed = {board.name: threading.Event() for board in boards}
+        self._jobs[job_id] = {'cmd': send_cmd, 'futures': futures,
+                              'printed': printed}
+        for board in boards:
+            futures[board.name].add_done_callback(
+                functools.partial(self._job_done, job_id, board, prefix,
+                                  printed[board.name]))
+
+    def _job_done(self, job_id, board, prefix, printed, future):
+        try:
+            if not future.cancelled():
+                text = self._output(board, future, prefix)
+                self._print_async('[{}] {}'.format(job_id, text))
+        finally:
+            printed.set()
+
+    def _output(self, board, future, prefix):
+        exc = future.exception()
+        if isinstance(exc, KeyError):
+            text = 'Could not parse argument {}'.format(exc)
+        elif exc is not None:
+            text = str(exc)
+        else:
+            return self._format_result(board, future.result(), prefix)
+        return '{}: {}'.format(board.name, text) if prefix else text
 
     def do_send_cmd(self, arg):
         """Sends a command to the shell
 
         Usage:
-            send_cmd <cmd_name> [args]
+            send_cmd [@target] <cmd_name> [args] [&]
 
         Args:
+            target: A board name or all, defaults to the target command
             cmd_name: The name of the command
             args: Arguements for the command
+            &: Runs the command as a background job
 
         """
         try:
-            results = self.dut.send_cmd(arg)
-        except KeyError as exc:
-            print('Could not parse argument {}'.format(exc))
-        except (TypeError, ValueError, SyntaxError) as exc:
+            boards, send_cmd = self._split_target(arg)
+        except ValueError as exc:
             print(exc)
+            return
+        background = send_cmd.endswith('&')
+        if background:
+            send_cmd = send_cmd[:-1].rstrip()
+        prefix = len(self.boards) > 1
+        if background:
+            self._send_background(boards, send_cmd, prefix)
+            return
+        futures = {self._executor.submit(self._send, board.dut, send_cmd):
+                   board for board in boards}
+        for future in as_completed(futures):
+            self._print_async(self._output(futures[future], future, prefix))
+
+    def default(self, line):
+        """Lines starting with @target are sent as commands"""
+        if line.startswith('@'):
+            return self.do_send_cmd(line)
+        return cmd.Cmd.default(self, line)
+
+    def do_target(self, arg):
+        """Sets the boards commands are sent to
+
+        Usage:
+            target [name]
+
+        Args:
+            name: A board name or all, prints the boards if not given
+        """
+        arg = arg.strip()
+        if not arg:
+            print('target: {}'.format(self.target))
+            for board in self.boards.values():
+                print('{}: {}'.format(board.name, board.dut))
+            return
+        if arg != self.TARGET_ALL and arg not in self.boards:
+            print('Unknown board {}'.format(arg))
+            return
+        self.target = arg
+        if len(self.boards) > 1:
+            self.prompt = 'node@{}: '.format(self.target)
+
+    def complete_target(self, text, line, begidx, endidx):
+        """Completes arg with the board names"""
+        begidx = begidx
+        endidx = endidx
+        line = line
+        return [name for name in [self.TARGET_ALL] + list(self.boards)
+                if name.startswith(text)]
+
+    def do_jobs(self, arg):
+        """Lists the background jobs
+
+        Usage:
+            jobs
+        """
+        arg = arg
+        for job_id, job in sorted(self._jobs.items()):
+            done = sum(printed.is_set() for printed in job['printed'].values())
+            state = 'Done' if done == len(job['printed']) else 'Running'
+            print('[{}] {} {}/{} {}'.format(job_id, state, done,
+                                            len(job['printed']), job['cmd']))
+        # Finished jobs are only listed once
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if self._job_finished(job)]:
+            del self._jobs[job_id]
+
+    def do_wait(self, arg):
+        """Waits for background jobs
+
+        Usage:
+            wait [job]
+
+        Args:
+            job: The id of the job, waits for all jobs if not given
+        """
+        if arg.strip():
+            try:
+                jobs = [self._jobs[int(arg)]]
+            except (KeyError, ValueError):
+                print('Unknown job {}'.format(arg))
+                return
         else:
-            self._print_func_result_success(results)
+            jobs = list(self._jobs.values())
+        try:
+            wait([f for job in jobs for f in job['futures'].values()])
+            for job in jobs:
+                for printed in job['printed'].values():
+                    printed.wait()
+        except KeyboardInterrupt:
+            print('Jobs still running')
 
     def complete_send_cmd(self, text, line, begidx, endidx):
         """Completes arg with command list"""
@@ -121,6 +556,11 @@ class DutPyShell(cmd.Cmd):
 
     def _complete_cmd_list(self, text, line):
         mline = line.partition(' ')[2]
+        if mline.startswith('@'):
+            target, sep, mline = mline[1:].partition(' ')
+            if not sep:
+                return [name for name in [self.TARGET_ALL] + list(self.boards)
+                        if name.startswith(text)]
         offs = len(mline) - len(text)
         return [s[offs:] for s in self.cmd_list if s.startswith(mline)]
 
@@ -169,26 +609,29 @@ class DutPyShell(cmd.Cmd):
         arg = arg
         return True
 
-    def _print_func_result_success(self, results):
+    def _format_results(self, results):
+        """Returns the output lines of results, each record is serialized
+        once."""
         if not isinstance(results, list):
             results = [results]
         result = RESULT_SUCCESS
-        printed_something = False
+        lines = []
         for res in results:
             if self.data_only and 'result' in res:
-
-                if res['result'] == RESULT_SUCCESS:
-                    if 'data' in res:
-                        for data in res['data']:
-                            print(dumps(data))
-                            printed_something = True
-                else:
+                if res['result'] != RESULT_SUCCESS:
                     result = res['result']
+                    continue
+                data = res.get('data')
+                if isinstance(data, list):
+                    lines.extend(json.dumps(value) for value in data)
+                elif data is not None:
+                    lines.append(json.dumps(data))
             else:
-                print(dumps(res))
-                printed_something = True
-        if not printed_something:
-            print(result)
+                lines.append(json.dumps(res))
+        return lines or [result]
+
+    def _print_func_result_success(self, results):
+        print('\n'.join(self._format_results(results)))
 
     def _print_func_result(self, func, arg):
         values = (arg or '').split(' ')
@@ -219,19 +662,38 @@ def main():
     log_levels = ('debug', 'info', 'warning', 'error', 'fatal', 'critical')
     parser.add_argument('--loglevel', '-l', choices=log_levels,
                         default='warning', help='Python logger log level')
-    parser.add_argument('--port', '-p', help='Specifies the serial port',
-                        default=None)
+    parser.add_argument('--port', '-p', action='append', default=None,
+                        help='Specifies the serial port, can be repeated '
+                        'with name=port to attach several boards')
     parser.add_argument('--rawdata', '-r', default=False,
                         action='store_true',
                         help='Shows unfilted data, usually raw json')
+    parser.add_argument('--no-cmd-cache', default=False, action='store_true',
+                        help='Always waits for the command list of the device')
     pargs = parser.parse_args()
 
     logging.basicConfig(level=getattr(logging, pargs.loglevel.upper()))
+    cmd_cache = None if pargs.no_cmd_cache else DEFAULT_CMD_CACHE
+    port = None
+    ports = None
+    if pargs.port and len(pargs.port) == 1 and '=' not in pargs.port[0]:
+        port = pargs.port[0]
+    elif pargs.port:
+        ports = {}
+        for i, arg in enumerate(pargs.port):
+            name, sep, board_port = arg.partition('=')
+            if not sep:
+                name, board_port = 'board{}'.format(i), arg
+            ports[name] = board_port
+    shell = DutPyShell(port=port, rawdata=pargs.rawdata, cmd_cache=cmd_cache,
+                       ports=ports)
     try:
-        DutPyShell(port=pargs.port, rawdata=pargs.rawdata).cmdloop()
+        shell.cmdloop()
         _exit_cmd_loop()
     except KeyboardInterrupt:
         _exit_cmd_loop()
+    finally:
+        shell.close()
 
 
 if __name__ == '__main__':
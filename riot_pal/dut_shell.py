@@ -6,46 +6,228 @@
 """Device Under Tests Shell for RIOT PAL
 This module handles parsing of information from RIOT shell base tests.
 """
+import itertools
 import logging
-import json
+import re
+import time
+from array import array
+from collections import deque
 try:
     from .base_device import BaseDevice
+    from .json_stream import JSONStreamDecoder
+    from .framing import decode_frame, FRAME_DELIMITER, STATUS_SUCCESS
+    from .response_cache import ResponseCache
+    from .adaptive_timeout import AdaptiveTimeout
 except ImportError:
     from base_device import BaseDevice
+    from json_stream import JSONStreamDecoder
+    from framing import decode_frame, FRAME_DELIMITER, STATUS_SUCCESS
+    from response_cache import ResponseCache
+    from adaptive_timeout import AdaptiveTimeout
 
 RESULT_SUCCESS = 'Success'
 RESULT_ERROR = 'Error'
 RESULT_TIMEOUT = 'Timeout'
 
 
-class ShellParser:
-    """Parses commands and resposes from the shell."""
-    COMMAND = 'Command: '
-    SUCCESS = 'Success: '
-    ERROR = 'Error: '
-    TIMEOUT = 'Timeout: '
+class BaseParser:
+    """Common response handling for the shell parsers.
+
+    A parser turns the lines of a single response into a result dict.  The
+    subclasses only implement how a line is applied to the result, reading
+    and pipelining of the lines is handled here.
+
+    Message lines kept in the result can be bounded with msg_limit, lines
+    beyond the limit are passed to msg_spill or dropped and counted in the
+    msg_overflow key of the result.
+
+    A command can have a deadline counted from its write, the response must
+    be complete by then no matter how many lines arrive.  Without a deadline
+    only the read timeout of the driver applies to each line.  The deadline
+    is the timeout given with the command, otherwise the one derived by the
+    adaptive timeout and otherwise cmd_timeout.
+
+    By default the driver flushes its input before each command so stale
+    lines of earlier commands cannot offset the response.  With resync the
+    input is kept and the parser instead drops the lines that arrive before
+    the echo of the command, so no flush is needed and nothing of a pending
+    response is lost.  The firmware must echo each command, the dropped
+    lines and bytes are counted and recorded by the metrics.  The echo only
+    identifies the command by its text, so a late response of a repeated
+    identical command, such as a polled read, is taken as the response of
+    the next one.  If the firmware echoes the whole line a seq_tag appends a
+    counter to each command that makes the echo unique.
+
+    Args:
+        dev -> device to connect send and recieve data
+        msg_limit(int): Maximum message lines kept per result.
+        msg_spill: Called with each message line beyond msg_limit.
+        cmd_timeout(float): Default deadline of a command.
+        adaptive(AdaptiveTimeout): Learns the deadline of each command.
+        resync(bool): Drops stale lines up to the command echo instead of
+            flushing the input.
+        seq_tag(str): Format of a tag appended to each command with the
+            {seq} counter, such as ' #{seq}'.  The firmware must ignore the
+            tag and echo it, it is removed from the cmd of the result.
+        seq(iterator): The {seq} counter, parsers of shells sharing a driver
+            share it so their tags stay unique, see DutShell.copy_driver.
+    """
+    DEFAULT_PIPELINE_DEPTH = 4
+    DEFAULT_PIPELINE_BYTES = 64
+    READ_RAW = False
 
-    def __init__(self, dev):
+    def __init__(self, dev, msg_limit=None, msg_spill=None, cmd_timeout=None,
+                 adaptive=None, resync=False, seq_tag=None, seq=None):
         self.dev = dev
+        self.msg_limit = msg_limit
+        self.msg_spill = msg_spill
+        self.cmd_timeout = cmd_timeout
+        self.adaptive = adaptive
+        self.resync = resync
+        self.seq_tag = seq_tag
+        self.dropped_lines = 0
+        self.dropped_bytes = 0
+        self._records = None
+        self._seq = itertools.count(1) if seq is None else seq
+        self._tags = deque()
+        self._tag = ''
+        self._echo = None
 
-    @staticmethod
-    def _try_parse_data(data):
-        if ('[' in data) and (']' in data):
-            parsed_data = []
-            data = data[data.find("[")+1:data.find("]")]
-            data_list = data.split(', ')
-            for value in data_list:
-                try:
-                    parsed_data.append(int(value, 0))
-                except ValueError:
-                    parsed_data.append(value)
-            logging.debug(parsed_data)
-            return parsed_data
-        return None
+    def _new_cmd_info(self, send_cmd):
+        """Returns the initial result dict for a command."""
+        raise NotImplementedError()
+
+    def _parse_line(self, cmd_info, line):
+        """Applies a response line to the result dict.
+
+        Returns:
+            bool: True if the response is complete.
+        """
+        raise NotImplementedError()
+
+    def _timeout(self, cmd_info):
+        """Marks the result dict as timed out."""
+        cmd_info['result'] = RESULT_TIMEOUT
+        logging.debug(RESULT_TIMEOUT)
 
-    def send_and_parse_cmd(self, send_cmd):
+    def _add_msg(self, cmd_info, line):
+        """Keeps a message line in the result or streams it."""
+        if self._records is not None:
+            self._records.append({'msg': line})
+            return
+        msg = cmd_info.setdefault('msg', [])
+        if self.msg_limit is None or len(msg) < self.msg_limit:
+            msg.append(line)
+            return
+        cmd_info['msg_overflow'] = cmd_info.get('msg_overflow', 0) + 1
+        if self.msg_spill is not None:
+            self.msg_spill(line)
+
+    def _drop(self, line):
+        """Counts a stale line dropped while resynchronizing."""
+        # pylint: disable=W0212
+        self.dropped_lines += 1
+        self.dropped_bytes += len(line)
+        metrics = self.dev._metrics()
+        if metrics is not None:
+            metrics.on_drop(len(line))
+        if logging.root.isEnabledFor(logging.DEBUG):
+            logging.debug("Dropping stale line: %r", line)
+
+    def _next_echo(self, send_cmd):
+        """Returns the expected echo of the command read next."""
+        self._tag = self._tags.popleft() if self._tags else ''
+        self._echo = (send_cmd + self._tag).strip()
+        return self._echo
+
+    def _untagged(self, echo):
+        """Removes the sequence tag from an echoed command."""
+        tag = self._tag.strip()
+        if tag and echo.rstrip().endswith(tag):
+            return echo.rstrip()[:-len(tag)].rstrip()
+        return echo
+
+    def _end_metrics(self, cmd_info):
+        # pylint: disable=W0212
+        metrics = self.dev._metrics()
+        if metrics is not None:
+            metrics.end(cmd_info.get('result'))
+
+    def _write_cmd(self, send_cmd, flush_input=True):
+        """Writes a command and returns the time it was written."""
+        # pylint: disable=W0212
+        metrics = self.dev._metrics()
+        if metrics is not None:
+            metrics.begin(send_cmd)
+        if flush_input:
+            # No response is pending so neither is a tag
+            self._tags.clear()
+        tag = ''
+        if self.seq_tag is not None:
+            tag = self.seq_tag.format(seq=next(self._seq))
+        try:
+            self.dev._write(send_cmd + tag,
+                            flush_input=flush_input and not self.resync)
+        except Exception:
+            # No response will follow, later lines belong to other commands
+            if metrics is not None:
+                metrics.abort()
+            raise
+        self._tags.append(tag)
+        return time.monotonic()
+
+    def _cmd_timeout(self, send_cmd, timeout):
+        if timeout is None and self.adaptive is not None:
+            timeout = self.adaptive.timeout(send_cmd)
+        if timeout is None:
+            timeout = self.cmd_timeout
+        return timeout
+
+    def _reader(self):
+        """Returns the function reading the next unit of a response."""
+        # pylint: disable=W0212
+        if self.READ_RAW:
+            return self.dev._readline_raw
+        return self.dev._readline
+
+    def _deadline_reader(self, send_cmd, written, timeout):
+        """Returns the reader bounded by the deadline of the command, it
+        raises TimeoutError once the deadline has passed."""
+        readline = self._reader()
+        timeout = self._cmd_timeout(send_cmd, timeout)
+        if timeout is None:
+            return readline
+        deadline = written + timeout
+
+        def _readline():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError
+            return readline(timeout=remaining)
+        return _readline
+
+    def _read_response(self, send_cmd, written=None, timeout=None):
+        if written is None:
+            written = time.monotonic()
+        cmd_info = self._new_cmd_info(send_cmd)
+        readline = self._deadline_reader(send_cmd, written, timeout)
+        try:
+            while not self._parse_line(cmd_info, readline()):
+                pass
+        except TimeoutError:
+            self._timeout(cmd_info)
+        if self.adaptive is not None:
+            self.adaptive.record(send_cmd, time.monotonic() - written)
+        self._end_metrics(cmd_info)
+        return cmd_info
+
+    def send_and_parse_cmd(self, send_cmd, timeout=None):
         """Returns a dictionary with information from the event.
 
+        Args:
+            send_cmd(str): The command to send.
+            timeout(float): Deadline of the response in seconds.
+
         Returns:
             dict:
             The return hold dict values in the following keys::
@@ -55,104 +237,618 @@ class ShellParser:
                 result - Either success, error or timeout.
         """
         # pylint: disable=W0212
-        self.dev._write(send_cmd)
+        with self.dev._transaction():
+            written = self._write_cmd(send_cmd)
+            return self._read_response(send_cmd, written, timeout)
+
+    def stream_and_parse_cmd(self, send_cmd, timeout=None):
+        """Yields the records of a response as the lines arrive.
+
+        Intermediate records are yielded instead of being collected in the
+        result, the last record is the result dict of send_and_parse_cmd.
+        Lines are only read when the next record is requested so a slow
+        consumer holds back the device.  The deadline of the command is the
+        same as for send_and_parse_cmd, time spent by the consumer counts
+        towards it.  The driver is owned until the generator is exhausted or
+        closed, a closed stream leaves the rest of the response to be flushed
+        by the next command.  An abandoned generator that is not closed holds
+        the driver, and so every other device sharing it, until it is garbage
+        collected.  Use it with contextlib.closing or through
+        DutShell.stream_cmd as a context manager.
+
+        Args:
+            send_cmd(str): The command to send.
+            timeout(float): Deadline of the response in seconds.
+
+        Yields:
+            dict: Records with the msg key for message lines, data records of
+            the parser and finally the result dict with the result key.
+        """
         # pylint: disable=W0212
-        cmd_info = {'cmd': send_cmd, 'data': None}
-        try:
-            response = self.dev._readline()
-            while response != '':
-                if self.COMMAND in response:
-                    cmd_info['msg'] = response.replace(self.COMMAND, '')
-                    cmd_info['cmd'] = cmd_info['msg'].replace('\n', '')
-
-                if self.SUCCESS in response:
-                    clean_msg = response.replace(self.SUCCESS, '')
-                    cmd_info['msg'] = clean_msg.replace('\n', '')
-                    cmd_info['result'] = RESULT_SUCCESS
-                    cmd_info['data'] = self._try_parse_data(cmd_info['msg'])
-                    break
+        with self.dev._transaction():
+            written = self._write_cmd(send_cmd)
+            readline = self._deadline_reader(send_cmd, written, timeout)
+            cmd_info = self._new_cmd_info(send_cmd)
+            self._records = records = deque()
+            try:
+                done = False
+                while not done:
+                    try:
+                        done = self._parse_line(cmd_info, readline())
+                    except TimeoutError:
+                        self._timeout(cmd_info)
+                        done = True
+                    while records:
+                        yield records.popleft()
+                if self.adaptive is not None:
+                    self.adaptive.record(send_cmd,
+                                         time.monotonic() - written)
+            finally:
+                self._records = None
+                self._end_metrics(cmd_info)
+            yield cmd_info
 
-                if self.ERROR in response:
-                    clean_msg = response.replace(self.ERROR, '')
-                    cmd_info['msg'] = clean_msg.replace('\n', '')
-                    cmd_info['result'] = RESULT_ERROR
+    def send_and_parse_cmds(self, cmds, depth=None, max_bytes=None,
+                            timeout=None):
+        """Sends commands pipelined and returns the results in order.
+
+        Up to depth commands are written before the response of the oldest
+        one is read.  The bytes of all commands waiting for a response are
+        bounded by max_bytes so the RX buffer of the DUT cannot overrun, a
+        single command larger than max_bytes is sent once nothing is pending.
+        The driver must accept the flush_input argument on write.
+
+        Warning:
+            Responses are paired with the commands by their order.  Without
+            resync a late response of a timed out command is taken as the
+            response of the next command and every later result is shifted
+            to the wrong command, the input cannot be flushed while responses
+            are pending.  Pipelining over a link where responses can time
+            out needs a parser with resync=True, then each response is
+            matched by its command echo and late responses are dropped.
+
+        Args:
+            cmds(iterable): The commands to send.
+            depth(int): Maximum number of commands waiting for a response.
+            max_bytes(int): Maximum bytes of commands waiting for a response.
+            timeout(float): Deadline of each response from its write.
+
+        Returns:
+            list: A result dict for each command, same as send_and_parse_cmd.
+        """
+        if depth is None:
+            depth = self.DEFAULT_PIPELINE_DEPTH
+        if max_bytes is None:
+            max_bytes = self.DEFAULT_PIPELINE_BYTES
+        if depth < 1:
+            raise ValueError("Pipeline depth must be at least 1")
+        # pylint: disable=W0212
+        with self.dev._transaction():
+            return self._send_and_parse_pipelined(cmds, depth, max_bytes,
+                                                  timeout)
+
+    def _send_and_parse_pipelined(self, cmds, depth, max_bytes, timeout):
+        results = []
+        pending = deque()
+        pending_bytes = 0
+        cmds = iter(cmds)
+        next_cmd = next(cmds, None)
+        while next_cmd is not None or pending:
+            while next_cmd is not None and len(pending) < depth:
+                size = len(next_cmd.encode('utf-8')) + 1
+                if pending and pending_bytes + size > max_bytes:
                     break
-                # pylint: disable=W0212
-                response = self.dev._readline()
-        except TimeoutError:
-            cmd_info['result'] = RESULT_TIMEOUT
-            logging.debug(RESULT_TIMEOUT)
+                # Only flush stale input if no response can be pending
+                written = self._write_cmd(next_cmd, flush_input=not pending)
+                pending.append((next_cmd, size, written))
+                pending_bytes += size
+                next_cmd = next(cmds, None)
+            send_cmd, size, written = pending.popleft()
+            pending_bytes -= size
+            results.append(self._read_response(send_cmd, written, timeout))
+        return results
 
-        return cmd_info
 
+class ShellParser(BaseParser):
+    """Parses commands and resposes from the shell.
 
-class JSONParser:
-    """Handles parsing of specific json data
+    All markers are matched with one precompiled pattern per line.  Lines
+    are read undecoded if the driver supports it, the markers are matched on
+    the bytes and only lines with a marker are decoded.
 
     Args:
         dev -> device to connect send and recieve data
+        markers(dict): Overrides the marker strings of the firmware, the keys
+            are 'command', 'success' and 'error'.
+        data_format(str): Type of the parsed data {list, array, bytes}, 'array'
+            returns an array('l') and 'bytes' returns bytes if all values fit,
+            otherwise a list is returned.
+        **kwargs: Message limits, see BaseParser.
+
+    Lines without a marker are only kept when streaming, their records
+    contain the line as msg and the parsed data if the line has a list.
     """
+    COMMAND = 'Command: '
+    SUCCESS = 'Success: '
+    ERROR = 'Error: '
+    TIMEOUT = 'Timeout: '
+    DATA_FORMATS = ('list', 'array', 'bytes')
+    READ_RAW = True
 
-    def __init__(self, dev):
-        self.dev = dev
+    def __init__(self, dev, markers=None, data_format='list', **kwargs):
+        super().__init__(dev, **kwargs)
+        markers = dict(markers or {})
+        self.command = markers.pop('command', self.COMMAND)
+        self.success = markers.pop('success', self.SUCCESS)
+        self.error = markers.pop('error', self.ERROR)
+        if markers:
+            raise ValueError("Unknown markers {}".format(list(markers)))
+        if data_format not in self.DATA_FORMATS:
+            raise ValueError("Unknown data format {}".format(data_format))
+        self.data_format = data_format
+        self._synced = True
+        pattern = '(?P<command>{})|(?P<success>{})|(?P<error>{})'.format(
+            re.escape(self.command), re.escape(self.success),
+            re.escape(self.error))
+        self._search = re.compile(pattern).search
+        self._search_raw = re.compile(pattern.encode('utf-8')).search
+        self._text_ops = (self._search, str, '\n', '')
+        self._raw_ops = (self._search_raw, self._text, b'\n', b'')
 
-    def _send_cmd(self, cmd_to_send, end_key='result'):
-        # pylint: disable=W0212
-        self.dev._write(cmd_to_send)
-        cmd_info = {}
-        while end_key not in cmd_info:
-            line = ""
+    @staticmethod
+    def _try_parse_int(value):
+        try:
+            return int(value, 0)
+        except ValueError:
+            return value
+
+    @classmethod
+    def _try_parse_data(cls, data, data_format='list'):
+        start = data.find('[')
+        end = data.find(']')
+        if start < 0 or end < 0:
+            return None
+        data = data[start + 1:end]
+        if data_format == 'bytes':
+            # Byte dumps are decoded in one pass if all values are 0xXX
+            values = data.count('0x')
+            if len(data) == 6 * values - 2 and data.count(', ') == values - 1:
+                try:
+                    return bytes.fromhex(data.replace('0x', '')
+                                         .replace(',', ''))
+                except ValueError:
+                    pass
+        data_list = data.split(', ')
+        try:
+            parsed_data = [int(value, 0) for value in data_list]
+        except ValueError:
+            parsed_data = [cls._try_parse_int(value) for value in data_list]
+        else:
             try:
-                # pylint: disable=W0212
-                line = self.dev._readline()
-                cmd_info.update(json.loads(line))
-            except json.decoder.JSONDecodeError:
-                if 'msg' not in cmd_info:
-                    cmd_info['msg'] = []
-                cmd_info['msg'].append(line)
-            except TimeoutError:
-                cmd_info['result'] = RESULT_TIMEOUT
-        return cmd_info
+                if data_format == 'array':
+                    parsed_data = array('l', parsed_data)
+                elif data_format == 'bytes':
+                    parsed_data = bytes(parsed_data)
+            except (ValueError, OverflowError):
+                pass
+        logging.debug(parsed_data)
+        return parsed_data
+
+    def _new_cmd_info(self, send_cmd):
+        self._synced = not self.resync
+        self._next_echo(send_cmd)
+        return {'cmd': send_cmd, 'data': None}
+
+    @staticmethod
+    def _text(line):
+        return line.decode('utf-8', errors='ignore')
+
+    def _parse_line(self, cmd_info, response):
+        if not response:
+            return True
+        # Markers are matched on the line as read, only kept fields of
+        # undecoded lines are decoded
+        search, text, newline, empty = (self._text_ops
+                                        if isinstance(response, str)
+                                        else self._raw_ops)
+        match = search(response)
+        if not self._synced:
+            # Everything before the echo of the command is stale
+            if match is None or match.lastgroup != 'command' or \
+                    text(response[match.end():]).strip() != self._echo:
+                self._drop(response)
+                return False
+            self._synced = True
+        if match is None:
+            if self._records is not None:
+                line = text(response).rstrip('\n')
+                self._records.append({'msg': line,
+                                      'data': self._try_parse_data(
+                                          line, self.data_format)})
+            return False
+        if match.lastgroup == 'command':
+            cmd_info['msg'] = text(response.replace(match.group(), empty))
+            cmd_info['cmd'] = self._untagged(cmd_info['msg'].replace('\n',
+                                                                     ''))
+            match = search(response, match.end())
+            if match is None:
+                return False
+
+        cmd_info['msg'] = text(response.replace(match.group(), empty)
+                               .replace(newline, empty))
+        if match.lastgroup == 'success':
+            cmd_info['result'] = RESULT_SUCCESS
+            cmd_info['data'] = self._try_parse_data(cmd_info['msg'],
+                                                    self.data_format)
+            return True
+        if match.lastgroup == 'error':
+            cmd_info['result'] = RESULT_ERROR
+            return True
+        return False
+
+
+class JSONParser(BaseParser):
+    """Handles parsing of specific json data
+
+    Lines are read undecoded if the driver supports it and only lines that
+    start an object are decoded as JSON, see JSONStreamDecoder.
+
+    When streaming, objects without the result key are yielded as records
+    instead of being merged into the result.
+
+    Args:
+        dev -> device to connect send and recieve data
+        backend(str): JSON backend of the decoder {auto, json, orjson}
+        **kwargs: Message limits, see BaseParser.
+    """
+    END_KEY = 'result'
+    READ_RAW = True
+
+    def __init__(self, dev, backend='auto', **kwargs):
+        super().__init__(dev, **kwargs)
+        self._decoder = JSONStreamDecoder(backend=backend)
+
+    def _add_msgs(self, cmd_info, lines):
+        cmd_info.setdefault('msg', [])
+        for line in lines:
+            if isinstance(line, bytes):
+                line = line.decode('utf-8', errors='ignore')
+            self._add_msg(cmd_info, line)
+
+    def _new_cmd_info(self, send_cmd):
+        self._decoder.reset()
+        self._next_echo(send_cmd)
+        return {'cmd': send_cmd}
+
+    def _parse_line(self, cmd_info, line):
+        obj, msgs = self._decoder.feed(line)
+        if msgs:
+            self._add_msgs(cmd_info, msgs)
+        if self.resync and obj is not None and self.END_KEY in obj and \
+                str(obj.get('cmd', '')).strip() != self._echo:
+            # The result of an earlier command or one that cannot be told
+            # apart without its cmd, everything before it is stale as well
+            for msg in cmd_info.get('msg', []):
+                self._drop(msg)
+            self._drop(line)
+            send_cmd = cmd_info['cmd']
+            cmd_info.clear()
+            cmd_info['cmd'] = send_cmd
+            return False
+        if obj is not None:
+            if self._records is not None and self.END_KEY not in obj:
+                self._records.append(obj)
+            else:
+                cmd_info.update(obj)
+                if self._tag and 'cmd' in obj:
+                    cmd_info['cmd'] = self._untagged(str(obj['cmd']))
+        return self.END_KEY in cmd_info
+
+    def _timeout(self, cmd_info):
+        pending = self._decoder.flush()
+        if pending:
+            self._add_msgs(cmd_info, pending)
+        super()._timeout(cmd_info)
+
+
+class FramedParser(BaseParser):
+    """Parses binary framed responses, see riot_pal.framing.
+
+    Commands are still sent as text lines.  Before the first command the
+    firmware is switched to framed responses with the negotiation command,
+    if it fails the responses are parsed as text by a ShellParser.  The
+    payload of a successful response is returned as data without converting
+    the elements.
+
+    Args:
+        dev -> device to connect send and recieve data
+        negotiate(str): Shell command switching the firmware to framed
+            responses, None if the firmware always sends frames.
+        data_format(str): Type of the data {bytes, memoryview}
+        markers(dict): Markers of the ShellParser used for negotiation.
+        **kwargs: Message limits, see BaseParser, they also apply to the
+            text responses of the fallback.
+    """
+    NEGOTIATE_CMD = 'framing on'
+    DATA_FORMATS = ('bytes', 'memoryview')
+
+    def __init__(self, dev, negotiate=NEGOTIATE_CMD, data_format='bytes',
+                 markers=None, **kwargs):
+        super().__init__(dev, **kwargs)
+        if self.resync or self.seq_tag is not None:
+            raise ValueError("Frames have no command echo to resync on")
+        if data_format not in self.DATA_FORMATS:
+            raise ValueError("Unknown data format {}".format(data_format))
+        self.data_format = data_format
+        self.negotiate_cmd = negotiate
+        self.framed = negotiate is None
+        self._negotiated = negotiate is None
+        self._shell = ShellParser(dev, markers=markers, **kwargs)
+
+    def negotiate(self):
+        """Switches the firmware to framed responses.
 
-    def send_and_parse_cmd(self, cmd_to_send):
-        """Returns a dictionary with information from the event
-        Args:
-            send_cmd(str): The command to write to the device
-            to_byte_array: If True and data is bytes leave it as an array
-            timeout: Optional timeout value for command specific timeouts
         Returns:
-            dict:
-            The return hold dict values in the following keys::
-            msg - The message from the response, only used for information.
-            cmd - The command sent, used to track what has occured.
-            data - Parsed information of the data requested.
-            result - Either success, error or timeout.
+            dict: The result dict of the negotiation command.
         """
+        res = self._shell.send_and_parse_cmd(self.negotiate_cmd)
+        self._negotiated = True
+        self.framed = res.get('result') == RESULT_SUCCESS
+        logging.debug("Framed responses: %r", self.framed)
+        return res
+
+    def _write_cmd(self, send_cmd, flush_input=True):
+        if not self._negotiated:
+            self.negotiate()
+        return super()._write_cmd(send_cmd, flush_input=flush_input)
+
+    def _reader(self):
+        if self.framed:
+            # pylint: disable=W0212
+            return self.dev._read_frame
+        return self._shell._reader()
+
+    def _new_cmd_info(self, send_cmd):
+        return {'cmd': send_cmd, 'data': None}
+
+    def _discard(self, text):
+        for line in text.decode('utf-8', errors='ignore').splitlines():
+            if self._records is not None:
+                self._records.append({'msg': line})
+            else:
+                logging.debug("Discarding: %s", line)
+
+    def _decode(self, chunk):
+        """Returns the decoded frame of a chunk or None.
+
+        Text lines sent before a frame are part of the chunk so each line
+        boundary is tried as the start of the frame.
+        """
+        start = 0
+        while True:
+            try:
+                frame = decode_frame(chunk[start:])
+            except ValueError:
+                start = chunk.find(b'\n', start) + 1
+                if not start:
+                    self._discard(chunk)
+                    return None
+            else:
+                if start:
+                    self._discard(chunk[:start])
+                return frame
+
+    def _parse_line(self, cmd_info, line):
+        if not self.framed:
+            # The fallback streams into the records of this parser
+            self._shell._records = self._records
+            return self._shell._parse_line(cmd_info, line)
+        if not line.endswith(FRAME_DELIMITER):
+            self._discard(line)
+            return False
+        frame = self._decode(line)
+        if frame is None:
+            return False
+        status, payload = frame
+        if status == STATUS_SUCCESS:
+            cmd_info['result'] = RESULT_SUCCESS
+            cmd_info['msg'] = ''
+            if self.data_format == 'bytes':
+                payload = payload.tobytes()
+            cmd_info['data'] = payload
+        else:
+            cmd_info['result'] = RESULT_ERROR
+            cmd_info['msg'] = str(payload, 'utf-8', errors='ignore')
+        return True
 
-        cmd_info = {'cmd': cmd_to_send}
-        cmd_info.update(self._send_cmd(cmd_to_send))
-        return cmd_info
+
+class ResponseStream:
+    """The records of a streamed response, see
+    BaseParser.stream_and_parse_cmd.
+
+    The stream is a context manager that closes it on exit, so the driver
+    is released even if the stream is left before the result.
+
+    Args:
+        records(generator): The generator of the records.
+    """
+
+    def __init__(self, records):
+        self._records = records
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._records)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Stops reading the response and releases the driver."""
+        self._records.close()
 
 
 class DutShell:
     """Device Under Test shell class
     Args:
-        parser(str): Selects the parser to use {shell, json}
+        parser(str): Selects the parser to use {shell, json, framed}
+        parser_args(dict): Keyword arguments for the parser, such as the
+            markers of the ShellParser.
+        cache(bool, ResponseCache): Answers idempotent commands from a
+            cache, True uses a ResponseCache with the default allow-list.
+        cmd_timeout(float): Default deadline of each command.
+        adaptive_timeout(bool, AdaptiveTimeout): Derives the deadline of each
+            command from its latencies, True uses the default settings.
+        resync(bool): Drops stale lines up to the command echo instead of
+            flushing the input before each command, see BaseParser.
+        seq_tag(str): Tag appended to each command so repeated commands
+            have unique echoes, see BaseParser.
     """
 
     def __init__(self, *args, **kwargs):
         self.parser = None
 
         parser = kwargs.pop('parser', 'shell')
+        parser_args = kwargs.pop('parser_args', None) or {}
+        if kwargs.pop('resync', False):
+            parser_args = dict(parser_args, resync=True)
+        seq_tag = kwargs.pop('seq_tag', None)
+        if seq_tag is not None:
+            parser_args = dict(parser_args, seq_tag=seq_tag)
+        self._parser_config = (parser, parser_args)
+        cache = kwargs.pop('cache', None)
+        if cache is True:
+            cache = ResponseCache()
+        self.cache = cache or None
+        cmd_timeout = kwargs.pop('cmd_timeout', None)
+        adaptive = kwargs.pop('adaptive_timeout', None)
+        if adaptive is True:
+            adaptive = AdaptiveTimeout()
+        self._timeout_config = (cmd_timeout, adaptive or None)
 
         self.dev = BaseDevice(*args, **kwargs)
         if parser == 'shell':
-            self.parser = ShellParser(self.dev)
+            self.parser = ShellParser(self.dev, **parser_args)
         elif parser == 'json':
             # pylint: disable=R0204
-            self.parser = JSONParser(self.dev)
+            self.parser = JSONParser(self.dev, **parser_args)
+        elif parser == 'framed':
+            # pylint: disable=R0204
+            self.parser = FramedParser(self.dev, **parser_args)
         else:
             raise NotImplementedError()
+        self.parser.cmd_timeout, self.parser.adaptive = self._timeout_config
+
+    @classmethod
+    def copy_driver(cls, dut, priority=0):
+        """Returns a DutShell that shares the driver of another one.
+
+        Commands of both shells are serialized so they can be used from
+        different threads, see BaseDevice.copy_driver.
+
+        Args:
+            dut(DutShell): The shell with the driver to share.
+            priority(int): Transaction priority of the new shell.
+        """
+        # pylint: disable=W0212
+        parser, parser_args = dut._parser_config
+        cmd_timeout, adaptive = dut._timeout_config
+        # The tags of both shells must not repeat on the shared driver
+        parser_args = dict(parser_args, seq=dut.parser._seq)
+        return cls(driver_type='driver', driver=dut.dev._shared_driver(),
+                   parser=parser, parser_args=parser_args, priority=priority,
+                   cache=dut.cache, cmd_timeout=cmd_timeout,
+                   adaptive_timeout=adaptive)
+
+    def close(self):
+        """Closes the device connection."""
+        self.dev.close()
+
+    def send_cmd(self, cmd_to_send, timeout=None):
+        """Sends a command and returns the parsed result dict.
+
+        Args:
+            cmd_to_send(str): The command to send.
+            timeout(float): Deadline of the response, overrides the adaptive
+                and default deadline.
+        """
+        if self.cache is None:
+            return self.parser.send_and_parse_cmd(cmd_to_send, timeout)
+        res = self.cache.get(cmd_to_send)
+        if res is None:
+            res = self.parser.send_and_parse_cmd(cmd_to_send, timeout)
+            if res.get('result') == RESULT_SUCCESS:
+                self.cache.put(cmd_to_send, res)
+        return res
+
+    def stream_cmd(self, cmd_to_send, timeout=None):
+        """Sends a command and yields the records of the response as they
+        arrive, the last one is the result dict.
+
+        The driver is held until the stream ends, a stream that may be left
+        early should be used as a context manager::
+
+            with dut.stream_cmd('stream 100') as records:
+                for record in records:
+                    ...
+
+        See BaseParser.stream_and_parse_cmd.
+
+        Args:
+            cmd_to_send(str): The command to send.
+            timeout(float): Deadline of the response, overrides the adaptive
+                and default deadline.
+
+        Returns:
+            ResponseStream: The records of the response.
+        """
+        if self.cache is not None and self.cache.invalidates(cmd_to_send):
+            self.cache.invalidate()
+        return ResponseStream(self.parser.stream_and_parse_cmd(cmd_to_send,
+                                                               timeout))
+
+    def send_cmds(self, cmds, depth=None, max_bytes=None, timeout=None):
+        """Sends a batch of commands pipelined without a round trip each.
+
+        Results are paired with the commands by their order, use resync=True
+        if responses can time out, see BaseParser.send_and_parse_cmds.
+
+        Args:
+            cmds(iterable): The commands to send.
+            depth(int): Maximum number of commands waiting for a response.
+            max_bytes(int): Maximum bytes of commands waiting for a response,
+                should not exceed the RX buffer of the DUT.
+            timeout(float): Deadline of each response from its write.
+
+        Returns:
+            list: The result dicts in the same order as the commands.
+        """
+        if self.cache is None:
+            return self.parser.send_and_parse_cmds(cmds, depth=depth,
+                                                   max_bytes=max_bytes,
+                                                   timeout=timeout)
+        return self._send_cached_cmds(list(cmds), depth, max_bytes, timeout)
 
-    def send_cmd(self, cmd_to_send, *args, **kwargs):
-        return self.parser.send_and_parse_cmd(cmd_to_send, *args, **kwargs)
+    def _send_cached_cmds(self, cmds, depth, max_bytes, timeout):
+        results = [None] * len(cmds)
+        # Hits are only served until a command in the batch invalidates
+        for idx, cmd in enumerate(cmds):
+            if self.cache.invalidates(cmd):
+                break
+            results[idx] = self.cache.get(cmd)
+        missed = [idx for idx, res in enumerate(results) if res is None]
+        responses = self.parser.send_and_parse_cmds(
+            [cmds[idx] for idx in missed], depth=depth, max_bytes=max_bytes,
+            timeout=timeout)
+        for idx, res in zip(missed, responses):
+            if self.cache.invalidates(cmds[idx]):
+                self.cache.invalidate()
+            elif res.get('result') == RESULT_SUCCESS:
+                self.cache.put(cmds[idx], res)
+            results[idx] = res
+        return results
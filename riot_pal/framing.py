@@ -0,0 +1,89 @@
+# Copyright (c) 2019 Kevin Weiss, for HAW Hamburg  <kevin.weiss@haw-hamburg.de>
+#
+# This file is subject to the terms and conditions of the MIT License. See the
+# file LICENSE in the top level directory for more details.
+# SPDX-License-Identifier:    MIT
+"""Binary Framing for RIOT PAL
+This module encodes and decodes the binary frames used instead of text lines
+for bulk data.  A frame is the COBS encoding of::
+
+    [status (1 byte)][payload][CRC16 of status and payload (2 bytes, BE)]
+
+followed by a zero byte as delimiter.  The CRC is CRC-16/CCITT-FALSE
+(polynomial 0x1021, initial value 0xFFFF).  The payload of a successful
+response is the raw data, the payload of an error is the UTF-8 message.
+"""
+import binascii
+
+FRAME_DELIMITER = b'\x00'
+STATUS_SUCCESS = 0
+STATUS_ERROR = 1
+_COBS_MAX_BLOCK = 254
+
+
+def crc16(data):
+    """Returns the CRC-16/CCITT-FALSE of data."""
+    return binascii.crc_hqx(data, 0xFFFF)
+
+
+def cobs_encode(data):
+    """Returns the COBS encoding of data, it contains no zero bytes."""
+    out = bytearray()
+    for segment in bytes(data).split(FRAME_DELIMITER):
+        start = 0
+        while len(segment) - start >= _COBS_MAX_BLOCK:
+            out.append(_COBS_MAX_BLOCK + 1)
+            out += segment[start:start + _COBS_MAX_BLOCK]
+            start += _COBS_MAX_BLOCK
+        out.append(len(segment) - start + 1)
+        out += segment[start:]
+    return bytes(out)
+
+
+def cobs_decode(data):
+    """Returns the decoded data of a COBS encoding without the delimiter.
+
+    Raises:
+        ValueError: If the encoding is invalid.
+    """
+    out = bytearray()
+    idx = 0
+    end = len(data)
+    while idx < end:
+        code = data[idx]
+        if code == 0:
+            raise ValueError("Zero byte in COBS data")
+        block_end = idx + code
+        if block_end > end:
+            raise ValueError("Truncated COBS block")
+        out += data[idx + 1:block_end]
+        idx = block_end
+        if code <= _COBS_MAX_BLOCK and idx < end:
+            out.append(0)
+    return out
+
+
+def encode_frame(status, payload=b''):
+    """Returns a frame including the delimiter."""
+    body = bytes([status]) + bytes(payload)
+    return (cobs_encode(body + crc16(body).to_bytes(2, 'big')) +
+            FRAME_DELIMITER)
+
+
+def decode_frame(frame):
+    """Decodes a frame, the delimiter is optional.
+
+    Returns:
+        tuple: The status and a memoryview of the payload.
+
+    Raises:
+        ValueError: If the frame is invalid or the CRC does not match.
+    """
+    if frame.endswith(FRAME_DELIMITER):
+        frame = frame[:-1]
+    body = memoryview(cobs_decode(frame))
+    if len(body) < 3:
+        raise ValueError("Frame too short")
+    if crc16(body[:-2]) != int.from_bytes(body[-2:], 'big'):
+        raise ValueError("Frame CRC mismatch")
+    return body[0], body[1:-2]
@@ -0,0 +1,302 @@
+#! /usr/bin/env python3
+# Copyright (c) 2019 Kevin Weiss, for HAW Hamburg  <kevin.weiss@haw-hamburg.de>
+#
+# This file is subject to the terms and conditions of the MIT License. See the
+# file LICENSE in the top level directory for more details.
+# SPDX-License-Identifier:    MIT
+"""
+I/O Tracer for RIOT PAL
+This module traces the writes and reads of drivers into a memory mapped
+ring file of a fixed size.  Records are packed directly into the mapping
+without any formatting, so tracing can stay on where logging.debug would be
+too slow, and the oldest records are dropped once the ring is full.  The
+file stays decodable if the process dies.
+
+Records have the layout of riot_pal.session_record, a trace can be replayed
+with the 'replay' driver_type.  The header stores the ring offsets and the
+time of the oldest record.
+
+Example:
+    tracer = IOTracer('/tmp/dut.trace', size=4 << 20)
+    dut = DutShell('/dev/ttyACM0', record=tracer)
+
+The CLI decodes a trace, filters it and exports it as text or as pcap with
+the link type USER0, each packet is the record kind followed by the
+payload.
+
+Usage
+-----
+
+```
+usage: io_trace.py  [-h] [--cmd CMD] [--kind KIND] [--format {text,pcap}]
+                    [--output OUTPUT]
+                    trace
+
+optional arguments:
+  --cmd, -c
+                        Only records of commands with the name, can be
+                        repeated
+  --kind, -k
+                        Only records of the kind, can be repeated
+                        {write,write_no_flush,read,read_bytes,read_frame,
+                        timeout}
+  --format, -f
+                        Output format (default: text)
+  --output, -o
+                        Output file (default: stdout)
+```
+"""
+import argparse
+import datetime
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+try:
+    from .session_record import RECORD, MAX_DELAY_US, KIND_NAMES, \
+        KIND_WRITE, KIND_WRITE_NO_FLUSH
+except ImportError:
+    from session_record import RECORD, MAX_DELAY_US, KIND_NAMES, \
+        KIND_WRITE, KIND_WRITE_NO_FLUSH
+
+TRACE_MAGIC = b'RPALTRC1'
+# magic, capacity, head, tail, time of the last record and of the record
+# before the tail in us since start, dropped records, start as epoch
+HEADER = struct.Struct('<8sQQQQQQd')
+# Pads the rest of the ring so records never wrap
+KIND_PAD = 0
+PCAP_LINKTYPE_USER0 = 147
+
+
+def _next_record(capacity, pos, header_at):
+    """Returns the offset after the record at pos and its header, the header
+    is None if the rest of the ring is padding."""
+    phys = pos % capacity
+    if capacity - phys < RECORD.size:
+        return pos + capacity - phys, None
+    header = header_at(phys)
+    if header[0] == KIND_PAD:
+        return pos + capacity - phys, None
+    return pos + RECORD.size + header[2], header
+
+
+class IOTracer:
+    """Appends I/O records to a memory mapped ring file.
+
+    Args:
+        path(str): The trace file.
+        size(int): Bytes of the ring, the file is slightly larger.
+        append(bool): Continues an existing trace of the same size, otherwise
+            the trace is started over.
+    """
+    DEFAULT_SIZE = 1 << 20
+
+    def __init__(self, path, size=DEFAULT_SIZE, append=True):
+        if size < 4 * RECORD.size:
+            raise ValueError("Trace size {} is too small".format(size))
+        self.path = path
+        self.capacity = size
+        self._lock = threading.Lock()
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            resume = append and \
+                os.fstat(fd).st_size == HEADER.size + size and \
+                os.pread(fd, len(TRACE_MAGIC), 0) == TRACE_MAGIC
+            if not resume:
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, HEADER.size + size)
+            self._map = mmap.mmap(fd, HEADER.size + size)
+        finally:
+            os.close(fd)
+        if resume:
+            (_, capacity, self._head, self._tail, self._head_us,
+             self._tail_us, self.dropped, self.start) = \
+                HEADER.unpack_from(self._map)
+            if capacity != size:
+                self._map.close()
+                raise ValueError("Trace {} has a ring of {} bytes, not {}"
+                                 .format(path, capacity, size))
+        else:
+            self._head = self._tail = self._head_us = self._tail_us = 0
+            self.dropped = 0
+            self.start = time.time()
+            self._write_header()
+
+    def _write_header(self):
+        HEADER.pack_into(self._map, 0, TRACE_MAGIC, self.capacity,
+                         self._head, self._tail, self._head_us,
+                         self._tail_us, self.dropped, self.start)
+
+    def _header_at(self, phys):
+        return RECORD.unpack_from(self._map, HEADER.size + phys)
+
+    def _reclaim(self, end):
+        """Drops the oldest records until the ring holds end."""
+        while end - self._tail > self.capacity:
+            self._tail, header = _next_record(self.capacity, self._tail,
+                                              self._header_at)
+            if header is not None:
+                self._tail_us += header[1]
+                self.dropped += 1
+
+    def record(self, kind, payload):
+        """Appends a record timed now, large payloads are truncated."""
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        if len(payload) > self.capacity // 2:
+            payload = payload[:self.capacity // 2]
+        size = RECORD.size + len(payload)
+        now_us = int((time.time() - self.start) * 1e6)
+        with self._lock:
+            delay_us = min(max(now_us - self._head_us, 0), MAX_DELAY_US)
+            head = self._head
+            phys = head % self.capacity
+            pad = None
+            if self.capacity - phys < size:
+                # Pads the end of the ring and starts at the beginning
+                head += self.capacity - phys
+                pad = phys
+                phys = 0
+            tail = self._tail
+            self._reclaim(head + size)
+            if self._tail != tail:
+                # The tail is stored before its records are overwritten
+                self._write_header()
+            if pad is not None and self.capacity - pad >= RECORD.size:
+                RECORD.pack_into(self._map, HEADER.size + pad, KIND_PAD, 0, 0)
+            offset = HEADER.size + phys
+            RECORD.pack_into(self._map, offset, kind, delay_us, len(payload))
+            self._map[offset + RECORD.size:offset + size] = payload
+            self._head = head + size
+            self._head_us += delay_us
+            self._write_header()
+
+    def flush(self):
+        """Writes the mapping to the file."""
+        self._map.flush()
+
+    def close(self):
+        """Writes and unmaps the trace."""
+        with self._lock:
+            if not self._map.closed:
+                self._map.flush()
+                self._map.close()
+
+
+def read_trace(path):
+    """Reads the records of a trace, oldest first.
+
+    Returns:
+        tuple: The epoch time before the first record and a list of the
+        kind, delay in seconds and payload of each record, same as
+        riot_pal.session_record.load_session.
+
+    Raises:
+        ValueError: If the file is not a trace.
+    """
+    with open(path, 'rb') as trace_file:
+        data = trace_file.read()
+    if len(data) < HEADER.size or not data.startswith(TRACE_MAGIC):
+        raise ValueError("{} is not a trace file".format(path))
+    _, capacity, head, tail, _, tail_us, _, start = \
+        HEADER.unpack_from(data)
+    ring = memoryview(data)[HEADER.size:HEADER.size + capacity]
+
+    def _header_at(phys):
+        return RECORD.unpack_from(ring, phys)
+
+    records = []
+    pos = tail
+    while pos < head:
+        phys = pos % capacity
+        pos, header = _next_record(capacity, pos, _header_at)
+        if header is None:
+            continue
+        kind, delay_us, size = header
+        payload = bytes(ring[phys + RECORD.size:phys + RECORD.size + size])
+        records.append((kind, delay_us / 1e6, payload))
+    return start + tail_us / 1e6, records
+
+
+def timed_records(path):
+    """Yields the epoch time, kind and payload of each record of a trace."""
+    timestamp, records = read_trace(path)
+    for kind, delay, payload in records:
+        timestamp += delay
+        yield timestamp, kind, payload
+
+
+def filter_records(records, cmds=None, kinds=None):
+    """Yields the records of commands and kinds.
+
+    Args:
+        records(iterable): Records with the kind and payload as last items.
+        cmds(iterable): Command names, reads belong to the latest write.
+        kinds(iterable): Kinds of the records.
+    """
+    cmds = set(cmds) if cmds else None
+    kinds = set(kinds) if kinds else None
+    selected = cmds is None
+    for record in records:
+        kind, payload = record[-2], record[-1]
+        if cmds is not None and kind in (KIND_WRITE, KIND_WRITE_NO_FLUSH):
+            selected = payload.split(b' ', 1)[0].decode(
+                'utf-8', errors='ignore') in cmds
+        if selected and (kinds is None or kind in kinds):
+            yield record
+
+
+def export_text(records, out):
+    """Writes timed records as lines of text."""
+    for timestamp, kind, payload in records:
+        out.write('{} {:<14} {!r}\n'.format(
+            datetime.datetime.fromtimestamp(timestamp).isoformat(),
+            KIND_NAMES.get(kind, kind), payload))
+
+
+def export_pcap(records, out):
+    """Writes timed records as pcap packets of the kind and payload."""
+    out.write(struct.pack('<IHHiIII', 0xa1b2c3d4, 2, 4, 0, 0, 0xffff,
+                          PCAP_LINKTYPE_USER0))
+    for timestamp, kind, payload in records:
+        sec = int(timestamp)
+        packet = bytes([kind]) + payload
+        out.write(struct.pack('<IIII', sec, int((timestamp - sec) * 1e6),
+                              len(packet), len(packet)))
+        out.write(packet)
+
+
+def main():
+    """Main program"""
+    parser = argparse.ArgumentParser()
+    kinds = {name: kind for kind, name in KIND_NAMES.items()}
+    parser.add_argument('trace', help='The trace file')
+    parser.add_argument('--cmd', '-c', action='append',
+                        help='Only records of commands with the name, can be '
+                        'repeated')
+    parser.add_argument('--kind', '-k', action='append', choices=list(kinds),
+                        help='Only records of the kind, can be repeated')
+    parser.add_argument('--format', '-f', choices=('text', 'pcap'),
+                        default='text', help='Output format')
+    parser.add_argument('--output', '-o', help='Output file')
+    pargs = parser.parse_args()
+
+    records = filter_records(timed_records(pargs.trace), cmds=pargs.cmd,
+                             kinds=[kinds[kind] for kind in pargs.kind or []])
+    if pargs.format == 'pcap':
+        if pargs.output:
+            with open(pargs.output, 'wb') as out:
+                export_pcap(records, out)
+        else:
+            export_pcap(records, sys.stdout.buffer)
+    elif pargs.output:
+        with open(pargs.output, 'w') as out:
+            export_text(records, out)
+    else:
+        export_text(records, sys.stdout)
+
+
+if __name__ == '__main__':
+    main()
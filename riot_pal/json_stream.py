@@ -0,0 +1,175 @@
+# Copyright (c) 2019 Kevin Weiss, for HAW Hamburg  <kevin.weiss@haw-hamburg.de>
+#
+# This file is subject to the terms and conditions of the MIT License. See the
+# file LICENSE in the top level directory for more details.
+# SPDX-License-Identifier:    MIT
+"""Streaming JSON Decoder for RIOT PAL
+This module decodes JSON objects from the lines of a DUT response.  Lines are
+classified by their first character so plain text lines never go through the
+JSON decoder.  Objects that are split across several lines are collected until
+they are complete, unless a line starts a new object first, then the
+collected lines are text.  Lines can be str or bytes, bytes are decoded
+directly by the JSON backend.
+
+If orjson is installed it is used as the backend, otherwise the standard json
+module.  orjson is imported when the first decoder is created.
+"""
+import functools
+import json
+import logging
+
+
+_INCOMPLETE = object()
+_INVALID = object()
+
+
+@functools.lru_cache(maxsize=None)
+def _orjson():
+    """Returns the orjson module or None if it is not installed."""
+    try:
+        import orjson
+    except ImportError:
+        return None
+    return orjson
+
+
+def _is_incomplete(text):
+    """Checks if the text is the start of a JSON object that is not closed."""
+    depth = 0
+    in_str = False
+    escaped = False
+    for char in text:
+        if in_str:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_str = False
+        elif char == '"':
+            in_str = True
+        elif char in '{[':
+            depth += 1
+        elif char in '}]':
+            depth -= 1
+            if depth <= 0:
+                return False
+    return depth > 0
+
+
+class JSONStreamDecoder:
+    """Decodes JSON objects from response lines.
+
+    Args:
+        backend(str): Selects the JSON backend {auto, json, orjson}, auto uses
+            orjson if it is installed.
+        max_pending(int): Maximum size of a split object, if an object does not
+            complete within the size its lines are handled as text.
+    """
+    DEFAULT_MAX_PENDING = 64 * 1024
+
+    def __init__(self, backend='auto', max_pending=DEFAULT_MAX_PENDING):
+        orjson = _orjson() if backend in ('auto', 'orjson') else None
+        if backend == 'auto':
+            backend = 'json' if orjson is None else 'orjson'
+        if backend == 'orjson':
+            if orjson is None:
+                raise ImportError("orjson backend is not installed")
+            self._loads = orjson.loads
+        elif backend == 'json':
+            self._loads = json.loads
+        else:
+            raise NotImplementedError()
+        self.backend = backend
+        self.max_pending = max_pending
+        self._pending = []
+        self._pending_size = 0
+
+    @staticmethod
+    def _is_json_start(line):
+        first = line[:1]
+        if first in (b'{', '{'):
+            return True
+        if first.isspace():
+            return line.lstrip()[:1] in (b'{', '{')
+        return False
+
+    @staticmethod
+    def _strip_line(line):
+        if isinstance(line, bytes):
+            return line.rstrip(b'\r\n')
+        return line.rstrip('\r\n')
+
+    def _decode(self, doc):
+        try:
+            return self._loads(doc)
+        except UnicodeDecodeError:
+            doc = doc.decode('utf-8', errors='ignore')
+            return self._decode(doc)
+        except ValueError:
+            if isinstance(doc, bytes):
+                doc = doc.decode('utf-8', errors='ignore')
+            if _is_incomplete(doc):
+                return _INCOMPLETE
+            return _INVALID
+
+    def _starts_object(self, line):
+        """Checks if a line starts a new top-level object, that is it is not
+        indented or it is a complete object on its own."""
+        if line[:1] in (b'{', '{'):
+            return True
+        return self._is_json_start(line) and \
+            self._decode(line) not in (_INCOMPLETE, _INVALID)
+
+    def _feed_pending(self, line):
+        lines = self._pending + [line]
+        doc = lines[0][:0].join(self._strip_line(part) for part in lines)
+        obj = self._decode(doc)
+        if self._pending and (obj is _INCOMPLETE or obj is _INVALID):
+            if self._starts_object(line):
+                # The pending text was noise that started with a brace
+                stale = self.flush()
+                logging.debug("Could not decode split JSON: %r", stale)
+                obj, msgs = self.feed(line)
+                return obj, stale + msgs
+        self._pending = lines
+        self._pending_size += len(line)
+        if obj is _INCOMPLETE and self._pending_size <= self.max_pending:
+            return None, ()
+        self.reset()
+        if obj is _INCOMPLETE or obj is _INVALID:
+            logging.debug("Could not decode split JSON: %r", lines)
+            return None, tuple(lines)
+        return obj, ()
+
+    def feed(self, line):
+        """Feeds a line to the decoder.
+
+        Args:
+            line(str, bytes): A line of the response.
+
+        Returns:
+            tuple: The decoded object or None and a tuple of the lines that
+            are not JSON.
+        """
+        if self._pending:
+            return self._feed_pending(line)
+        if not self._is_json_start(line):
+            return None, (line,)
+        obj = self._decode(line)
+        if obj is _INCOMPLETE:
+            return self._feed_pending(line)
+        if obj is _INVALID:
+            return None, (line,)
+        return obj, ()
+
+    def flush(self):
+        """Returns the lines of an incomplete object and resets the decoder."""
+        lines = tuple(self._pending)
+        self.reset()
+        return lines
+
+    def reset(self):
+        """Drops any incomplete object."""
+        self._pending = []
+        self._pending_size = 0
@@ -0,0 +1,181 @@
+# Copyright (c) 2019 Kevin Weiss, for HAW Hamburg  <kevin.weiss@haw-hamburg.de>
+#
+# This file is subject to the terms and conditions of the MIT License. See the
+# file LICENSE in the top level directory for more details.
+# SPDX-License-Identifier:    MIT
+"""Command Metrics for RIOT PAL
+This module records the timing and IO of each command.  The parsers mark the
+begin and end of a command, the drivers report writes, lines, timeouts,
+reconnects and flushed input.  Drivers only record if a metrics instance is
+set on them so there is no cost when metrics are disabled.
+
+Each finished command is passed as a record dict to the hooks and added to
+totals per command name, which can be dumped as JSON or Prometheus text.
+
+Example:
+    metrics = CommandMetrics()
+    metrics.add_hook(print)
+    dut = DutShell('/dev/ttyACM0', metrics=metrics)
+    dut.send_cmd('help')
+    print(metrics.to_prometheus())
+"""
+import json
+import threading
+import time
+from collections import deque
+
+
+class CommandMetrics:
+    """Records per command metrics.
+
+    The record of a command contains::
+        cmd - The command sent.
+        result - The result of the response.
+        write_time - Seconds to write the command.
+        ttfb - Seconds from the written command to the first line.
+        latency - Seconds from the begin to the end of the command.
+        bytes_out - Bytes written.
+        bytes_in - Bytes read.
+        lines - Lines read.
+        timeouts - Read timeouts.
+        reconnects - Reconnects of the driver.
+        flushes - Input flushes before the command was written.
+        dropped_bytes - Stale bytes flushed or dropped while resynchronizing.
+
+    Args:
+        hooks(list): Callables called with each finished record.
+    """
+    COUNTERS = ('bytes_out', 'bytes_in', 'lines', 'timeouts', 'reconnects',
+                'flushes', 'dropped_bytes')
+    TIMERS = ('write_time', 'ttfb', 'latency')
+
+    def __init__(self, hooks=None):
+        self._hooks = list(hooks or [])
+        self._lock = threading.Lock()
+        self._open = deque()
+        self.per_command = {}
+        self.unattributed = dict.fromkeys(self.COUNTERS, 0)
+
+    def add_hook(self, hook):
+        """Adds a callable called with each finished record."""
+        self._hooks.append(hook)
+
+    def begin(self, cmd):
+        """Starts the record of a command, called before it is written."""
+        record = dict.fromkeys(self.COUNTERS, 0)
+        record.update(cmd=cmd, result=None, write_time=0, ttfb=None,
+                      latency=None, _start=time.perf_counter(),
+                      _written=None)
+        with self._lock:
+            self._open.append(record)
+
+    def abort(self):
+        """Drops the latest command, called if it could not be written.
+
+        Its counters are added to the unattributed ones.
+        """
+        with self._lock:
+            if not self._open:
+                return
+            record = self._open.pop()
+            for key in self.COUNTERS:
+                self.unattributed[key] += record[key]
+
+    def _reading(self):
+        # Responses are read in the order the commands were written
+        return self._open[0] if self._open else self.unattributed
+
+    def on_write(self, nbytes, duration):
+        """Adds a write to the latest command."""
+        with self._lock:
+            record = self._open[-1] if self._open else self.unattributed
+            record['bytes_out'] += nbytes
+            if record is not self.unattributed:
+                record['write_time'] += duration
+                record['_written'] = time.perf_counter()
+
+    def on_line(self, nbytes):
+        """Adds a read line to the command waiting for a response."""
+        with self._lock:
+            record = self._reading()
+            record['bytes_in'] += nbytes
+            record['lines'] += 1
+            if record is not self.unattributed and record['ttfb'] is None:
+                start = record['_written'] or record['_start']
+                record['ttfb'] = time.perf_counter() - start
+
+    def on_flush(self, nbytes):
+        """Adds an input flush and the bytes it discarded to the latest
+        command."""
+        with self._lock:
+            record = self._open[-1] if self._open else self.unattributed
+            record['flushes'] += 1
+            record['dropped_bytes'] += nbytes
+
+    def on_drop(self, nbytes):
+        """Adds stale bytes dropped by the parser to the command waiting for
+        a response."""
+        with self._lock:
+            self._reading()['dropped_bytes'] += nbytes
+
+    def on_timeout(self):
+        """Adds a read timeout to the command waiting for a response."""
+        with self._lock:
+            self._reading()['timeouts'] += 1
+
+    def on_reconnect(self):
+        """Adds a reconnect to the command waiting for a response."""
+        with self._lock:
+            self._reading()['reconnects'] += 1
+
+    def end(self, result):
+        """Finishes the oldest command and passes its record to the hooks."""
+        with self._lock:
+            if not self._open:
+                return None
+            record = self._open.popleft()
+            record['latency'] = time.perf_counter() - record.pop('_start')
+            del record['_written']
+            record['result'] = result
+            name = record['cmd'].split(' ', 1)[0]
+            totals = self.per_command.get(name)
+            if totals is None:
+                totals = dict.fromkeys(self.COUNTERS + self.TIMERS, 0)
+                totals.update(count=0, latency_max=0)
+                self.per_command[name] = totals
+            totals['count'] += 1
+            for key in self.COUNTERS + self.TIMERS:
+                totals[key] += record[key] or 0
+            totals['latency_max'] = max(totals['latency_max'],
+                                        record['latency'])
+        for hook in self._hooks:
+            hook(record)
+        return record
+
+    def to_dict(self):
+        """Returns the totals per command name."""
+        with self._lock:
+            return {'commands': {name: dict(totals) for name, totals
+                                 in self.per_command.items()},
+                    'unattributed': dict(self.unattributed)}
+
+    def to_json(self):
+        """Returns the totals as JSON."""
+        return json.dumps(self.to_dict(), sort_keys=True)
+
+    def to_prometheus(self, prefix='riot_pal'):
+        """Returns the totals in the Prometheus text format."""
+        totals = self.to_dict()['commands']
+        lines = []
+        metrics = [('commands_total', 'count', 'counter')]
+        metrics += [(key + '_total', key, 'counter') for key in self.COUNTERS]
+        metrics += [(key + '_seconds_sum', key, 'counter')
+                    for key in self.TIMERS]
+        metrics += [('latency_seconds_max', 'latency_max', 'gauge')]
+        for metric, key, metric_type in metrics:
+            lines.append('# TYPE {}_{} {}'.format(prefix, metric, metric_type))
+            for name in sorted(totals):
+                lines.append('{}_{}{{cmd="{}"}} {}'.format(
+                    prefix, metric, name.replace('"', '\\"'),
+                    totals[name][key]))
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,178 @@
+# Copyright (c) 2019 Kevin Weiss, for HAW Hamburg  <kevin.weiss@haw-hamburg.de>
+#
+# This file is subject to the terms and conditions of the MIT License. See the
+# file LICENSE in the top level directory for more details.
+# SPDX-License-Identifier:    MIT
+"""Multi DUT Orchestrator for RIOT PAL
+This module runs the same commands on many devices in parallel.  Each device
+is handled by a worker of a bounded thread pool so the wall time of a run is
+set by the slowest device and not by the sum of all devices.
+
+Failing devices do not affect the others, connection errors and exceptions
+are stored in the result of the device.  A device that does not finish
+before the deadline of a run is reported as timed out and skipped by later
+runs until its worker returns.
+
+Example:
+    configs = {'nucleo': {'port': '/dev/ttyACM0'},
+               'samr21': {'port': '/dev/ttyACM1', 'parser': 'json'}}
+    with DutOrchestrator(configs) as orchestrator:
+        results = orchestrator.send_cmds(['help', 'reboot'], deadline=10)
+        for name, res in results.items():
+            print(name, res['result'], res['msg'])
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+try:
+    from .dut_shell import DutShell, RESULT_SUCCESS, RESULT_ERROR, \
+        RESULT_TIMEOUT
+except ImportError:
+    from dut_shell import DutShell, RESULT_SUCCESS, RESULT_ERROR, \
+        RESULT_TIMEOUT
+
+
+class DutOrchestrator:
+    """Fans commands out across many devices.
+
+    The result of a device in a run contains::
+        result - Success if all commands succeeded, Error if a command failed
+            or an exception was raised and Timeout if the deadline passed.
+        data - The result dicts of the commands or the return value.
+        msg - The exception or None.
+        elapsed - Seconds the device needed.
+
+    Args:
+        configs(dict): Keyword arguments of the device per name.  Positional
+            arguments can be given as a list with the key args.
+        max_workers(int): Maximum devices handled at once, defaults to one
+            worker per device.
+        device_cls: Class of the devices, defaults to DutShell.
+    """
+
+    def __init__(self, configs, max_workers=None, device_cls=DutShell):
+        self.configs = dict(configs)
+        self.device_cls = device_cls
+        self.devices = {}
+        self._busy = {}
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or max(len(self.configs), 1),
+            thread_name_prefix='riot_pal-orchestrator')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _connect(self, name):
+        if name not in self.devices:
+            kwargs = dict(self.configs[name])
+            args = kwargs.pop('args', ())
+            self.devices[name] = self.device_cls(*args, **kwargs)
+        return self.devices[name]
+
+    def _run_device(self, name, func):
+        start = time.monotonic()
+        res = {'result': RESULT_SUCCESS, 'data': None, 'msg': None}
+        try:
+            res['data'] = func(self._connect(name))
+        except Exception as exc:  # pylint: disable=W0703
+            logging.debug("Device %s failed: %r", name, exc)
+            res['result'] = RESULT_ERROR
+            res['msg'] = repr(exc)
+        res['elapsed'] = time.monotonic() - start
+        return res
+
+    def run(self, func, names=None, deadline=None):
+        """Calls a function with each device in parallel.
+
+        Args:
+            func: Called with the device, the return value is the data.
+            names(iterable): Only runs the devices with the names.
+            deadline(float): Seconds until unfinished devices are reported
+                as timed out.
+
+        Returns:
+            dict: The result of each device by name.
+        """
+        start = time.monotonic()
+        results = {}
+        futures = {}
+        for name in names or self.configs:
+            if name in self._busy:
+                if not self._busy[name].done():
+                    results[name] = {'result': RESULT_TIMEOUT, 'data': None,
+                                     'msg': 'Device is busy', 'elapsed': 0}
+                    continue
+                del self._busy[name]
+            futures[name] = self._executor.submit(self._run_device, name,
+                                                  func)
+        wait(futures.values(), timeout=deadline)
+        for name, future in futures.items():
+            if future.done():
+                results[name] = future.result()
+            else:
+                logging.debug("Device %s missed the deadline", name)
+                self._busy[name] = future
+                results[name] = {'result': RESULT_TIMEOUT, 'data': None,
+                                 'msg': 'Deadline passed',
+                                 'elapsed': time.monotonic() - start}
+        return results
+
+    def connect(self, deadline=None):
+        """Connects all devices in parallel.
+
+        Returns:
+            dict: The result of each device by name.
+        """
+        return self.run(lambda dev: None, deadline=deadline)
+
+    def send_cmds(self, cmds, names=None, deadline=None, **kwargs):
+        """Sends a batch of commands to each device in parallel.
+
+        Args:
+            cmds(list): The commands to send.
+            names(iterable): Only sends to the devices with the names.
+            deadline(float): Seconds until unfinished devices are reported
+                as timed out.
+            **kwargs: Passed through to DutShell.send_cmds.
+
+        Returns:
+            dict: The result of each device by name.
+        """
+        cmds = list(cmds)
+        results = self.run(lambda dev: dev.send_cmds(cmds, **kwargs),
+                           names=names, deadline=deadline)
+        for res in results.values():
+            if res['result'] == RESULT_SUCCESS and \
+                    any(cmd_info.get('result') != RESULT_SUCCESS
+                        for cmd_info in res['data']):
+                res['result'] = RESULT_ERROR
+        return results
+
+    def send_cmd(self, cmd, names=None, deadline=None):
+        """Sends a command to each device in parallel.
+
+        Returns:
+            dict: The result of each device by name.
+        """
+        results = self.send_cmds([cmd], names=names, deadline=deadline,
+                                 depth=1)
+        for res in results.values():
+            if res['data'] is not None:
+                res['data'] = res['data'][0]
+        return results
+
+    def close(self):
+        """Closes all devices that are not busy and stops the workers."""
+        self._executor.shutdown(wait=False)
+        for name, dev in self.devices.items():
+            if name in self._busy and not self._busy[name].done():
+                logging.debug("Not closing busy device %s", name)
+                continue
+            try:
+                dev.close()
+            except Exception as exc:  # pylint: disable=W0703
+                logging.debug("Closing %s failed: %r", name, exc)
+        self.devices = {}
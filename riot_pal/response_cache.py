@@ -0,0 +1,120 @@
+# Copyright (c) 2019 Kevin Weiss, for HAW Hamburg  <kevin.weiss@haw-hamburg.de>
+#
+# This file is subject to the terms and conditions of the MIT License. See the
+# file LICENSE in the top level directory for more details.
+# SPDX-License-Identifier:    MIT
+"""Response Cache for RIOT PAL
+This module caches the results of idempotent commands, such as help or
+version queries, so repeated queries do not need a round trip to the DUT.
+
+Only successful results of commands whose name is in the allow-list are
+cached, keyed by the full command.  Entries expire after the TTL and the
+least recently used entry is evicted when the cache is full.  All entries
+are invalidated when a command whose name is in the invalidation list, such
+as a write or reset, is sent.
+
+Example:
+    cache = ResponseCache(allow=('help', 'version', 'read_reg'))
+    dut = DutShell('/dev/ttyACM0', cache=cache)
+    dut.send_cmd('help')
+    # Answered by the cache
+    dut.send_cmd('help')
+    print(cache.stats())
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """Caches the results of idempotent commands.
+
+    Args:
+        allow(iterable): Names of commands that can be cached.
+        ttl(float): Seconds an entry is valid, None never expires.
+        max_entries(int): Entries kept before the least recently used is
+            evicted.
+        invalidate(iterable): Names of commands that invalidate all
+            entries.
+    """
+    DEFAULT_ALLOW = ('help', 'version')
+    DEFAULT_TTL = 60
+    DEFAULT_MAX_ENTRIES = 128
+    DEFAULT_INVALIDATE = ('reboot', 'reset', 'write', 'write_reg', 'set')
+
+    def __init__(self, allow=DEFAULT_ALLOW, ttl=DEFAULT_TTL,
+                 max_entries=DEFAULT_MAX_ENTRIES,
+                 invalidate=DEFAULT_INVALIDATE):
+        self.allow = frozenset(allow)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.invalidate_names = frozenset(invalidate)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _name(cmd):
+        return cmd.split(' ', 1)[0]
+
+    def cacheable(self, cmd):
+        """Returns True if the result of the command can be cached."""
+        return self._name(cmd) in self.allow
+
+    def invalidates(self, cmd):
+        """Returns True if the command invalidates the cache."""
+        return self._name(cmd) in self.invalidate_names
+
+    def invalidate(self):
+        """Removes all entries."""
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def get(self, cmd):
+        """Returns a copy of the cached result of a command or None.
+
+        A command that invalidates the cache removes all entries.
+        """
+        if self.invalidates(cmd):
+            self.invalidate()
+            return None
+        if not self.cacheable(cmd):
+            return None
+        with self._lock:
+            entry = self._entries.get(cmd)
+            if entry is not None and self.ttl is not None and \
+                    time.monotonic() - entry[0] > self.ttl:
+                del self._entries[cmd]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(cmd)
+            self.hits += 1
+        return copy.deepcopy(entry[1])
+
+    def put(self, cmd, result):
+        """Caches the result of a command if it is cacheable."""
+        if not self.cacheable(cmd):
+            return
+        try:
+            result = copy.deepcopy(result)
+        except TypeError:
+            # Views such as memoryview data cannot be kept
+            return
+        with self._lock:
+            self._entries[cmd] = (time.monotonic(), result)
+            self._entries.move_to_end(cmd)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        """Returns the hit, miss and invalidation counters."""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'invalidations': self.invalidations,
+                    'entries': len(self._entries)}
@@ -5,42 +5,217 @@
 # SPDX-License-Identifier:    MIT
 """RIOT Driver for RIOT PAL
 This module handles generic connection and IO to the make term.
+
+Spawning make term parses the RIOT build system on every connection, the
+driver can instead resolve the terminal settings of the application once and
+connect without make:
+    'make' spawns make term.
+    'termprog' spawns the terminal program (TERMPROG with TERMFLAGS).
+    'direct' opens the serial port (PORT with BAUD) directly.
+The resolved settings are cached for the process per application path, BOARD
+and PORT.
 """
 import logging
 import os
+import shlex
+import subprocess
+import time
 import pexpect
+try:
+    from .serial_driver import SerialDriver
+except ImportError:
+    from serial_driver import SerialDriver
+
+
+_TERM_CONFIG_CACHE = {}
+_TERM_VARIABLES = ('TERMPROG', 'TERMFLAGS', 'PORT', 'BAUD')
+
+
+def resolve_term_config(path=None):
+    """Returns the terminal settings of a RIOT application.
+
+    The settings are resolved with make once and then cached.
+
+    Args:
+        path(str): Path to the application, defaults to the working directory.
+
+    Returns:
+        dict: The TERMPROG, TERMFLAGS, PORT and BAUD make variables.
+    """
+    path = os.path.abspath(path or os.getcwd())
+    key = (path, os.environ.get('BOARD'), os.environ.get('PORT'))
+    if key not in _TERM_CONFIG_CACHE:
+        targets = ['info-debug-variable-' + var for var in _TERM_VARIABLES]
+        output = subprocess.check_output(['make', '--no-print-directory',
+                                          '-C', path] + targets,
+                                         universal_newlines=True)
+        values = output.splitlines()
+        if len(values) != len(_TERM_VARIABLES):
+            raise ValueError("Could not resolve terminal of {}: {!r}".format(
+                path, output))
+        _TERM_CONFIG_CACHE[key] = dict(zip(_TERM_VARIABLES, values))
+        logging.debug("Resolved terminal %r", _TERM_CONFIG_CACHE[key])
+    return _TERM_CONFIG_CACHE[key]
 
 
 class RiotDriver:
     """Contains all reusable functions for connecting, sending and receiving
     data.
+
+    Args:
+        timeout(float): Read timeout in seconds.
+        path(str): Path to the RIOT application, the working directory of the
+            process is not changed.
+        mode(str): Selects how to connect {make, termprog, direct}.
+        termprog(str): Terminal program for termprog mode, skips resolving it.
+        termflags(str): Arguments of the terminal program.
+        port(str): Serial port for direct mode, skips resolving it.
+        baudrate(int): Baudrate for direct mode.
+        send_delay(float): Overrides the delay of pexpect before each write,
+            pexpect defaults to 50 ms.
     """
+    MODES = ('make', 'termprog', 'direct')
+    metrics = None
 
-    def __init__(self, timeout=5, path=None):
-        if path is not None:
-            os.chdir(path)
-        self.child = pexpect.spawnu("make term", timeout=timeout,
-                                    codec_errors='replace')
+    def __init__(self, timeout=5, path=None, mode='make', **kwargs):
+        if mode not in self.MODES:
+            raise ValueError("Unknown mode {}".format(mode))
+        self.mode = mode
+        self.child = None
+        self._serial = None
+        if mode == 'make':
+            self.child = pexpect.spawnu("make term", timeout=timeout,
+                                        codec_errors='replace', cwd=path)
+        elif mode == 'termprog':
+            termprog = kwargs.get('termprog')
+            termflags = kwargs.get('termflags', '')
+            if termprog is None:
+                config = resolve_term_config(path)
+                termprog = config['TERMPROG']
+                termflags = config['TERMFLAGS']
+            self.child = pexpect.spawnu(termprog, shlex.split(termflags),
+                                        timeout=timeout,
+                                        codec_errors='replace', cwd=path)
+        else:
+            port = kwargs.get('port')
+            baudrate = kwargs.get('baudrate')
+            if port is None:
+                config = resolve_term_config(path)
+                port = config['PORT']
+                baudrate = baudrate or config['BAUD']
+            baudrate = int(baudrate or SerialDriver.DEFAULT_BAUDRATE)
+            self._serial = SerialDriver(port, baudrate, timeout=timeout,
+                                        reconnect=SerialDriver.RECONNECT_NEVER)
+        if self.child is not None and 'send_delay' in kwargs:
+            self.child.delaybeforesend = kwargs['send_delay']
 
     def close(self):
         """Closes the spawned process"""
-        self.child.close()
+        if self._serial is None:
+            self.child.close()
+        else:
+            self._serial.close()
+
+    def health_check(self):
+        """Checks if the terminal process or the port is still usable."""
+        if self._serial is None:
+            return self.child.isalive()
+        return self._serial.health_check()
+
+    @staticmethod
+    def strip_response(response):
+        """Strips the prompt and line endings from a make term line."""
+        head, sep, tail = response.partition('# ')
+        response = (tail if sep else head).rstrip('\r\n')
+        if '\r' in response:
+            response = response.replace('\r', '')
+        if '\n' in response:
+            response = response.replace('\n', '')
+        return response
+
+    @staticmethod
+    def strip_response_bytes(response):
+        """Strips the prompt and line endings from an undecoded line."""
+        head, sep, tail = response.partition(b'# ')
+        response = (tail if sep else head).rstrip(b'\r\n')
+        if b'\r' in response:
+            response = response.replace(b'\r', b'')
+        if b'\n' in response:
+            response = response.replace(b'\n', b'')
+        return response
 
-    def readline(self):
+    def _child_readline(self, timeout):
+        if timeout is None:
+            return self.child.readline()
+        default_timeout = self.child.timeout
+        self.child.timeout = timeout
+        try:
+            return self.child.readline()
+        finally:
+            self.child.timeout = default_timeout
+
+    def readline(self, timeout=None):
         """Reads a line from a make term process and strips away all additional
-        data so only the output of the device is left."""
+        data so only the output of the device is left.
+
+        Args:
+            timeout(float): Overrides the read timeout.
+        """
         try:
-            response = self.child.readline()
-            response = response.split('# ', 1)[-1]
-            response = response.replace('\n', '')
-            response = response.replace('\r', '')
-        except (ValueError, TypeError, pexpect.TIMEOUT) as exc:
+            if self._serial is None:
+                response = self._child_readline(timeout)
+            else:
+                response = self._serial.readline(timeout)
+            if self.metrics is not None:
+                self.metrics.on_line(len(response))
+            response = self.strip_response(response)
+        except (ValueError, TypeError, TimeoutError, pexpect.TIMEOUT) as exc:
             logging.debug(exc)
+            if self.metrics is not None:
+                self.metrics.on_timeout()
             raise TimeoutError
         logging.debug("Response: %s", response)
         return response
 
-    def write(self, data):
-        """Tries write data and adds a newline."""
+    def readline_bytes(self, timeout=None):
+        """Reads a line without decoding it.
+
+        Only the serial port of direct mode is read undecoded, the make term
+        output is returned as str.
+
+        Args:
+            timeout(float): Overrides the read timeout.
+        """
+        if self._serial is None:
+            return self.readline(timeout)
+        try:
+            response = self._serial.readline_bytes(timeout)
+        except TimeoutError:
+            if self.metrics is not None:
+                self.metrics.on_timeout()
+            raise
+        if self.metrics is not None:
+            self.metrics.on_line(len(response))
+        return self.strip_response_bytes(response)
+
+    def read_frame(self, timeout=None):
+        """Reads a binary frame, only the serial port of direct mode is not
+        altered by a terminal program."""
+        if self._serial is None:
+            raise NotImplementedError("Binary frames need the direct mode")
+        return self._serial.read_frame(timeout)
+
+    def write(self, data, flush_input=True):
+        """Tries write data and adds a newline.
+
+        The make term output is never flushed so flush_input has no effect
+        unless the port is used directly.
+        """
         logging.debug("Writing: %s", data)
-        self.child.write(data + '\n')
+        start = time.perf_counter()
+        if self._serial is None:
+            self.child.write(data + '\n')
+        else:
+            self._serial.write(data, flush_input=flush_input)
+        if self.metrics is not None:
+            self.metrics.on_write(len(data) + 1, time.perf_counter() - start)
@@ -0,0 +1,337 @@
+# Copyright (c) 2019 Kevin Weiss, for HAW Hamburg  <kevin.weiss@haw-hamburg.de>
+#
+# This file is subject to the terms and conditions of the MIT License. See the
+# file LICENSE in the top level directory for more details.
+# SPDX-License-Identifier:    MIT
+"""Device Lease Scheduler for RIOT PAL
+This module shards tasks across a pool of equivalent boards.  Each worker
+process leases one board with an exclusive flock on its tty, so boards are
+never shared with other workers or other schedulers on the host, and takes
+tasks from a common queue until none are left.  N boards therefore give
+close to N times the throughput of one.
+
+If a board fails with an OSError, such as a lost connection, its worker
+returns the task to the queue for the remaining boards and leases another
+board if one is free.  A task is retried on max_attempts boards at most.
+Leases are returned when a worker ends, the kernel drops the lock if a
+worker dies.
+
+The devices must open their port with exclusive=False, the pyserial default.
+pyserial with exclusive=True takes its own flock on another descriptor,
+which fails while the worker holds the lease.
+
+Example:
+    def flash_test(dut, addr):
+        return dut.send_cmd('read_reg {} 4'.format(addr))
+
+    scheduler = DutScheduler(discover_ports(vid=0x0483),
+                             device_kwargs={'parser': 'json'})
+    for res in scheduler.run(flash_test, range(1000)):
+        print(res['board'], res['result'], res['data'])
+"""
+import fcntl
+import fnmatch
+import logging
+import multiprocessing
+import os
+import queue
+import time
+try:
+    from .dut_shell import DutShell, RESULT_SUCCESS, RESULT_ERROR
+except ImportError:
+    from dut_shell import DutShell, RESULT_SUCCESS, RESULT_ERROR
+
+
+def discover_ports(vid=None, pid=None, serial_numbers=None, pattern=None):
+    """Returns the serial ports of the connected boards that match.
+
+    Args:
+        vid(int): USB vendor id of the boards.
+        pid(int): USB product id of the boards.
+        serial_numbers(iterable): USB serial numbers of the boards.
+        pattern(str): Shell pattern the port has to match, such as
+            '/dev/ttyACM*'.
+    """
+    # Only enumerating ports needs the port listing of pyserial
+    import serial.tools.list_ports
+    ports = []
+    for info in serial.tools.list_ports.comports():
+        if vid is not None and info.vid != vid:
+            continue
+        if pid is not None and info.pid != pid:
+            continue
+        if serial_numbers is not None and \
+                info.serial_number not in serial_numbers:
+            continue
+        if pattern is not None and not fnmatch.fnmatch(info.device, pattern):
+            continue
+        ports.append(info.device)
+    return sorted(ports)
+
+
+class PortLease:
+    """Exclusive lease of a board, an flock on its tty.
+
+    Other tools that flock the port, such as pyserial with exclusive=True,
+    cannot open it while the lease is held.  That includes the holder
+    itself, the flock is bound to the descriptor of the lease, so open the
+    port with exclusive=False while holding the lease.
+
+    Args:
+        port(str): The serial port of the board.
+    """
+
+    def __init__(self, port):
+        self.port = port
+        self._fd = None
+
+    def __enter__(self):
+        self.acquire(blocking=True)
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    @property
+    def held(self):
+        """True if the lease is held."""
+        return self._fd is not None
+
+    def acquire(self, blocking=False):
+        """Leases the board.
+
+        Args:
+            blocking(bool): Waits until the board is free.
+
+        Returns:
+            bool: True if the board was leased.
+
+        Raises:
+            OSError: If the port cannot be opened.
+        """
+        if self._fd is not None:
+            return True
+        fd = os.open(self.port, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        except OSError:
+            os.close(fd)
+            raise
+        self._fd = fd
+        logging.debug("Leased %s", self.port)
+        return True
+
+    def release(self):
+        """Returns the board."""
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+            logging.debug("Released %s", self.port)
+
+
+class _Worker:
+    """Runs tasks on a leased board in a worker process."""
+
+    def __init__(self, scheduler, tasks, results, offset):
+        self.ports = scheduler.ports[offset:] + scheduler.ports[:offset]
+        self.device_cls = scheduler.device_cls
+        self.device_kwargs = scheduler.device_kwargs
+        self.board_errors = scheduler.board_errors
+        self.tasks = tasks
+        self.results = results
+        self.failed = set()
+        self.lease = None
+        self.dut = None
+
+    def _connect(self):
+        """Leases the first free board, returns False if none is free."""
+        for port in self.ports:
+            if port in self.failed:
+                continue
+            lease = PortLease(port)
+            try:
+                if not lease.acquire():
+                    continue
+                dut = self.device_cls(port, **self.device_kwargs)
+            except self.board_errors as exc:
+                logging.debug("Could not connect %s: %r", port, exc)
+                lease.release()
+                self._fail(port, exc)
+                continue
+            self.lease = lease
+            self.dut = dut
+            return True
+        return False
+
+    def _disconnect(self):
+        try:
+            self.dut.close()
+        except Exception as exc:  # pylint: disable=W0703
+            logging.debug("Closing %s failed: %r", self.lease.port, exc)
+        self.dut = None
+        self.lease.release()
+        self.lease = None
+
+    def _fail(self, port, exc):
+        self.failed.add(port)
+        self.results.put(('board_failed', port, repr(exc)))
+
+    def run(self, func):
+        """Takes tasks until the queue is closed or no board is left."""
+        try:
+            while self.lease is not None or self._connect():
+                item = self.tasks.get()
+                if item is None:
+                    break
+                idx, task, attempts = item
+                start = time.monotonic()
+                res = {'result': RESULT_SUCCESS, 'data': None, 'msg': None,
+                       'board': self.lease.port, 'attempts': attempts + 1}
+                try:
+                    res['data'] = func(self.dut, task)
+                except self.board_errors as exc:
+                    logging.debug("Board %s failed: %r", self.lease.port,
+                                  exc)
+                    port = self.lease.port
+                    self._disconnect()
+                    self._fail(port, exc)
+                    self.results.put(('retry', idx, task, attempts + 1,
+                                      repr(exc)))
+                    continue
+                except Exception as exc:  # pylint: disable=W0703
+                    res['result'] = RESULT_ERROR
+                    res['msg'] = repr(exc)
+                res['elapsed'] = time.monotonic() - start
+                self.results.put(('done', idx, res))
+        finally:
+            if self.lease is not None:
+                self._disconnect()
+            self.results.put(('exit',))
+
+
+def _run_worker(scheduler, func, tasks, results, offset):
+    _Worker(scheduler, tasks, results, offset).run(func)
+
+
+class DutScheduler:
+    """Shards tasks across boards leased by worker processes.
+
+    The result of each task contains::
+        result - Success or Error if the function raised or the task failed
+            on max_attempts boards.
+        data - The return value of the function.
+        msg - The exception or None.
+        board - The port of the board that ran the task.
+        attempts - Number of boards that ran the task.
+        elapsed - Seconds the task needed.
+
+    Args:
+        ports(list): Serial ports of the equivalent boards, see
+            discover_ports.
+        device_kwargs(dict): Keyword arguments of each device, the port
+            must not be opened with exclusive=True, see PortLease.
+        device_cls: Class of the devices, called with the port, defaults to
+            DutShell.
+        processes(int): Number of worker processes, defaults to one per
+            board.
+        max_attempts(int): Boards a task is tried on before it fails.
+        board_errors(tuple): Exceptions of the function that mean the board
+            failed, the task is then retried on another board.
+        mp_context: The multiprocessing context, defaults to the default
+            start method.  The function and the devices arguments must be
+            picklable if it is not fork.
+    """
+    DEFAULT_MAX_ATTEMPTS = 3
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, ports, device_kwargs=None, device_cls=DutShell,
+                 processes=None, max_attempts=DEFAULT_MAX_ATTEMPTS,
+                 board_errors=(OSError,), mp_context=None):
+        if not ports:
+            raise ValueError("No ports to schedule on")
+        self.ports = list(ports)
+        self.device_kwargs = dict(device_kwargs or {})
+        self.device_cls = device_cls
+        self.processes = min(processes or len(self.ports), len(self.ports))
+        self.max_attempts = max_attempts
+        self.board_errors = tuple(board_errors)
+        self.mp_context = mp_context or multiprocessing.get_context()
+        self.failed_boards = {}
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state['mp_context']
+        return state
+
+    def run(self, func, tasks):
+        """Runs a function for each task on the boards.
+
+        Args:
+            func: Called with the device and the task in a worker process,
+                the return value is the data of the result.
+            tasks(iterable): The picklable tasks.
+
+        Returns:
+            list: The result of each task in the order of the tasks.
+        """
+        tasks = list(tasks)
+        results = [None] * len(tasks)
+        if not tasks:
+            return results
+        task_queue = self.mp_context.Queue()
+        result_queue = self.mp_context.Queue()
+        for idx, task in enumerate(tasks):
+            task_queue.put((idx, task, 0))
+        workers = [self.mp_context.Process(
+            target=_run_worker, name='riot_pal-scheduler-{}'.format(i),
+            args=(self, func, task_queue, result_queue, i), daemon=True)
+                   for i in range(self.processes)]
+        for worker in workers:
+            worker.start()
+        try:
+            self._collect(tasks, results, task_queue, result_queue, workers)
+        finally:
+            for _ in workers:
+                task_queue.put(None)
+            for worker in workers:
+                worker.join(self.POLL_INTERVAL)
+                if worker.is_alive():
+                    worker.terminate()
+                    worker.join()
+        return results
+
+    def _collect(self, tasks, results, task_queue, result_queue, workers):
+        pending = len(tasks)
+        running = len(workers)
+        while pending and running:
+            try:
+                msg = result_queue.get(timeout=self.POLL_INTERVAL)
+            except queue.Empty:
+                # Workers that died cannot report their exit
+                running = min(running, sum(w.is_alive() for w in workers))
+                continue
+            if msg[0] == 'done':
+                results[msg[1]] = msg[2]
+                pending -= 1
+            elif msg[0] == 'retry':
+                _, idx, task, attempts, exc = msg
+                if attempts < self.max_attempts:
+                    task_queue.put((idx, task, attempts))
+                else:
+                    results[idx] = self._failed_result(attempts, exc)
+                    pending -= 1
+            elif msg[0] == 'board_failed':
+                self.failed_boards[msg[1]] = msg[2]
+            else:
+                running -= 1
+        for idx, res in enumerate(results):
+            if res is None:
+                results[idx] = self._failed_result(0, 'No board available')
+
+    @staticmethod
+    def _failed_result(attempts, msg):
+        return {'result': RESULT_ERROR, 'data': None, 'msg': msg,
+                'board': None, 'attempts': attempts, 'elapsed': 0}
@@ -7,8 +7,15 @@
 This module handles generic connection and IO to the serial driver.
 """
 import logging
+import select
+import threading
 import time
+from collections import deque
 from serial import Serial, serial_for_url, SerialException
+try:
+    from .framing import FRAME_DELIMITER
+except ImportError:
+    from framing import FRAME_DELIMITER
 
 
 class SerialDriver:
@@ -17,6 +24,30 @@ class SerialDriver:
     defaults are changed.  Also if env variables are defined they get used as
     defaults.
 
+    The port can be reopened when reads time out or fail, this is selected
+    with the reconnect policy:
+        'timeout' reconnects after reconnect_after consecutive timeouts and
+        on serial exceptions, this is the default with reconnect_after=1.
+        'exception' reconnects on serial exceptions or if the health check
+        fails after a timeout.
+        'never' does not reconnect.
+    Failed reconnects are retried reconnect_retries times with an exponential
+    backoff starting at reconnect_backoff seconds.  A read with an overridden
+    timeout is bounded by the deadline of the caller, such as the deadline of
+    a command, its timeouts are counted but never cause a reconnect.  The
+    deadline is checked while waiting for data, the timeout of the port is
+    never changed, as each change reconfigures the tty.
+
+    With reader_thread=True a background thread drains the port into a ring
+    buffer of buffer_lines complete lines, readline then only dequeues.  The
+    input is not flushed on write, lines that arrived before the write are
+    passed to oob_callback instead of being discarded.  If the ring buffer
+    overflows the oldest lines are dropped and counted in dropped_lines.
+
+    Flushes of the input are counted in flushes and the discarded bytes in
+    flushed_bytes.  A parser with resync=True writes without flushing and
+    drops stale lines up to the echo of its command instead.
+
     Args:
         *args: Variable length argument list.
         **kwargs: Arbitrary keyword arguments.
@@ -25,8 +56,52 @@ class SerialDriver:
     DEFAULT_BAUDRATE = 115200
     DEFAULT_PORT = '/dev/ttyACM0'
     DEFAULT_CONNECT_WAIT = 0
+    RECONNECT_TIMEOUT = 'timeout'
+    RECONNECT_EXCEPTION = 'exception'
+    RECONNECT_NEVER = 'never'
+    DEFAULT_RECONNECT = RECONNECT_TIMEOUT
+    DEFAULT_RECONNECT_AFTER = 1
+    DEFAULT_RECONNECT_RETRIES = 3
+    DEFAULT_RECONNECT_BACKOFF = 0.1
+    MAX_RECONNECT_BACKOFF = 2
+    DEFAULT_BUFFER_LINES = 1024
+    # Seconds to wait for the reader thread when it is stopped
+    READER_JOIN_TIMEOUT = 1
+    READ_CHUNK = 4096
+    # Seconds between checks for data on ports that cannot be selected
+    POLL_INTERVAL = 0.001
+    metrics = None
 
     def __init__(self, *args, **kwargs):
+        self.reconnect_policy = kwargs.pop('reconnect', self.DEFAULT_RECONNECT)
+        if self.reconnect_policy not in (self.RECONNECT_TIMEOUT,
+                                         self.RECONNECT_EXCEPTION,
+                                         self.RECONNECT_NEVER):
+            raise ValueError("Unknown reconnect policy {}".format(
+                self.reconnect_policy))
+        self.reconnect_after = kwargs.pop('reconnect_after',
+                                          self.DEFAULT_RECONNECT_AFTER)
+        self.reconnect_retries = kwargs.pop('reconnect_retries',
+                                            self.DEFAULT_RECONNECT_RETRIES)
+        self.reconnect_backoff = kwargs.pop('reconnect_backoff',
+                                            self.DEFAULT_RECONNECT_BACKOFF)
+        self.reconnects = 0
+        self.timeouts = 0
+        self.consecutive_timeouts = 0
+        self.oob_callback = kwargs.pop('oob_callback', None)
+        self.dropped_lines = 0
+        self.flushes = 0
+        self.flushed_bytes = 0
+        self._rx_buf = bytearray()
+        self._rx_pos = 0
+        self._lines = None
+        self._lines_cond = threading.Condition()
+        self._reader = None
+        self._reader_error = None
+        self._reader_stop = threading.Event()
+        if kwargs.pop('reader_thread', False):
+            self._lines = deque(maxlen=kwargs.pop('buffer_lines',
+                                                  self.DEFAULT_BUFFER_LINES))
         self._connect(*args, **kwargs)
 
     def _connect(self, *args, **kwargs):
@@ -46,43 +121,322 @@ class SerialDriver:
         except SerialException:
             self._dev = serial_for_url(*args, **kwargs)
         time.sleep(int(connect_wait))
+        self._clear_rx_buf()
         kwargs['connect_wait'] = connect_wait
         self.args = args
         self.kwargs = kwargs
+        if self._lines is not None:
+            self._start_reader()
+
+    def _start_reader(self):
+        self._reader_stop.clear()
+        self._reader_error = None
+        self._reader = threading.Thread(target=self._reader_loop,
+                                        name='riot_pal-reader',
+                                        daemon=True)
+        self._reader.start()
+
+    def _stop_reader(self):
+        self._reader_stop.set()
+        cancel_read = getattr(self._dev, 'cancel_read', None)
+        if cancel_read is not None:
+            try:
+                cancel_read()
+            except (OSError, SerialException) as exc:
+                logging.debug(exc)
+        if self._reader is not threading.current_thread():
+            # A port without a read timeout may never return from a read
+            self._reader.join(self.READER_JOIN_TIMEOUT)
+            if self._reader.is_alive():
+                logging.debug("Reader thread did not stop")
+        self._reader = None
+
+    def _reader_loop(self):
+        dev = self._dev
+        partial = b''
+        while not self._reader_stop.is_set():
+            try:
+                data = dev.read(dev.in_waiting or 1)
+            except (ValueError, TypeError, OSError, SerialException) as exc:
+                if not self._reader_stop.is_set():
+                    logging.debug("Reader stopped: %r", exc)
+                    with self._lines_cond:
+                        self._reader_error = exc
+                        self._lines_cond.notify_all()
+                return
+            if not data:
+                continue
+            lines = (partial + data).split(b'\n')
+            partial = lines.pop()
+            if not lines:
+                continue
+            with self._lines_cond:
+                for line in lines:
+                    if len(self._lines) == self._lines.maxlen:
+                        self.dropped_lines += 1
+                    self._lines.append(line + b'\n')
+                self._lines_cond.notify_all()
+
+    def _clear_rx_buf(self):
+        del self._rx_buf[:]
+        self._rx_pos = 0
+
+    def _wait_readable(self, timeout):
+        """Waits up to timeout for data without changing the port timeout.
+
+        Returns:
+            bool: True if the port is readable, ports without a file
+            descriptor are polled and never report it.
+        """
+        try:
+            fd = self._dev.fileno()
+        except (AttributeError, OSError, ValueError):
+            time.sleep(min(timeout, self.POLL_INTERVAL))
+            return False
+        return bool(select.select([fd], [], [], timeout)[0])
+
+    def _buffered_readline(self, delimiter=b'\n', deadline=None):
+        """Reads a line through the receive buffer.
+
+        All bytes that are waiting are read at once and lines are split from
+        the buffer instead of reading byte by byte.  Like the pyserial
+        readline a partial line is returned on timeout or at the monotonic
+        deadline, which replaces the timeout of the port.
+        """
+        rx_buf = self._rx_buf
+        dev = self._dev
+        scan = self._rx_pos
+        port_deadline = None
+        while True:
+            idx = rx_buf.find(delimiter, scan)
+            if idx >= 0:
+                line = bytes(rx_buf[self._rx_pos:idx + 1])
+                self._rx_pos = idx + 1
+                return line
+            # Compact only when more data is needed, so a burst of lines is
+            # split without moving the buffer for each line
+            if self._rx_pos:
+                del rx_buf[:self._rx_pos]
+                self._rx_pos = 0
+            scan = len(rx_buf)
+            waiting = dev.in_waiting
+            if waiting:
+                rx_buf += dev.read(min(waiting, self.READ_CHUNK))
+                continue
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                if self._wait_readable(remaining):
+                    # Raises like the pyserial read if the port hung up
+                    rx_buf += dev.read(1)
+                continue
+            if port_deadline is None:
+                if dev.timeout is not None:
+                    port_deadline = time.monotonic() + dev.timeout
+            elif time.monotonic() >= port_deadline:
+                break
+            data = dev.read(1)
+            if not data:
+                break
+            rx_buf += data
+        line = bytes(rx_buf)
+        self._clear_rx_buf()
+        return line
+
+    def _dequeue_line(self, deadline=None):
+        if deadline is None:
+            timeout = self._dev.timeout
+        else:
+            timeout = max(deadline - time.monotonic(), 0)
+        with self._lines_cond:
+            self._lines_cond.wait_for(
+                lambda: self._lines or self._reader_error is not None,
+                timeout)
+            if self._lines:
+                return self._lines.popleft()
+            if self._reader_error is not None:
+                raise SerialException(self._reader_error)
+        return b''
+
+    def _dispatch_oob_lines(self):
+        """Passes queued lines to the oob_callback, returns the number of
+        bytes discarded if there is none."""
+        with self._lines_cond:
+            lines = list(self._lines)
+            self._lines.clear()
+        discarded = 0
+        for line in lines:
+            if self.oob_callback is None:
+                discarded += len(line)
+                logging.debug("Discarding: %s", line.decode(
+                    "utf-8", errors="ignore").replace('\n', ''))
+            else:
+                self.oob_callback(line.decode("utf-8", errors="ignore"))
+        return discarded
 
     def close(self):
         """Close serial connection."""
         logging.debug("Closing %s", self._dev.port)
+        if self._reader is not None:
+            self._stop_reader()
         self._dev.close()
 
-    def readline(self):
-        """Read and decode to utf-8 data.
+    def health_check(self):
+        """Checks if the port is still usable without reading from it.
 
         Returns:
-            str: string of data if success, empty string if failed.
+            bool: True if the port is open and responds.
         """
         try:
-            res_bytes = self._dev.readline()
-            response = res_bytes.decode("utf-8", errors="ignore")
+            return self._dev.is_open and self._dev.in_waiting >= 0
+        except (ValueError, TypeError, OSError, SerialException) as exc:
+            logging.debug("Health check failed: %r", exc)
+            return False
+
+    def reconnect(self):
+        """Closes and reopens the port.
+
+        Failed attempts are retried with an exponential backoff.
+
+        Raises:
+            SerialException: If the port cannot be reopened.
+        """
+        logging.debug("Reconnecting %s", self._dev.port)
+        self.reconnects += 1
+        if self.metrics is not None:
+            self.metrics.on_reconnect()
+        self.consecutive_timeouts = 0
+        backoff = self.reconnect_backoff
+        for attempt in range(self.reconnect_retries + 1):
+            try:
+                self.close()
+            except (OSError, SerialException) as exc:
+                logging.debug(exc)
+            try:
+                self._connect(*self.args, **self.kwargs)
+                return
+            except SerialException as exc:
+                if attempt == self.reconnect_retries:
+                    raise
+                logging.debug("Reconnect failed, retry in %ss: %r", backoff,
+                              exc)
+                time.sleep(backoff)
+                backoff = min(backoff * 2, self.MAX_RECONNECT_BACKOFF)
+
+    def _handle_timeout(self, port_ok=False):
+        self.timeouts += 1
+        if self.metrics is not None:
+            self.metrics.on_timeout()
+        if port_ok:
+            return
+        self.consecutive_timeouts += 1
+        if self.reconnect_policy == self.RECONNECT_TIMEOUT:
+            if self.consecutive_timeouts >= self.reconnect_after:
+                logging.debug("Reconnecting due to timeout")
+                self.reconnect()
+        elif self.reconnect_policy == self.RECONNECT_EXCEPTION:
+            if not self.health_check():
+                logging.debug("Reconnecting due to failed health check")
+                self.reconnect()
+
+    def readline_bytes(self, timeout=None):
+        """Read a line without decoding it.
+
+        Args:
+            timeout(float): Overrides the read timeout of the connection.
+
+        Returns:
+            bytes: line of data if success, empty bytes if failed.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if self._lines is None:
+            return self._checked_read(self._buffered_readline, deadline)
+        return self._checked_read(self._dequeue_line, deadline)
+
+    def read_frame(self, timeout=None):
+        """Read data up to and including the frame delimiter.
+
+        A partial frame is returned on timeout, see riot_pal.framing.
+
+        Args:
+            timeout(float): Overrides the read timeout of the connection.
+
+        Returns:
+            bytes: frame data if success, empty bytes if failed.
+        """
+        if self._lines is not None:
+            raise ValueError("Frames cannot be read with the reader thread")
+        deadline = None if timeout is None else time.monotonic() + timeout
+        return self._checked_read(self._buffered_readline, deadline,
+                                  FRAME_DELIMITER)
+
+    def _checked_read(self, read, deadline, *args):
+        try:
+            res_bytes = read(*args, deadline=deadline)
         except (ValueError, TypeError, SerialException) as exc:
-            response = ''
+            res_bytes = b''
             logging.debug(exc)
+            if self.reconnect_policy != self.RECONNECT_NEVER:
+                try:
+                    self.reconnect()
+                except SerialException as reconnect_exc:
+                    logging.debug(reconnect_exc)
         else:
-            if response == '':
-                logging.debug("Reconnecting due to timeout")
-                self.close()
-                self._connect(*self.args, **self.kwargs)
+            if not res_bytes:
+                # The port did not fail if the caller ran out of time or the
+                # reader thread, which raises port errors, has no line yet
+                self._handle_timeout(deadline is not None or
+                                     self._lines is not None)
                 raise TimeoutError
-        logging.debug("Response: %s", response.replace('\n', ''))
+            self.consecutive_timeouts = 0
+            if self.metrics is not None:
+                self.metrics.on_line(len(res_bytes))
+        return res_bytes
+
+    def readline(self, timeout=None):
+        """Read and decode to utf-8 data.
+
+        Args:
+            timeout(float): Overrides the read timeout of the connection.
+
+        Returns:
+            str: string of data if success, empty string if failed.
+        """
+        response = self.readline_bytes(timeout).decode("utf-8",
+                                                       errors="ignore")
+        if logging.root.isEnabledFor(logging.DEBUG):
+            logging.debug("Response: %s", response.replace('\n', ''))
         return response
 
-    def write(self, data):
+    def write(self, data, flush_input=True):
         """Writes data to a driver.  It will encode to utf-8 and add a newline
 
         Args:
             data(str): string or list of bytes to send to the driver.
+            flush_input(bool): Clears the input buffer before writing, must be
+                False if responses to previous writes are still pending.
         """
         # Clear the input buffer in case it junk data go in creating an offset
-        self._dev.reset_input_buffer()
-        logging.debug("Sending: " + data)
-        self._dev.write((data + '\n').encode('utf-8'))
+        if flush_input:
+            if self._lines is None:
+                discarded = len(self._rx_buf) - self._rx_pos + \
+                    self._dev.in_waiting
+                self._dev.reset_input_buffer()
+                self._clear_rx_buf()
+            else:
+                discarded = self._dispatch_oob_lines()
+            self.flushes += 1
+            self.flushed_bytes += discarded
+            if discarded:
+                logging.debug("Flushed %d bytes", discarded)
+            if self.metrics is not None:
+                self.metrics.on_flush(discarded)
+        logging.debug("Sending: %s", data)
+        data = (data + '\n').encode('utf-8')
+        if self.metrics is None:
+            self._dev.write(data)
+        else:
+            start = time.perf_counter()
+            self._dev.write(data)
+            self.metrics.on_write(len(data), time.perf_counter() - start)
@@ -0,0 +1,307 @@
+# Copyright (c) 2019 Kevin Weiss, for HAW Hamburg  <kevin.weiss@haw-hamburg.de>
+#
+# This file is subject to the terms and conditions of the MIT License. See the
+# file LICENSE in the top level directory for more details.
+# SPDX-License-Identifier:    MIT
+"""Session Record and Replay for RIOT PAL
+This module records the writes and reads of a driver into a compact file and
+serves them back without hardware, so parsers and test logic can run at
+memory speed and deterministically.
+
+A session file starts with MAGIC followed by records of::
+
+    [kind (uint8)][delay in us since the previous record (uint32)]
+    [payload length (uint32)][payload]
+
+all little endian.  Text payloads are UTF-8.
+
+Example:
+    dut = DutShell('/dev/ttyACM0', record='session.rec')
+    dut.send_cmd('help')
+    dut.close()
+
+    dut = DutShell(driver_type='replay', path='session.rec')
+    dut.send_cmd('help')
+"""
+import struct
+import time
+try:
+    from .driver_registry import call_read
+except ImportError:
+    from driver_registry import call_read
+
+MAGIC = b'RPALREC1'
+RECORD = struct.Struct('<BII')
+MAX_DELAY_US = 0xFFFFFFFF
+
+KIND_WRITE = 1
+KIND_WRITE_NO_FLUSH = 2
+KIND_READ_STR = 3
+KIND_READ_BYTES = 4
+KIND_READ_FRAME = 5
+KIND_TIMEOUT = 6
+KIND_NAMES = {KIND_WRITE: 'write', KIND_WRITE_NO_FLUSH: 'write_no_flush',
+              KIND_READ_STR: 'read', KIND_READ_BYTES: 'read_bytes',
+              KIND_READ_FRAME: 'read_frame', KIND_TIMEOUT: 'timeout'}
+_WRITES = (KIND_WRITE, KIND_WRITE_NO_FLUSH)
+
+
+def pack_record(kind, delay, payload):
+    """Returns a packed record.
+
+    Args:
+        kind(int): One of the KIND constants.
+        delay(float): Seconds since the previous record.
+        payload(bytes, str): The data, str is encoded as UTF-8.
+    """
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    delay_us = min(int(delay * 1e6), MAX_DELAY_US)
+    return RECORD.pack(kind, delay_us, len(payload)) + payload
+
+
+def iter_records(data):
+    """Yields the kind, delay in seconds and payload of each record.
+
+    Args:
+        data(bytes): Records without the MAGIC.
+
+    Raises:
+        ValueError: If a record is truncated.
+    """
+    view = memoryview(data)
+    idx = 0
+    while idx < len(view):
+        if idx + RECORD.size > len(view):
+            raise ValueError("Truncated record header at {}".format(idx))
+        kind, delay_us, size = RECORD.unpack_from(view, idx)
+        idx += RECORD.size
+        if idx + size > len(view):
+            raise ValueError("Truncated record payload at {}".format(idx))
+        yield kind, delay_us / 1e6, bytes(view[idx:idx + size])
+        idx += size
+
+
+def load_session(path):
+    """Returns the records of a session file as a list.
+
+    I/O traces are loaded as well, see riot_pal.io_trace.
+
+    Raises:
+        ValueError: If the file is not a session.
+    """
+    with open(path, 'rb') as session_file:
+        data = session_file.read()
+    if not data.startswith(MAGIC):
+        try:
+            from .io_trace import TRACE_MAGIC, read_trace
+        except ImportError:
+            from io_trace import TRACE_MAGIC, read_trace
+        if data.startswith(TRACE_MAGIC):
+            return read_trace(path)[1]
+        raise ValueError("{} is not a session file".format(path))
+    return list(iter_records(data[len(MAGIC):]))
+
+
+class SessionWriter:
+    """Writes records to a session file.
+
+    Args:
+        path(str): The session file, it is overwritten.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'wb')
+        self._file.write(MAGIC)
+        self._last = time.monotonic()
+
+    def record(self, kind, payload):
+        """Appends a record timed now."""
+        now = time.monotonic()
+        self._file.write(pack_record(kind, now - self._last, payload))
+        self._last = now
+
+    def close(self):
+        """Closes the session file."""
+        if not self._file.closed:
+            self._file.close()
+
+
+class RecordingDriver:
+    """Records the IO of a driver into a session file.
+
+    All other attributes are passed through to the driver.
+
+    Args:
+        driver: The driver to record.
+        path(str): The session file, it is overwritten.  Can also be a writer
+            with record(kind, payload), such as an IOTracer, that is not
+            closed with the driver.
+    """
+
+    def __init__(self, driver, path):
+        self.driver = driver
+        self.path = path
+        if isinstance(path, str):
+            self._writer = SessionWriter(path)
+            self._owns_writer = True
+        else:
+            self._writer = path
+            self._owns_writer = False
+        self._record = self._writer.record
+
+    def __getattr__(self, name):
+        if name == 'driver':
+            raise AttributeError(name)
+        return getattr(self.driver, name)
+
+    @property
+    def metrics(self):
+        """Metrics of the recorded driver."""
+        return getattr(self.driver, 'metrics', None)
+
+    @metrics.setter
+    def metrics(self, metrics):
+        self.driver.metrics = metrics
+
+    def _read(self, kind, read, timeout):
+        try:
+            data = call_read(read, timeout)
+        except TimeoutError:
+            self._record(KIND_TIMEOUT, b'')
+            raise
+        if kind == KIND_READ_BYTES and isinstance(data, str):
+            kind = KIND_READ_STR
+        self._record(kind, data)
+        return data
+
+    def readline(self, timeout=None):
+        """Reads and records a line."""
+        return self._read(KIND_READ_STR, self.driver.readline, timeout)
+
+    def readline_bytes(self, timeout=None):
+        """Reads and records an undecoded line if the driver supports it."""
+        readline = getattr(self.driver, 'readline_bytes', self.driver.readline)
+        return self._read(KIND_READ_BYTES, readline, timeout)
+
+    def read_frame(self, timeout=None):
+        """Reads and records a binary frame."""
+        return self._read(KIND_READ_FRAME, self.driver.read_frame, timeout)
+
+    def write(self, data, flush_input=True):
+        """Records and writes data."""
+        if flush_input:
+            self._record(KIND_WRITE, data)
+            return self.driver.write(data)
+        self._record(KIND_WRITE_NO_FLUSH, data)
+        return self.driver.write(data, flush_input=False)
+
+    def close_record(self):
+        """Closes the session file, the driver stays open."""
+        if self._owns_writer:
+            self._writer.close()
+
+    def close(self):
+        """Closes the session file and the driver."""
+        self.close_record()
+        self.driver.close()
+
+
+class ReplayDriver:
+    """Serves a recorded session back without hardware.
+
+    Writes consume the next recorded write and reads return the next
+    recorded read, a recorded timeout raises a TimeoutError.  Reads with no
+    recorded data left or that would skip a write time out.
+
+    Args:
+        path(str): The session file.
+        realtime(bool): Waits the recorded delays, otherwise replays as fast
+            as possible.
+        strict(bool): Raises a ValueError if a write differs from the
+            recording.
+        timeout: Ignored, accepted for the configuration of other drivers.
+    """
+
+    def __init__(self, path, realtime=False, strict=False, timeout=None,
+                 **kwargs):
+        timeout = timeout
+        kwargs = kwargs
+        self.path = path
+        self.realtime = realtime
+        self.strict = strict
+        self._records = load_session(path)
+        self._idx = 0
+        self._last = time.monotonic()
+        self.mismatches = 0
+
+    @property
+    def remaining(self):
+        """Number of records not replayed yet."""
+        return len(self._records) - self._idx
+
+    def rewind(self):
+        """Replays the session again from the start."""
+        self._idx = 0
+        self._last = time.monotonic()
+        self.mismatches = 0
+
+    def _next(self, writing):
+        if self._idx >= len(self._records):
+            return None
+        record = self._records[self._idx]
+        if (record[0] in _WRITES) != writing:
+            return None
+        self._idx += 1
+        if self.realtime:
+            delay = self._last + record[1] - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self._last = time.monotonic()
+        return record
+
+    def _read(self):
+        record = self._next(writing=False)
+        if record is None or record[0] == KIND_TIMEOUT:
+            raise TimeoutError
+        return record
+
+    def readline(self, timeout=None):
+        """Returns the next recorded line as str."""
+        timeout = timeout
+        return self._read()[2].decode('utf-8', errors='ignore')
+
+    def readline_bytes(self, timeout=None):
+        """Returns the next recorded line as bytes if it was read as bytes."""
+        timeout = timeout
+        kind, _, payload = self._read()
+        if kind == KIND_READ_STR:
+            return payload.decode('utf-8', errors='ignore')
+        return payload
+
+    def read_frame(self, timeout=None):
+        """Returns the next recorded frame."""
+        timeout = timeout
+        return self._read()[2]
+
+    def write(self, data, flush_input=True):
+        """Consumes the next recorded write."""
+        flush_input = flush_input
+        # Reads the recording did not consume are skipped
+        while self._idx < len(self._records) and \
+                self._records[self._idx][0] not in _WRITES:
+            self._idx += 1
+        record = self._next(writing=True)
+        if record is None or record[2] != data.encode('utf-8'):
+            self.mismatches += 1
+            if self.strict:
+                raise ValueError("Write {!r} does not match the recording "
+                                 "{!r}".format(data, record and record[2]))
+
+    def health_check(self):
+        """The replay is always healthy."""
+        return True
+
+    def close(self):
+        """Nothing to close."""
@@ -37,7 +37,10 @@ setup(
     setup_requires=["pytest-runner"],
     tests_require=["pytest", "pytest-regtest", "pprint"],
     install_requires=['pyserial', "pexpect"],
+    extras_require={'orjson': ['orjson']},
     entry_points={
-        'console_scripts': ['dut_pyshell=riot_pal.dut_pyshell:main'],
+        'console_scripts': ['dut_pyshell=riot_pal.dut_pyshell:main',
+                            'dut_emulator=riot_pal.dut_emulator:main',
+                            'riot_pal_trace=riot_pal.io_trace:main'],
     }
 )
@@ -4,6 +4,7 @@
 # file LICENSE in the top level directory for more details.
 # SPDX-License-Identifier:    MIT
 """Helper functions for running tests on RIOT PAL."""
+from collections import deque
 
 
 def _try_parse_int(val):
@@ -44,3 +45,43 @@ def try_add(val):
             return val
         except TypeError:
             return val
+
+
+class FakeShellDriver:
+    """Answers every written command with a RIOT shell style response."""
+
+    def __init__(self, json_format=False):
+        self.json_format = json_format
+        self.lines = deque()
+        self.pending = 0
+        self.max_pending = 0
+        self.flushes = 0
+
+    def write(self, data, flush_input=True):
+        """Queues the response of the command."""
+        if flush_input:
+            self.flushes += 1
+            self.lines.clear()
+        self.pending += 1
+        self.max_pending = max(self.max_pending, self.pending)
+        if data == 'silent':
+            return
+        if self.json_format:
+            self.lines.append('noise line\n')
+            self.lines.append('{"data": [%d], "result": "Success"}\n'
+                              % len(data))
+        else:
+            self.lines.append('Command: {}\n'.format(data))
+            self.lines.append('Success: [{}, 0x10]\n'.format(len(data)))
+
+    def readline(self):
+        """Returns the next response line."""
+        if not self.lines:
+            raise TimeoutError
+        line = self.lines.popleft()
+        if 'Success' in line:
+            self.pending -= 1
+        return line
+
+    def close(self):
+        """Nothing to close."""
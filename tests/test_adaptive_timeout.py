@@ -0,0 +1,104 @@
+# Copyright (c) 2019 Kevin Weiss, for HAW Hamburg  <kevin.weiss@haw-hamburg.de>
+#
+# This file is subject to the terms and conditions of the MIT License. See the
+# file LICENSE in the top level directory for more details.
+# SPDX-License-Identifier:    MIT
+"""Tests command deadlines and adaptive timeouts of RIOT PAL."""
+import time
+import pytest
+from riot_pal.adaptive_timeout import AdaptiveTimeout
+from riot_pal.dut_emulator import DutEmulator
+from riot_pal.dut_shell import DutShell, RESULT_SUCCESS, RESULT_TIMEOUT
+from helpers import FakeShellDriver
+
+
+@pytest.fixture
+def emulator():
+    """Returns a DUT emulator serving a pty."""
+    emulator = DutEmulator()
+    yield emulator
+    emulator.stop()
+
+
+def test_cmd_timeout(emulator):
+    """Test the deadline holds even if lines keep arriving."""
+    dut = DutShell(emulator.start_pty(), timeout=1, cmd_timeout=0.1,
+                   reconnect='never')
+    try:
+        emulator.latency = 0.2
+        start = time.monotonic()
+        assert dut.send_cmd('help', timeout=0.5)['result'] == RESULT_SUCCESS
+        assert time.monotonic() - start >= 0.2
+        emulator.latency = 0
+        start = time.monotonic()
+        res = dut.send_cmd('stream 100000')
+        assert res['result'] == RESULT_TIMEOUT
+        assert time.monotonic() - start < 0.5
+    finally:
+        dut.close()
+
+
+def test_stream_deadline(emulator):
+    """Test streamed responses have the deadline of the command."""
+    adaptive = AdaptiveTimeout(min_samples=3, min_timeout=0.01)
+    dut = DutShell(emulator.start_pty(), timeout=1, cmd_timeout=0.1,
+                   reconnect='never', adaptive_timeout=adaptive)
+    try:
+        emulator.latency = 0.3
+        start = time.monotonic()
+        with dut.stream_cmd('stream 3') as records:
+            assert list(records)[-1]['result'] == RESULT_TIMEOUT
+        assert time.monotonic() - start < 0.3
+        time.sleep(0.3)
+        records = list(dut.stream_cmd('stream 3', timeout=1))
+        assert records[-1]['result'] == RESULT_SUCCESS
+        assert len(records) == 4
+        assert adaptive.stats()['stream']['samples'] == 2
+    finally:
+        dut.close()
+
+
+def test_adaptive_timeout(emulator):
+    """Test timeouts are derived per command name."""
+    adaptive = AdaptiveTimeout(min_samples=3, min_timeout=0.01)
+    dut = DutShell(emulator.start_pty(), timeout=1, reconnect='never',
+                   adaptive_timeout=adaptive)
+    try:
+        emulator.latency = 0.05
+        for _ in range(3):
+            assert dut.send_cmd('help')['result'] == RESULT_SUCCESS
+        assert 0.1 <= adaptive.timeout('help') < 0.5
+        assert adaptive.timeout('echo') is None
+        emulator.latency = 0.4
+        start = time.monotonic()
+        assert dut.send_cmd('help')['result'] == RESULT_TIMEOUT
+        assert time.monotonic() - start < 0.4
+        assert adaptive.stats()['help']['samples'] == 4
+    finally:
+        dut.close()
+
+
+def test_deadline_keeps_connection(emulator):
+    """Test an expired deadline does not reconnect the driver."""
+    dut = DutShell(emulator.start_pty(), timeout=1, cmd_timeout=0.1)
+    try:
+        emulator.latency = 0.2
+        assert dut.send_cmd('help')['result'] == RESULT_TIMEOUT
+        # pylint: disable=W0212
+        driver = dut.dev._unwrapped_driver()
+        assert driver.timeouts == 1
+        assert driver.reconnects == 0
+        # The late response is flushed by the next command
+        time.sleep(0.2)
+        emulator.latency = 0
+        assert dut.send_cmd('echo a', timeout=1)['data'] == ['a']
+    finally:
+        dut.close()
+
+
+def test_deadline_without_driver_timeout():
+    """Test drivers that cannot take a read timeout still have deadlines."""
+    dut = DutShell(driver_type='driver', driver=FakeShellDriver(),
+                   cmd_timeout=0.5)
+    assert dut.send_cmd('cmd')['data'] == [3, 0x10]
+    assert dut.send_cmd('silent')['result'] == RESULT_TIMEOUT
@@ -0,0 +1,84 @@
+# Copyright (c) 2019 Kevin Weiss, for HAW Hamburg  <kevin.weiss@haw-hamburg.de>
+#
+# This file is subject to the terms and conditions of the MIT License. See the
+# file LICENSE in the top level directory for more details.
+# SPDX-License-Identifier:    MIT
+"""Tests the asyncio DUT shell in RIOT PAL on loopback ports."""
+import asyncio
+import time
+from riot_pal.async_dut_shell import AsyncDutShell
+from riot_pal.dut_shell import RESULT_SUCCESS, RESULT_TIMEOUT
+
+
+def _run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def test_send_cmd_loopback():
+    """The loopback echo is parsed as the response of the command."""
+    async def _send(dut):
+        return await dut.send_cmd('Success: [1, 0x2]')
+    dut = AsyncDutShell('loop://')
+    res = _run(_send(dut))
+    dut.close()
+    assert res['result'] == RESULT_SUCCESS
+    assert res['data'] == [1, 2]
+
+
+def test_send_cmd_concurrent_timeouts():
+    """Timeouts of many boards run concurrently, not one after the other."""
+    async def _send_all(duts):
+        return await asyncio.gather(*(dut.send_cmd('no_answer', timeout=0.3)
+                                      for dut in duts))
+    duts = [AsyncDutShell('loop://') for _ in range(5)]
+    start = time.monotonic()
+    results = _run(_send_all(duts))
+    assert time.monotonic() - start < 1
+    for dut in duts:
+        dut.close()
+    assert [res['result'] for res in results] == [RESULT_TIMEOUT] * 5
+
+
+def test_send_cmd_json_timeout():
+    """A partial object is flushed from the decoder on timeout."""
+    async def _send(dut):
+        return (await dut.send_cmd('{"cmd": "a", "data": [1,', timeout=0.3),
+                await dut.send_cmd('{"cmd": "b", "result": "Success"}'))
+    dut = AsyncDutShell('loop://', parser='json')
+    res, next_res = _run(_send(dut))
+    dut.close()
+    assert res['result'] == RESULT_TIMEOUT
+    assert res['msg'] == ['{"cmd": "a", "data": [1,\n']
+    assert next_res == {'cmd': 'b', 'result': RESULT_SUCCESS}
+
+
+def test_send_cmd_slow_write():
+    """A blocking write of one board does not stall the other boards."""
+    async def _send_all(slow, fast):
+        done = {}
+
+        async def _send(name, dut):
+            res = await dut.send_cmd('Success: [1]', timeout=1)
+            done[name] = time.monotonic() - start
+            return res
+        start = time.monotonic()
+        results = await asyncio.gather(_send('slow', slow),
+                                       _send('fast', fast))
+        return results, done
+    slow, fast = AsyncDutShell('loop://'), AsyncDutShell('loop://')
+    # pylint: disable=W0212
+    write = slow._driver.driver.write
+
+    def _slow_write(*args, **kwargs):
+        time.sleep(0.3)
+        write(*args, **kwargs)
+    slow._driver.driver.write = _slow_write
+    results, done = _run(_send_all(slow, fast))
+    slow.close()
+    fast.close()
+    assert [res['result'] for res in results] == [RESULT_SUCCESS] * 2
+    assert done['fast'] < 0.2 <= done['slow']
@@ -0,0 +1,79 @@
+# Copyright (c) 2019 Kevin Weiss, for HAW Hamburg  <kevin.weiss@haw-hamburg.de>
+#
+# This file is subject to the terms and conditions of the MIT License. See the
+# file LICENSE in the top level directory for more details.
+# SPDX-License-Identifier:    MIT
+"""Tests sharing a driver between threads in RIOT PAL."""
+import threading
+import time
+from riot_pal.dut_shell import DutShell, RESULT_SUCCESS
+from riot_pal.driver_mux import DriverMux
+from helpers import FakeShellDriver
+
+
+class SlowShellDriver(FakeShellDriver):
+    """Yields the thread on every read so commands would interleave."""
+
+    def readline(self):
+        time.sleep(0.0005)
+        return super().readline()
+
+
+def test_threads_do_not_interleave():
+    """Each thread gets the responses of its own commands."""
+    driver = SlowShellDriver()
+    dut = DutShell(driver_type='driver', driver=driver)
+    clones = [DutShell.copy_driver(dut) for _ in range(3)] + [dut]
+    errors = []
+
+    def _run(clone, name):
+        for i in range(20):
+            cmd = '{}_{}'.format(name, 'x' * i)
+            res = clone.send_cmd(cmd)
+            if res['cmd'] != cmd or res['data'][0] != len(cmd):
+                errors.append(res)
+        res = clone.send_cmds(['a', 'bb'])
+        if [r['result'] for r in res] != [RESULT_SUCCESS] * 2:
+            errors.append(res)
+
+    threads = [threading.Thread(target=_run, args=(clone, str(i)))
+               for i, clone in enumerate(clones)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    mux = dut.dev._driver
+    metrics = mux.metrics()
+    assert metrics['transactions'] == 4 * 21
+    assert len(metrics['consumers']) == 4
+    assert metrics['queue_depth'] == 0
+    assert metrics['owner'] is None
+    for clone in clones[:-1]:
+        clone.close()
+    assert list(mux.metrics()['consumers']) == [dut.dev._consumer.tag]
+    dut.close()
+
+
+def test_priority_order():
+    """Waiting transactions are served by priority then arrival."""
+    mux = DriverMux(FakeShellDriver())
+    owner = mux.attach()
+    order = []
+
+    def _wait(priority, name):
+        with mux.attach(priority).transaction():
+            order.append(name)
+
+    with owner.transaction():
+        threads = []
+        for priority, name in ((5, 'low'), (1, 'high'), (5, 'low2')):
+            threads.append(threading.Thread(target=_wait,
+                                            args=(priority, name)))
+            threads[-1].start()
+            while mux.queue_depth < len(threads):
+                time.sleep(0.001)
+    for thread in threads:
+        thread.join()
+    assert order == ['high', 'low', 'low2']
+    assert mux.metrics()['max_queue_depth'] == 3
@@ -0,0 +1,56 @@
+# Copyright (c) 2019 Kevin Weiss, for HAW Hamburg  <kevin.weiss@haw-hamburg.de>
+#
+# This file is subject to the terms and conditions of the MIT License. See the
+# file LICENSE in the top level directory for more details.
+# SPDX-License-Identifier:    MIT
+"""Tests reusing drivers through the driver pool in RIOT PAL."""
+from riot_pal.dut_shell import DutShell
+from riot_pal.driver_pool import DriverPool
+
+
+def test_pool_reuses_driver():
+    """Closed devices return the driver to the pool for the next device."""
+    pool = DriverPool()
+    dut = DutShell('loop://', timeout=0.1, pool=pool)
+    driver = dut.dev._driver
+    dut.close()
+    assert driver.health_check()
+    dut = DutShell('loop://', timeout=0.1, pool=pool)
+    assert dut.dev._driver is driver
+    other = DutShell('loop://', timeout=0.2, pool=pool)
+    assert other.dev._driver is not driver
+    other.close()
+    dut.close()
+    assert pool.stats() == {'created': 2, 'reused': 1, 'evicted': 0,
+                            'leased': 0, 'idle': 2}
+    pool.close_all()
+    assert not driver.health_check()
+
+
+def test_pool_health_and_eviction():
+    """Unhealthy drivers are replaced and idle drivers evicted."""
+    pool = DriverPool()
+    dut = DutShell('loop://', pool=pool)
+    driver = dut.dev._driver
+    dut.close()
+    driver.close()
+    dut = DutShell('loop://', pool=pool)
+    assert dut.dev._driver is not driver
+    driver = dut.dev._driver
+    dut.close()
+    pool.max_idle = 0
+    pool.evict_idle()
+    assert not driver.health_check()
+    assert pool.stats()['evicted'] == 1
+
+
+def test_pool_shared_driver():
+    """A shared pooled driver is released when the last device closes."""
+    pool = DriverPool()
+    dut = DutShell('loop://', pool=pool)
+    clone = DutShell.copy_driver(dut)
+    dut.close()
+    assert pool.stats()['leased'] == 1
+    clone.close()
+    assert pool.stats()['idle'] == 1
+    pool.close_all()
@@ -0,0 +1,40 @@
+# Copyright (c) 2019 Kevin Weiss, for HAW Hamburg  <kevin.weiss@haw-hamburg.de>
+#
+# This file is subject to the terms and conditions of the MIT License. See the
+# file LICENSE in the top level directory for more details.
+# SPDX-License-Identifier:    MIT
+"""Tests lazy loading of drivers in RIOT PAL."""
+import subprocess
+import sys
+import pytest
+from riot_pal import driver_registry
+from riot_pal.dut_shell import DutShell, RESULT_SUCCESS
+from riot_pal.driver_registry import register_driver, get_driver, \
+    available_drivers
+
+
+def test_import_is_lazy():
+    """Test importing riot_pal does not load the driver dependencies."""
+    output = subprocess.check_output(
+        [sys.executable, '-c', 'import sys, riot_pal, riot_pal.dut_pyshell; '
+         'print(sorted({"serial", "pexpect"} & set(sys.modules)))'],
+        universal_newlines=True)
+    assert output.strip() == '[]'
+
+
+def test_register_driver(monkeypatch):
+    """Test drivers registered by class and by import path."""
+    # pylint: disable=W0212
+    monkeypatch.setattr(driver_registry, '_DRIVERS',
+                        dict(driver_registry._DRIVERS))
+    monkeypatch.setattr(driver_registry, '_LOADED',
+                        dict(driver_registry._LOADED))
+    register_driver('fake', 'helpers:FakeShellDriver')
+    assert 'fake' in available_drivers()
+    dut = DutShell(driver_type='fake')
+    assert dut.send_cmd('help')['result'] == RESULT_SUCCESS
+    register_driver('fake', get_driver('fake'))
+    assert DutShell(driver_type='fake', json_format=True,
+                    parser='json').send_cmd('x')['data'] == [1]
+    with pytest.raises(NotImplementedError):
+        DutShell(driver_type='unknown')
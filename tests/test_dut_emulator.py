@@ -0,0 +1,179 @@
+# Copyright (c) 2019 Kevin Weiss, for HAW Hamburg  <kevin.weiss@haw-hamburg.de>
+#
+# This file is subject to the terms and conditions of the MIT License. See the
+# file LICENSE in the top level directory for more details.
+# SPDX-License-Identifier:    MIT
+"""Tests the DUT shell against the DUT emulator in RIOT PAL."""
+import time
+import pytest
+from riot_pal.dut_emulator import DutEmulator
+from riot_pal.dut_shell import DutShell, RESULT_SUCCESS, RESULT_ERROR, \
+    RESULT_TIMEOUT, FramedParser
+from riot_pal.metrics import CommandMetrics
+
+
+@pytest.fixture(params=['shell', 'json'])
+def emulated_dut(request):
+    """Returns a DutShell connected to an emulator over a pty."""
+    emulator = DutEmulator(request.param, noise=0.5, seed=0)
+    dut = DutShell(emulator.start_pty(), parser=request.param, timeout=0.5)
+    yield dut
+    dut.close()
+    emulator.stop()
+
+
+def test_emulated_cmds(emulated_dut):
+    """Test responses with noise lines through the parsers."""
+    res = emulated_dut.send_cmd('read_reg 0x10 3')
+    assert res['result'] == RESULT_SUCCESS
+    assert res['data'] == [0x10, 0x11, 0x12]
+    assert emulated_dut.send_cmd('error')['result'] == RESULT_ERROR
+    results = emulated_dut.send_cmds(['echo a'] * 10 + ['unknown'])
+    assert [res['data'] for res in results[:-1]] == [['a']] * 10
+    assert results[-1]['result'] == RESULT_ERROR
+
+
+def test_emulated_latency():
+    """Test the response latency of the emulator."""
+    emulator = DutEmulator(latency=0.05)
+    dut = DutShell(emulator.start_pty(), timeout=0.5)
+    start = time.monotonic()
+    assert dut.send_cmd('help')['data'] == ['dump', 'echo', 'error',
+                                            'framing', 'help', 'read_reg',
+                                            'stream']
+    assert time.monotonic() - start >= 0.05
+    dut.close()
+    emulator.stop()
+
+
+def test_emulated_stream(emulated_dut):
+    """Test records are streamed before the result."""
+    records = list(emulated_dut.stream_cmd('stream 50'))
+    assert records[-1]['result'] == RESULT_SUCCESS
+    assert records[-1]['data'] == [50]
+    samples = [rec for rec in records[:-1] if 'msg' not in rec or
+               rec['msg'].startswith('Sample')]
+    assert len(samples) == 50
+    assert 'result' not in records[0]
+    # An abandoned stream does not affect the next command
+    stream = emulated_dut.stream_cmd('stream 50')
+    next(stream)
+    stream.close()
+    assert emulated_dut.send_cmd('echo a')['data'] == ['a']
+    with emulated_dut.stream_cmd('stream 50') as stream:
+        next(stream)
+    assert emulated_dut.send_cmd('echo b')['data'] == ['b']
+
+
+def test_emulated_msg_limit():
+    """Test message lines beyond the limit are spilled."""
+    emulator = DutEmulator('json')
+    emulator.commands['log'] = lambda args: (True, args, ['log'] * 5)
+    spilled = []
+    dut = DutShell(emulator.start_pty(), parser='json', timeout=0.5,
+                   parser_args={'msg_limit': 2, 'msg_spill': spilled.append})
+    try:
+        res = dut.send_cmd('log a')
+    finally:
+        dut.close()
+        emulator.stop()
+    assert res['data'] == ['a']
+    assert res['msg'] == ['log\n'] * 2
+    assert res['msg_overflow'] == 3
+    assert spilled == ['log\n'] * 3
+
+
+@pytest.mark.parametrize('protocol', ['shell', 'json'])
+def test_emulated_resync(protocol):
+    """Test the late response of a timed out command is dropped."""
+    records = []
+    emulator = DutEmulator(protocol, latency=0.2)
+    dut = DutShell(emulator.start_pty(), parser=protocol, timeout=0.1,
+                   reconnect='never', resync=True,
+                   metrics=CommandMetrics(hooks=[records.append]))
+    try:
+        assert dut.send_cmd('echo a')['result'] == RESULT_TIMEOUT
+        res = dut.send_cmd('echo b', timeout=1)
+    finally:
+        dut.close()
+        emulator.stop()
+    assert res['data'] == ['b']
+    assert dut.parser.dropped_lines >= 1
+    assert records[-1]['dropped_bytes'] == dut.parser.dropped_bytes
+    assert records[-1]['flushes'] == 0
+    with pytest.raises(ValueError):
+        FramedParser(None, resync=True)
+
+
+@pytest.mark.parametrize('protocol', ['shell', 'json'])
+def test_emulated_pipeline_timeout(protocol):
+    """Test a timed out pipelined command does not shift later results."""
+    def _slow(args):
+        time.sleep(0.3)
+        return True, args
+
+    emulator = DutEmulator(protocol)
+    emulator.commands['slow'] = _slow
+    dut = DutShell(emulator.start_pty(), parser=protocol, timeout=0.2,
+                   reconnect='never', resync=True)
+    try:
+        results = dut.send_cmds(['echo a', 'slow', 'echo b', 'echo c'])
+    finally:
+        dut.close()
+        emulator.stop()
+    assert results[1]['result'] == RESULT_TIMEOUT
+    assert [res['data'] for res in results[::2]] == [['a'], ['b']]
+    assert results[3]['data'] == ['c']
+
+
+@pytest.mark.parametrize('protocol', ['shell', 'json'])
+def test_emulated_resync_repeated(protocol):
+    """Test the late response of a repeated command needs a sequence tag."""
+    def _count(args):
+        counts.append(args)
+        if len(counts) % 3 == 1:
+            time.sleep(0.3)
+        return True, [len(counts)]
+
+    for seq_tag, expected in ((None, [[1], [2]]), (' #{seq}', [[2], [3]])):
+        counts = []
+        emulator = DutEmulator(protocol)
+        emulator.commands['count'] = _count
+        dut = DutShell(emulator.start_pty(), parser=protocol, timeout=0.2,
+                       reconnect='never', resync=True, seq_tag=seq_tag)
+        try:
+            assert dut.send_cmd('count')['result'] == RESULT_TIMEOUT
+            results = [dut.send_cmd('count', timeout=1) for _ in range(2)]
+        finally:
+            dut.close()
+            emulator.stop()
+        # Without a tag the echo of the late response matches as well
+        assert [res['data'] for res in results] == expected
+        assert {res['cmd'] for res in results} == {'count'}
+    assert counts == [['#1'], ['#2'], ['#3']]
+
+
+def test_emulated_seq_tag_copies():
+    """Test shells sharing a driver do not repeat sequence tags."""
+    def _count(args):
+        counts.append(args)
+        if len(counts) == 1:
+            time.sleep(0.3)
+        return True, [len(counts)]
+
+    counts = []
+    emulator = DutEmulator('json')
+    emulator.commands['count'] = _count
+    first = DutShell(emulator.start_pty(), parser='json', timeout=0.2,
+                     reconnect='never', resync=True, seq_tag=' #{seq}')
+    second = DutShell.copy_driver(first)
+    try:
+        assert first.send_cmd('count')['result'] == RESULT_TIMEOUT
+        # The late echo of the first shell has a different tag
+        assert second.send_cmd('count', timeout=1)['data'] == [2]
+        assert first.send_cmd('count', timeout=1)['data'] == [3]
+    finally:
+        second.close()
+        first.close()
+        emulator.stop()
+    assert counts == [['#1'], ['#2'], ['#3']]
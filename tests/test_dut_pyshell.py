@@ -0,0 +1,83 @@
+# Copyright (c) 2019 Kevin Weiss, for HAW Hamburg  <kevin.weiss@haw-hamburg.de>
+#
+# This file is subject to the terms and conditions of the MIT License. See the
+# file LICENSE in the top level directory for more details.
+# SPDX-License-Identifier:    MIT
+"""Tests the DUT python shell of RIOT PAL."""
+import time
+from riot_pal.dut_emulator import DutEmulator
+from riot_pal.dut_pyshell import DutPyShell
+
+
+def test_cached_cmd_list(tmpdir):
+    """Test the command list is cached and refreshed in the background."""
+    emulator = DutEmulator('json')
+    port = emulator.start_pty()
+    cache_path = str(tmpdir.join('cmds.json'))
+    try:
+        shell = DutPyShell(port=port, cmd_cache=cache_path)
+        assert 'read_reg' in shell.cmd_list
+        shell.dut.close()
+
+        emulator.commands['new_cmd'] = emulator.commands['echo']
+        shell = DutPyShell(port=port, cmd_cache=cache_path)
+        # The cached list is used until the refresh finishes
+        firmware = shell.firmware
+        shell._refresh_thread.join()
+        assert 'new_cmd' in shell.cmd_list
+        assert shell.firmware != firmware
+        assert shell._complete_cmd_list('new', 'send_cmd new') == ['new_cmd']
+        shell.dut.close()
+
+        shell = DutPyShell(port=port, cmd_cache=cache_path)
+        assert 'new_cmd' in shell.cmd_list
+        shell._refresh_thread.join()
+        shell.dut.close()
+    finally:
+        emulator.stop()
+
+
+def test_several_boards(capsys):
+    """Test targeted, broadcast and background commands on several boards."""
+    emulators = {'fast': DutEmulator('json'), 'slow': DutEmulator('json')}
+    try:
+        ports = {name: emulator.start_pty()
+                 for name, emulator in emulators.items()}
+        shell = DutPyShell(ports=ports, cmd_cache=None)
+        capsys.readouterr()
+        shell.onecmd('send_cmd @all echo a')
+        assert sorted(capsys.readouterr().out.split('\n')) == \
+            ['', 'fast: "a"', 'slow: "a"']
+        shell.onecmd('@fast echo b')
+        assert capsys.readouterr().out == 'fast: "b"\n'
+
+        emulators['slow'].latency = 0.3
+        shell.onecmd('@slow echo c &')
+        assert capsys.readouterr().out == '[1] echo c\n'
+        start = time.monotonic()
+        shell.onecmd('@fast echo d')
+        assert time.monotonic() - start < 0.3
+        shell.onecmd('wait')
+        assert capsys.readouterr().out == 'fast: "d"\n[1] slow: "c"\n'
+        shell.onecmd('jobs')
+        assert capsys.readouterr().out == '[1] Done 1/1 echo c\n'
+        assert not shell._jobs
+
+        shell.MAX_FINISHED_JOBS = 2
+        for _ in range(4):
+            shell.onecmd('@fast echo f &')
+            shell.onecmd('wait')
+        shell.onecmd('@fast echo g &')
+        assert sorted(shell._jobs) == [4, 5, 6]
+        shell.onecmd('wait')
+        capsys.readouterr()
+
+        shell.onecmd('@other echo e')
+        assert capsys.readouterr().out.startswith('Unknown board other')
+        assert shell._complete_cmd_list('sl', 'send_cmd @sl') == ['slow']
+        assert shell._complete_cmd_list('ec', 'send_cmd @slow ec') == \
+            ['echo']
+        shell.close()
+    finally:
+        for emulator in emulators.values():
+            emulator.stop()
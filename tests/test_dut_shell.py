@@ -0,0 +1,105 @@
+# Copyright (c) 2018 Kevin Weiss, for HAW Hamburg  <kevin.weiss@haw-hamburg.de>
+#
+# This file is subject to the terms and conditions of the MIT License. See the
+# file LICENSE in the top level directory for more details.
+# SPDX-License-Identifier:    MIT
+"""Tests DUT shell parsing in RIOT PAL without hardware."""
+from array import array
+import pytest
+from riot_pal.dut_shell import DutShell, ShellParser
+from riot_pal.dut_shell import RESULT_SUCCESS, RESULT_TIMEOUT
+from helpers import FakeShellDriver
+
+
+def _shell(parser='shell'):
+    driver = FakeShellDriver(json_format=(parser == 'json'))
+    return DutShell(driver_type='driver', driver=driver, parser=parser), driver
+
+
+@pytest.mark.parametrize('parser', ['shell', 'json'])
+def test_send_cmds_matches_send_cmd(parser):
+    """Pipelined results must have the same schema as single commands."""
+    cmds = ['cmd{}'.format(i) for i in range(10)]
+    dut, _ = _shell(parser)
+    expected = [dut.send_cmd(cmd) for cmd in cmds]
+    dut, driver = _shell(parser)
+    assert dut.send_cmds(cmds) == expected
+    assert driver.flushes == 1
+    assert expected[3]['result'] == RESULT_SUCCESS
+
+
+def test_send_cmds_bounded():
+    """The number and bytes of pending commands must stay bounded."""
+    dut, driver = _shell()
+    dut.send_cmds(['c{}'.format(i) for i in range(20)], depth=3)
+    assert driver.max_pending == 3
+    dut, driver = _shell()
+    dut.send_cmds(['c{}'.format(i) for i in range(20)], max_bytes=8)
+    assert driver.max_pending == 2
+    dut, driver = _shell()
+    dut.send_cmds(['long_command'] * 3, max_bytes=4)
+    assert driver.max_pending == 1
+    with pytest.raises(ValueError):
+        dut.send_cmds(['c'], depth=0)
+
+
+def test_send_cmds_timeout():
+    """A missing response times out only its own command."""
+    dut, _ = _shell()
+    results = dut.send_cmds(['a', 'silent'])
+    assert results[0]['data'] == [1, 0x10]
+    assert results[1]['result'] == RESULT_TIMEOUT
+
+
+def test_shell_parser_data_formats():
+    """Test the data formats of the shell parser."""
+    parse = ShellParser._try_parse_data
+    assert parse('no data') is None
+    assert parse('[1, 0x10, abc]') == [1, 16, 'abc']
+    assert parse('[]') == ['']
+    assert parse('[1, -2]', 'array') == array('l', [1, -2])
+    assert parse('[0x01, 0xff]', 'bytes') == b'\x01\xff'
+    assert parse('[10, 0x20]', 'bytes') == b'\x0a\x20'
+    assert parse('[0x1234, 0x01]', 'bytes') == [0x1234, 1]
+
+
+def test_shell_parser_markers():
+    """Test firmware specific markers."""
+    driver = FakeShellDriver()
+    dut = DutShell(driver_type='driver', driver=driver,
+                   parser_args={'markers': {'success': 'OK: '}})
+    driver.lines.extend(['Command: x\n', 'Success: [1]\n', 'OK: [2]\n'])
+    res = dut.parser._read_response('x')
+    assert res == {'cmd': 'x', 'data': [2], 'msg': '[2]',
+                   'result': RESULT_SUCCESS}
+    with pytest.raises(ValueError):
+        ShellParser(None, markers={'prompt': '> '})
+
+
+def test_shell_parser_bytes_lines():
+    """Test undecoded lines parse the same as decoded lines."""
+    lines = ['noise [9]\n', 'Command: echo ä\n', 'Success: [0x01, 2]\n',
+             'Command: Error: x\n']
+    parser = ShellParser(None)
+    results = []
+    for line_type in (str, lambda line: line.encode('utf-8')):
+        cmd_info = parser._new_cmd_info('echo')
+        done = [parser._parse_line(cmd_info, line_type(line))
+                for line in lines[:3]]
+        error_info = parser._new_cmd_info('x')
+        assert parser._parse_line(error_info, line_type(lines[3]))
+        results.append((done, cmd_info, error_info))
+    assert results[0] == results[1]
+    assert results[0][0] == [False, False, True]
+    assert results[0][1] == {'cmd': 'echo ä', 'data': [1, 2],
+                             'msg': '[0x01, 2]', 'result': RESULT_SUCCESS}
+
+
+def test_resync_json_without_cmd():
+    """Test results without a cmd cannot be synced on and are dropped."""
+    driver = FakeShellDriver(json_format=True)
+    dut = DutShell(driver_type='driver', driver=driver, parser='json',
+                   resync=True)
+    assert dut.send_cmd('x')['result'] == RESULT_TIMEOUT
+    assert dut.parser.dropped_lines == 2
+    assert driver.flushes == 0
@@ -0,0 +1,87 @@
+# Copyright (c) 2019 Kevin Weiss, for HAW Hamburg  <kevin.weiss@haw-hamburg.de>
+#
+# This file is subject to the terms and conditions of the MIT License. See the
+# file LICENSE in the top level directory for more details.
+# SPDX-License-Identifier:    MIT
+"""Tests binary framed responses of RIOT PAL."""
+import pytest
+from riot_pal.dut_emulator import DutEmulator
+from riot_pal.dut_shell import DutShell, RESULT_SUCCESS, RESULT_ERROR
+from riot_pal.framing import cobs_encode, cobs_decode, encode_frame, \
+    decode_frame, STATUS_SUCCESS
+
+
+@pytest.mark.parametrize('data', [b'', b'\x00', b'\x00\x00', b'a\x00b',
+                                  bytes(range(256)) * 3, b'\x01' * 254,
+                                  b'\x01' * 254 + b'\x00' + b'\x02' * 300])
+def test_cobs(data):
+    """Test COBS encoding round trips without zero bytes."""
+    encoded = cobs_encode(data)
+    assert b'\x00' not in encoded
+    assert cobs_decode(encoded) == data
+
+
+def test_frame_crc():
+    """Test corrupted frames are rejected."""
+    frame = encode_frame(STATUS_SUCCESS, b'\x12\x34')
+    status, payload = decode_frame(frame)
+    assert status == STATUS_SUCCESS
+    assert payload == b'\x12\x34'
+    corrupted = bytearray(frame)
+    corrupted[2] ^= 0x01
+    with pytest.raises(ValueError):
+        decode_frame(bytes(corrupted))
+
+
+@pytest.mark.parametrize('data_format', ['bytes', 'memoryview'])
+def test_framed_dut(data_format):
+    """Test framed responses with noise lines from the emulator."""
+    emulator = DutEmulator(noise=0.5, seed=1)
+    dut = DutShell(emulator.start_pty(), parser='framed', timeout=0.5,
+                   parser_args={'data_format': data_format})
+    try:
+        res = dut.send_cmd('dump 300')
+        assert emulator.framed
+        assert res['result'] == RESULT_SUCCESS
+        assert isinstance(res['data'], (bytes if data_format == 'bytes'
+                                        else memoryview))
+        assert bytes(res['data']) == bytes(i & 0xFF for i in range(300))
+        res = dut.send_cmd('error')
+        assert res['result'] == RESULT_ERROR
+        assert res['msg'] == 'Command failed'
+        results = dut.send_cmds(['read_reg 0x10 2'] * 8)
+        assert [bytes(res['data']) for res in results] == \
+            [b'\x10\x11'] * 8
+    finally:
+        dut.close()
+        emulator.stop()
+
+
+def test_framing_fallback():
+    """Test text responses if the firmware does not support framing."""
+    emulator = DutEmulator()
+    del emulator.commands['framing']
+    dut = DutShell(emulator.start_pty(), parser='framed', timeout=0.5)
+    try:
+        res = dut.send_cmd('read_reg 1 2')
+    finally:
+        dut.close()
+        emulator.stop()
+    assert not dut.parser.framed
+    assert res['data'] == [1, 2]
+
+
+def test_framing_fallback_stream():
+    """Test streaming if the firmware rejects framing."""
+    emulator = DutEmulator()
+    emulator.commands['framing'] = lambda args: (False, 'Unsupported')
+    dut = DutShell(emulator.start_pty(), parser='framed', timeout=0.5)
+    try:
+        records = list(dut.stream_cmd('stream 5'))
+    finally:
+        dut.close()
+        emulator.stop()
+    assert not dut.parser.framed
+    assert records[-1]['result'] == RESULT_SUCCESS
+    assert records[-1]['data'] == [5]
+    assert [rec['data'] for rec in records[:-1]] == [[i] for i in range(5)]
@@ -0,0 +1,94 @@
+# Copyright (c) 2019 Kevin Weiss, for HAW Hamburg  <kevin.weiss@haw-hamburg.de>
+#
+# This file is subject to the terms and conditions of the MIT License. See the
+# file LICENSE in the top level directory for more details.
+# SPDX-License-Identifier:    MIT
+"""Tests the I/O tracer of RIOT PAL."""
+import io
+import struct
+import pytest
+from riot_pal.dut_emulator import DutEmulator
+from riot_pal.dut_shell import DutShell, RESULT_SUCCESS
+from riot_pal.io_trace import IOTracer, read_trace, timed_records, \
+    filter_records, export_text, export_pcap, HEADER
+from riot_pal.session_record import KIND_WRITE, KIND_READ_BYTES
+
+
+def test_ring_wraps(tmpdir):
+    """Test the oldest records are dropped and the rest stays in order."""
+    path = str(tmpdir.join('ring.trace'))
+    tracer = IOTracer(path, size=256)
+    for i in range(100):
+        tracer.record(KIND_WRITE, 'cmd {}'.format(i) + 'x' * (i % 7))
+    tracer.close()
+    start, records = read_trace(path)
+    payloads = [payload for _, _, payload in records]
+    assert payloads == ['cmd {}{}'.format(i, 'x' * (i % 7)).encode()
+                        for i in range(100 - len(payloads), 100)]
+    assert 5 < len(records) < 20
+    times = [timestamp for timestamp, _, _ in timed_records(path)]
+    assert times == sorted(times) and times[0] >= start
+
+    tracer = IOTracer(path, size=256)
+    tracer.record(KIND_WRITE, 'resumed')
+    assert tracer.dropped > 100 - len(records)
+    tracer.close()
+    resumed = read_trace(path)[1]
+    assert resumed[-2] == records[-1]
+    assert resumed[-1][2] == b'resumed'
+    tracer = IOTracer(path, size=256, append=False)
+    tracer.close()
+    assert read_trace(path)[1] == []
+
+
+def test_ring_size_mismatch(tmpdir):
+    """Test a trace whose header disagrees with its size is rejected."""
+    path = str(tmpdir.join('ring.trace'))
+    IOTracer(path, size=256).close()
+    with open(path, 'r+b') as trace_file:
+        header = bytearray(trace_file.read(HEADER.size))
+        fields = list(HEADER.unpack(header))
+        fields[1] = 512
+        HEADER.pack_into(header, 0, *fields)
+        trace_file.seek(0)
+        trace_file.write(header)
+    with pytest.raises(ValueError, match='512 bytes, not 256'):
+        IOTracer(path, size=256)
+
+
+def test_trace_device(tmpdir):
+    """Test tracing a device and replaying and exporting the trace."""
+    path = str(tmpdir.join('dut.trace'))
+    tracer = IOTracer(path, size=4096)
+    emulator = DutEmulator(noise=0.5, seed=0)
+    try:
+        dut = DutShell(emulator.start_pty(), timeout=0.5, record=tracer)
+        for cmd in ('echo a', 'read_reg 0 2', 'echo b'):
+            assert dut.send_cmd(cmd)['result'] == RESULT_SUCCESS
+        dut.close()
+    finally:
+        emulator.stop()
+    tracer.flush()
+
+    dut = DutShell(driver_type='replay', path=path)
+    assert dut.send_cmd('echo a')['data'] == ['a']
+    assert dut.send_cmd('read_reg 0 2')['data'] == [0, 1]
+
+    records = list(filter_records(timed_records(path), cmds=['read_reg'],
+                                  kinds=[KIND_WRITE, KIND_READ_BYTES]))
+    assert records[0][1:] == (KIND_WRITE, b'read_reg 0 2')
+    assert records[-1][2] == b'Success: [0, 1]\n'
+    assert all(kind != KIND_WRITE for _, kind, _ in records[1:])
+
+    out = io.StringIO()
+    export_text(records, out)
+    lines = out.getvalue().splitlines()
+    assert len(lines) == len(records)
+    assert lines[0].split(' ', 1)[1] == "write          b'read_reg 0 2'"
+
+    out = io.BytesIO()
+    export_pcap(records, out)
+    pcap = out.getvalue()
+    assert struct.unpack_from('<IHHiIII', pcap)[::6] == (0xa1b2c3d4, 147)
+    assert pcap.endswith(bytes([KIND_READ_BYTES]) + records[-1][2])
+    tracer.close()
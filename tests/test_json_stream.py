@@ -0,0 +1,55 @@
+# Copyright (c) 2019 Kevin Weiss, for HAW Hamburg  <kevin.weiss@haw-hamburg.de>
+#
+# This file is subject to the terms and conditions of the MIT License. See the
+# file LICENSE in the top level directory for more details.
+# SPDX-License-Identifier:    MIT
+"""Tests the streaming JSON decoder in RIOT PAL."""
+import pytest
+from riot_pal.json_stream import JSONStreamDecoder
+
+
+@pytest.mark.parametrize('line_type', [str, bytes])
+def test_feed_lines(line_type):
+    """Test classification of text and JSON lines."""
+    def _line(text):
+        return text if line_type is str else text.encode()
+    decoder = JSONStreamDecoder(backend='json')
+    assert decoder.feed(_line('boot log\n')) == (None, (_line('boot log\n'),))
+    assert decoder.feed(_line('{"data": [1]}\n')) == ({'data': [1]}, ())
+    assert decoder.feed(_line('  {"a": "}{"}\n')) == ({'a': '}{'}, ())
+    assert decoder.feed(_line('{not json}\n')) == (None,
+                                                   (_line('{not json}\n'),))
+
+
+def test_feed_split_object():
+    """Objects split across lines are decoded when complete."""
+    decoder = JSONStreamDecoder(backend='json')
+    assert decoder.feed(b'{"data": [1, 2,\r\n') == (None, ())
+    assert decoder.feed(b' 3], "msg": "a{"\n') == (None, ())
+    assert decoder.feed(b'}\n') == ({'data': [1, 2, 3], 'msg': 'a{'}, ())
+    assert decoder.feed(b'{"data": "unterminated\n') == (None, ())
+    assert decoder.flush() == (b'{"data": "unterminated\n',)
+
+
+def test_feed_split_object_limit():
+    """Objects that do not complete within the limit are text."""
+    decoder = JSONStreamDecoder(backend='json', max_pending=10)
+    assert decoder.feed('{"data":\n') == (None, ())
+    assert decoder.feed('[1, 2, 3]\n') == (None, ('{"data":\n',
+                                                  '[1, 2, 3]\n'))
+
+
+@pytest.mark.parametrize('line_type', [str, bytes])
+def test_feed_unclosed_noise(line_type):
+    """Text starting with an unclosed brace does not swallow the result."""
+    def _line(text):
+        return text if line_type is str else text.encode()
+    decoder = JSONStreamDecoder(backend='json')
+    assert decoder.feed(_line('{ boot banner\n')) == (None, ())
+    assert decoder.feed(_line('{"result": "Success"}\n')) == \
+        ({'result': 'Success'}, (_line('{ boot banner\n'),))
+    assert decoder.feed(_line('{"result": "Success"}\n')) == \
+        ({'result': 'Success'}, ())
+    assert decoder.feed(_line('{ banner\n')) == (None, ())
+    assert decoder.feed(_line('  {"data": 1}\n')) == \
+        ({'data': 1}, (_line('{ banner\n'),))
@@ -0,0 +1,77 @@
+# Copyright (c) 2019 Kevin Weiss, for HAW Hamburg  <kevin.weiss@haw-hamburg.de>
+#
+# This file is subject to the terms and conditions of the MIT License. See the
+# file LICENSE in the top level directory for more details.
+# SPDX-License-Identifier:    MIT
+"""Tests the command metrics of RIOT PAL."""
+import json
+import pytest
+from riot_pal.dut_emulator import DutEmulator
+from riot_pal.dut_shell import DutShell, RESULT_SUCCESS
+from riot_pal.metrics import CommandMetrics
+
+
+def test_command_metrics():
+    """Test records of single and pipelined commands."""
+    records = []
+    metrics = CommandMetrics(hooks=[records.append])
+    emulator = DutEmulator()
+    dut = DutShell(emulator.start_pty(), timeout=0.5, metrics=metrics)
+    try:
+        assert dut.send_cmd('echo a')['result'] == RESULT_SUCCESS
+        dut.send_cmds(['read_reg 0 2', 'echo b'])
+    finally:
+        dut.close()
+        emulator.stop()
+    assert [rec['cmd'] for rec in records] == ['echo a', 'read_reg 0 2',
+                                               'echo b']
+    for rec in records:
+        assert rec['result'] == RESULT_SUCCESS
+        assert rec['bytes_out'] == len(rec['cmd']) + 1
+        assert rec['lines'] == 2
+        assert 0 <= rec['ttfb'] <= rec['latency']
+    totals = json.loads(metrics.to_json())['commands']
+    assert totals['echo']['count'] == 2
+    assert totals['echo']['bytes_in'] == sum(rec['bytes_in'] for rec in records
+                                             if rec['cmd'].startswith('echo'))
+    prom = metrics.to_prometheus()
+    assert '# TYPE riot_pal_commands_total counter' in prom
+    assert 'riot_pal_commands_total{cmd="read_reg"} 1' in prom
+
+
+def test_command_metrics_timeout():
+    """Test timeouts are counted for the waiting command."""
+    metrics = CommandMetrics()
+    emulator = DutEmulator(latency=0.2)
+    dut = DutShell(emulator.start_pty(), timeout=0.05, metrics=metrics,
+                   reconnect='never')
+    try:
+        dut.send_cmd('help')
+    finally:
+        dut.close()
+        emulator.stop()
+    assert metrics.per_command['help']['timeouts'] == 1
+
+
+def test_command_metrics_write_error():
+    """Test a command that could not be written leaves no record open."""
+    records = []
+    metrics = CommandMetrics(hooks=[records.append])
+    emulator = DutEmulator()
+    dut = DutShell(emulator.start_pty(), timeout=0.5, metrics=metrics)
+    # pylint: disable=W0212
+    write = dut.parser.dev._driver.write
+
+    def _failing_write(*args, **kwargs):
+        raise OSError('write failed')
+    dut.parser.dev._driver.write = _failing_write
+    try:
+        with pytest.raises(OSError):
+            dut.send_cmd('echo a')
+        dut.parser.dev._driver.write = write
+        assert dut.send_cmd('echo b')['result'] == RESULT_SUCCESS
+    finally:
+        dut.close()
+        emulator.stop()
+    assert [rec['cmd'] for rec in records] == ['echo b']
+    assert records[0]['lines'] == 2
@@ -0,0 +1,44 @@
+# Copyright (c) 2019 Kevin Weiss, for HAW Hamburg  <kevin.weiss@haw-hamburg.de>
+#
+# This file is subject to the terms and conditions of the MIT License. See the
+# file LICENSE in the top level directory for more details.
+# SPDX-License-Identifier:    MIT
+"""Tests running commands on many devices in RIOT PAL."""
+import time
+from riot_pal.dut_emulator import DutEmulator
+from riot_pal.dut_shell import RESULT_SUCCESS, RESULT_ERROR, RESULT_TIMEOUT
+from riot_pal.orchestrator import DutOrchestrator
+
+
+def test_orchestrator():
+    """Test the wall time, failing devices and the deadline."""
+    emulators = [DutEmulator(latency=0.1) for _ in range(4)]
+    slow = DutEmulator(latency=1)
+    configs = {'dut{}'.format(i): {'args': [emulator.start_pty()],
+                                   'timeout': 0.5}
+               for i, emulator in enumerate(emulators)}
+    configs['missing'] = {'args': ['/dev/does_not_exist']}
+    configs['slow'] = {'args': [slow.start_pty()], 'timeout': 2}
+    try:
+        with DutOrchestrator(configs) as orchestrator:
+            start = time.monotonic()
+            results = orchestrator.send_cmds(['echo a', 'read_reg 0 1'],
+                                             deadline=0.5)
+            # The devices run in parallel so one round of latencies is spent
+            assert time.monotonic() - start < 0.6
+            for i in range(len(emulators)):
+                res = results['dut{}'.format(i)]
+                assert res['result'] == RESULT_SUCCESS
+                assert [cmd_info['data'] for cmd_info in res['data']] == \
+                    [['a'], [0]]
+            assert results['missing']['result'] == RESULT_ERROR
+            assert results['missing']['msg']
+            assert results['slow']['result'] == RESULT_TIMEOUT
+
+            results = orchestrator.send_cmd('error', deadline=0.5)
+            assert results['dut0']['result'] == RESULT_ERROR
+            assert results['dut0']['data']['result'] == RESULT_ERROR
+            assert results['slow']['msg'] == 'Device is busy'
+    finally:
+        for emulator in emulators + [slow]:
+            emulator.stop()
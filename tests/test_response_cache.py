@@ -0,0 +1,62 @@
+# Copyright (c) 2019 Kevin Weiss, for HAW Hamburg  <kevin.weiss@haw-hamburg.de>
+#
+# This file is subject to the terms and conditions of the MIT License. See the
+# file LICENSE in the top level directory for more details.
+# SPDX-License-Identifier:    MIT
+"""Tests caching idempotent commands in RIOT PAL."""
+import time
+from riot_pal.dut_shell import DutShell
+from riot_pal.response_cache import ResponseCache
+from helpers import FakeShellDriver
+
+
+def _cached_shell(**kwargs):
+    driver = FakeShellDriver()
+    cache = ResponseCache(**kwargs)
+    return DutShell(driver_type='driver', driver=driver, cache=cache), driver
+
+
+def test_cache_hits_and_invalidation():
+    """Test only allowed commands are cached until a write."""
+    dut, driver = _cached_shell(allow=('help', 'read_reg'))
+    res = dut.send_cmd('help')
+    res['data'].append('modified')
+    assert dut.send_cmd('help')['data'] == [4, 0x10]
+    dut.send_cmd('read_reg 1')
+    dut.send_cmd('read_reg 1')
+    dut.send_cmd('echo')
+    dut.send_cmd('echo')
+    assert driver.flushes == 4
+    assert dut.cache.stats() == {'hits': 2, 'misses': 2, 'invalidations': 0,
+                                 'entries': 2}
+    dut.send_cmd('settings_get')
+    dut.send_cmd('help')
+    assert driver.flushes == 5
+    dut.send_cmd('write_reg 1 2')
+    dut.send_cmd('help')
+    assert driver.flushes == 7
+    assert dut.cache.invalidations == 1
+
+
+def test_cache_ttl_and_lru():
+    """Test expired and least recently used entries are removed."""
+    dut, driver = _cached_shell(allow=('a', 'b', 'c'), ttl=0.05,
+                                max_entries=2)
+    for cmd in ['a', 'b', 'a', 'c', 'a', 'b']:
+        dut.send_cmd(cmd)
+    # b was evicted by c
+    assert driver.flushes == 4
+    time.sleep(0.06)
+    dut.send_cmd('a')
+    assert driver.flushes == 5
+
+
+def test_cached_send_cmds():
+    """Test hits are not served after an invalidating command."""
+    dut, _ = _cached_shell(allow=('help',))
+    dut.send_cmd('help')
+    results = dut.send_cmds(['help', 'reset', 'help', 'echo'])
+    assert [res['cmd'] for res in results] == ['help', 'reset', 'help',
+                                               'echo']
+    assert dut.cache.hits == 1
+    assert dut.cache.stats()['entries'] == 1
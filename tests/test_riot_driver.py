@@ -0,0 +1,59 @@
+# Copyright (c) 2019 Kevin Weiss, for HAW Hamburg  <kevin.weiss@haw-hamburg.de>
+#
+# This file is subject to the terms and conditions of the MIT License. See the
+# file LICENSE in the top level directory for more details.
+# SPDX-License-Identifier:    MIT
+"""Tests RIOT Driver connections without make term in RIOT PAL."""
+import os
+import pytest
+from riot_pal.metrics import CommandMetrics
+from riot_pal.riot_driver import RiotDriver, resolve_term_config
+
+MAKEFILE = """TERMPROG = cat
+TERMFLAGS = -u
+PORT = loop://
+BAUD = 9600
+info-debug-variable-%:
+\t@echo $($*)
+"""
+
+
+def test_strip_response():
+    """Test the prompt and line ending stripping."""
+    strip = RiotDriver.strip_response
+    assert strip('2019-01-01 12:00:00,000 # Success: [1]\r\n') == \
+        'Success: [1]'
+    assert strip('no prompt\n') == 'no prompt'
+    assert strip('a\rb # c # d\r\n') == 'c # d'
+    assert strip('') == ''
+
+
+def test_termprog_mode(tmpdir):
+    """The terminal program is resolved once and spawned without make."""
+    tmpdir.join('Makefile').write(MAKEFILE)
+    cwd = os.getcwd()
+    config = resolve_term_config(str(tmpdir))
+    assert config == {'TERMPROG': 'cat', 'TERMFLAGS': '-u', 'PORT': 'loop://',
+                      'BAUD': '9600'}
+    tmpdir.join('Makefile').remove()
+    assert resolve_term_config(str(tmpdir)) is config
+    driver = RiotDriver(timeout=1, path=str(tmpdir), mode='termprog')
+    assert os.getcwd() == cwd
+    driver.write('# Success: [1]')
+    assert driver.readline() == 'Success: [1]'
+    assert driver.health_check()
+    driver.close()
+    assert not driver.health_check()
+
+
+def test_direct_mode():
+    """The port is opened directly."""
+    driver = RiotDriver(timeout=0.1, mode='direct', port='loop://')
+    driver.metrics = CommandMetrics()
+    driver.write('# Success: [1]')
+    assert driver.readline() == 'Success: [1]'
+    for read in (driver.readline, driver.readline_bytes):
+        with pytest.raises(TimeoutError):
+            read()
+    assert driver.metrics.unattributed['timeouts'] == 2
+    driver.close()
@@ -0,0 +1,83 @@
+# Copyright (c) 2019 Kevin Weiss, for HAW Hamburg  <kevin.weiss@haw-hamburg.de>
+#
+# This file is subject to the terms and conditions of the MIT License. See the
+# file LICENSE in the top level directory for more details.
+# SPDX-License-Identifier:    MIT
+"""Tests the device lease scheduler of RIOT PAL."""
+import multiprocessing
+import pytest
+from riot_pal.dut_emulator import DutEmulator
+from riot_pal.dut_shell import DutShell, RESULT_SUCCESS, RESULT_ERROR
+from riot_pal.scheduler import DutScheduler, PortLease, discover_ports
+
+FAILING_PORTS = set()
+
+
+class _PortShell(DutShell):
+    def __init__(self, port, **kwargs):
+        super().__init__(port, **kwargs)
+        self.port = port
+
+
+def _echo(dut, task):
+    if dut.port in FAILING_PORTS:
+        raise ConnectionError('Lost {}'.format(dut.port))
+    if task == 'raise':
+        raise ValueError(task)
+    return dut.send_cmd('echo {}'.format(task))['data']
+
+
+@pytest.fixture
+def boards():
+    """Returns the ports of three emulated boards."""
+    emulators = [DutEmulator('json') for _ in range(3)]
+    yield [emulator.start_pty() for emulator in emulators]
+    FAILING_PORTS.clear()
+    for emulator in emulators:
+        emulator.stop()
+
+
+def _scheduler(ports, **kwargs):
+    # The functions of the tests are only known to forked workers
+    return DutScheduler(ports, device_kwargs={'parser': 'json'},
+                        device_cls=_PortShell,
+                        mp_context=multiprocessing.get_context('fork'),
+                        **kwargs)
+
+
+def test_schedule_tasks(boards):
+    """Test tasks are sharded across all boards in order."""
+    results = _scheduler(boards).run(_echo, list(range(30)) + ['raise'])
+    assert [res['data'] for res in results[:-1]] == \
+        [[str(i)] for i in range(30)]
+    assert all(res['result'] == RESULT_SUCCESS for res in results[:-1])
+    assert results[-1]['result'] == RESULT_ERROR
+    assert results[-1]['msg'] == "ValueError('raise')"
+    assert len({res['board'] for res in results}) > 1
+
+
+def test_failed_board(boards):
+    """Test tasks of a failed board are rebalanced to the others."""
+    FAILING_PORTS.add(boards[0])
+    scheduler = _scheduler(boards)
+    results = scheduler.run(_echo, range(30))
+    assert all(res['result'] == RESULT_SUCCESS for res in results)
+    assert boards[0] not in {res['board'] for res in results}
+    assert list(scheduler.failed_boards) == [boards[0]]
+
+    FAILING_PORTS.update(boards)
+    results = _scheduler(boards, max_attempts=2).run(_echo, range(3))
+    assert all(res['result'] == RESULT_ERROR for res in results)
+
+
+def test_port_lease(boards):
+    """Test a board is leased exclusively."""
+    with PortLease(boards[0]) as lease:
+        assert lease.held
+        other = PortLease(boards[0])
+        assert not other.acquire()
+        results = _scheduler(boards[:1]).run(_echo, [1])
+        assert results[0]['msg'] == 'No board available'
+    assert other.acquire()
+    other.release()
+    assert discover_ports(pattern='/nonexistent/*') == []
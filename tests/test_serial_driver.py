@@ -4,7 +4,9 @@
 # file LICENSE in the top level directory for more details.
 # SPDX-License-Identifier:    MIT
 """Tests Serial Driver implmentation in RIOT PAL."""
+import time
 from pprint import pformat
+import pytest
 from serial import SerialException
 from riot_pal.serial_driver import SerialDriver
 
@@ -65,3 +67,84 @@ def test_connect_failing(regtest):
                            baudrate=test_baud,
                            port=test_port,
                            timeout=2)
+
+
+def test_reconnect_policy():
+    """Test reconnects on read timeouts depending on the policy."""
+    for policy, after, reconnects in (('never', 1, 0),
+                                      ('exception', 1, 0),
+                                      ('timeout', 1, 3),
+                                      ('timeout', 2, 1)):
+        ser_drvr = SerialDriver('loop://', timeout=0.01, reconnect=policy,
+                                reconnect_after=after)
+        for _ in range(3):
+            with pytest.raises(TimeoutError):
+                ser_drvr.readline()
+        assert ser_drvr.timeouts == 3
+        assert ser_drvr.reconnects == reconnects
+        assert ser_drvr.health_check()
+        ser_drvr.write('abc')
+        assert ser_drvr.readline() == 'abc\n'
+        assert ser_drvr.consecutive_timeouts == 0
+        ser_drvr.close()
+        assert not ser_drvr.health_check()
+    with pytest.raises(ValueError):
+        SerialDriver('loop://', reconnect='sometimes')
+
+
+def test_reader_thread():
+    """Test the ring buffer and out-of-band lines of the reader thread."""
+    oob_lines = []
+    ser_drvr = SerialDriver('loop://', timeout=0.05, reader_thread=True,
+                            buffer_lines=3, oob_callback=oob_lines.append)
+    ser_drvr.write('cmd')
+    assert ser_drvr.readline() == 'cmd\n'
+    # pylint: disable=W0212
+    ser_drvr._dev.write(b'event\n')
+    time.sleep(0.1)
+    ser_drvr.write('cmd2')
+    assert ser_drvr.readline() == 'cmd2\n'
+    assert oob_lines == ['event\n']
+    ser_drvr._dev.write(b'1\n2\n3\n4\n5\n')
+    time.sleep(0.1)
+    assert ser_drvr.dropped_lines == 2
+    assert [ser_drvr.readline() for _ in range(3)] == ['3\n', '4\n', '5\n']
+    for _ in range(3):
+        with pytest.raises(TimeoutError):
+            ser_drvr.readline()
+    # An idle port is no reason to reconnect, a failed one is
+    assert ser_drvr.timeouts == 3
+    assert ser_drvr.reconnects == 0
+    ser_drvr._dev.close()
+    assert ser_drvr.readline() == ''
+    assert ser_drvr.reconnects == 1
+    ser_drvr.write('cmd3')
+    assert ser_drvr.readline() == 'cmd3\n'
+    ser_drvr.close()
+
+
+def test_reader_thread_without_timeout():
+    """Test stopping a reader blocked on a port without a read timeout."""
+    ser_drvr = SerialDriver('loop://', timeout=None, reader_thread=True)
+    # pylint: disable=W0212
+    ser_drvr._dev.cancel_read = None
+    ser_drvr.READER_JOIN_TIMEOUT = 0.1
+    start = time.monotonic()
+    ser_drvr.close()
+    assert time.monotonic() - start < 1
+
+
+def test_deadline_keeps_port_timeout():
+    """Test deadline reads stop in time without reconfiguring the port."""
+    ser_drvr = SerialDriver('loop://', timeout=2)
+    # pylint: disable=W0212
+    for timeout in (0.05, 0.02):
+        start = time.monotonic()
+        with pytest.raises(TimeoutError):
+            ser_drvr.readline(timeout=timeout)
+        assert time.monotonic() - start < 0.5
+    assert ser_drvr._dev.timeout == 2
+    ser_drvr.write('abc')
+    assert ser_drvr.readline(timeout=0.5) == 'abc\n'
+    assert ser_drvr.reconnects == 0
+    ser_drvr.close()
@@ -0,0 +1,82 @@
+# Copyright (c) 2019 Kevin Weiss, for HAW Hamburg  <kevin.weiss@haw-hamburg.de>
+#
+# This file is subject to the terms and conditions of the MIT License. See the
+# file LICENSE in the top level directory for more details.
+# SPDX-License-Identifier:    MIT
+"""Tests session recording and replay of RIOT PAL."""
+import time
+import pytest
+from riot_pal.dut_emulator import DutEmulator
+from riot_pal.dut_shell import DutShell, RESULT_SUCCESS, RESULT_ERROR, \
+    RESULT_TIMEOUT
+from riot_pal.session_record import ReplayDriver, load_session, KIND_WRITE, \
+    KIND_WRITE_NO_FLUSH, KIND_TIMEOUT
+
+CMDS = ['read_reg 0x10 3', 'error', 'echo a', 'stream 5']
+
+
+@pytest.mark.parametrize('protocol', ['shell', 'json'])
+def test_record_replay(tmpdir, protocol):
+    """Test a recorded session replays the same results without hardware."""
+    path = str(tmpdir.join('session.rec'))
+    emulator = DutEmulator(protocol, noise=0.5, seed=0)
+    try:
+        dut = DutShell(emulator.start_pty(), parser=protocol, timeout=0.5,
+                       record=path)
+        recorded = dut.send_cmds(CMDS)
+        dut.close()
+    finally:
+        emulator.stop()
+    assert recorded[0]['result'] == RESULT_SUCCESS
+    assert recorded[1]['result'] == RESULT_ERROR
+    records = load_session(path)
+    writes = [rec[2] for rec in records
+              if rec[0] in (KIND_WRITE, KIND_WRITE_NO_FLUSH)]
+    assert writes == [cmd.encode() for cmd in CMDS]
+
+    dut = DutShell(driver_type='replay', path=path, parser=protocol)
+    replayed = dut.send_cmds(CMDS)
+    for rec, rep in zip(recorded, replayed):
+        assert rep['result'] == rec['result']
+        assert rep.get('data') == rec.get('data')
+    dut.close()
+
+
+def test_replay_timeout_and_realtime(tmpdir):
+    """Test recorded timeouts and the real-time mode."""
+    path = str(tmpdir.join('session.rec'))
+    emulator = DutEmulator()
+    try:
+        dut = DutShell(emulator.start_pty(), timeout=0.1, record=path)
+        emulator.latency = 0.3
+        assert dut.send_cmd('help')['result'] == RESULT_TIMEOUT
+        dut.close()
+    finally:
+        emulator.stop()
+    assert load_session(path)[-1][0] == KIND_TIMEOUT
+
+    for realtime in (False, True):
+        driver = ReplayDriver(path, realtime=realtime)
+        dut = DutShell(driver_type='driver', driver=driver)
+        start = time.monotonic()
+        assert dut.send_cmd('help')['result'] == RESULT_TIMEOUT
+        assert (time.monotonic() - start >= 0.1) == realtime
+        assert driver.remaining == 0
+
+
+def test_replay_strict(tmpdir):
+    """Test writes that differ from the recording."""
+    path = str(tmpdir.join('session.rec'))
+    emulator = DutEmulator()
+    try:
+        dut = DutShell(emulator.start_pty(), timeout=0.5, record=path)
+        dut.send_cmd('echo a')
+        dut.close()
+    finally:
+        emulator.stop()
+    driver = ReplayDriver(path)
+    DutShell(driver_type='driver', driver=driver).send_cmd('echo b')
+    assert driver.mismatches == 1
+    dut = DutShell(driver_type='replay', path=path, strict=True)
+    with pytest.raises(ValueError):
+        dut.send_cmd('echo b')